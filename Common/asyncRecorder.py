@@ -0,0 +1,237 @@
+import os
+import signal
+import asyncio
+import logging
+from time import time, monotonic
+from Common.ubxFraming import FrameSplitter, parse_frame
+from Common.recording import RunOutput
+from Common.epochFusion import EpochFuser, RECORDING_MODES
+from Common.loadShedder import LoadShedder
+
+# Queue sizes between the stages; a full frame queue drops, a full row queue blocks
+FRAME_QUEUE_SIZE = 256
+ROW_QUEUE_SIZE = 64
+
+READ_SIZE = 4096
+
+# Seconds without data before the writing indicator goes off (the serial timeout before)
+IDLE_TIMEOUT = 1.0
+
+# Seconds between cancellations of the stages left over when one of them fails
+CANCEL_WAIT = 0.1
+
+class PipelineCounters:
+    """What went through (and what fell out of) the recording pipeline."""
+
+    def __init__(self):
+        self.bytes_read = 0
+        self.frames = 0
+        self.frames_dropped = 0
+        self.parse_errors = 0
+        self.rows = 0
+        self.backpressure_waits = 0
+        self.max_frame_queue = 0
+        self.max_row_queue = 0
+        self.discarded_bytes = 0
+        self.bad_checksums = 0
+        self.commits = 0
+
+    def summary(self):
+        return (f"{self.bytes_read} bytes, {self.frames} frames ({self.frames_dropped} dropped, "
+                f"{self.bad_checksums} bad checksums, {self.discarded_bytes} bytes discarded), "
+                f"{self.parse_errors} parse errors, {self.rows} rows in {self.commits} commits, "
+                f"{self.backpressure_waits} backpressure waits, "
+                f"max queue depth {self.max_frame_queue} frames / {self.max_row_queue} rows")
+
+class AsyncRecorder:
+    """Records a run with the serial read, parsing and CSV writing as separate asyncio stages.
+
+    The reader waits on the port's file descriptor and cuts what it reads
+    into frames, so it never sits inside a parser while bytes pile up in
+    the UART. Frames go through a bounded queue to the parse and fusion
+    stage; when that queue is full the frame is dropped and counted rather
+    than stalling the reader. Fused rows go through a second bounded queue
+    to the writer, which commits to disk on an executor thread; when the
+    writer falls behind the parser waits on the queue (backpressure).
+    With a HealthSampler as `shed`, the parse stage sheds load while the
+    Pi is hot or busy (see Common/loadShedder.py).
+    """
+
+    def __init__(self, mow_id, stream, show_writing=None, raw_capture=False, on_first_row=None,
+                 frame_queue_size=FRAME_QUEUE_SIZE, row_queue_size=ROW_QUEUE_SIZE, mode='fused', rate=None,
+                 health=None, shed=None):
+        self.mow_id = mow_id
+        self.mode = mode
+        self.rate = rate
+        self.health = health
+        self.stream = stream
+        self.show_writing = show_writing or (lambda writing: None)
+        self.raw_capture = raw_capture
+        self.on_first_row = on_first_row
+        self.frame_queue_size = frame_queue_size
+        self.row_queue_size = row_queue_size
+        self.counters = PipelineCounters()
+        self.fuser = EpochFuser.for_mode(mode, log_fields=not raw_capture)
+        self.shed = shed
+        self.shedder = None
+        self.output = None
+        self._reader_task = None
+
+    def stop(self):
+        """Stops reading; frames and rows already queued are still written."""
+        if self._reader_task and not self._reader_task.done():
+            self._reader_task.cancel()
+
+    async def _read(self, fd, frames, splitter):
+        loop = asyncio.get_running_loop()
+        readable = asyncio.Event()
+        loop.add_reader(fd, readable.set)
+        counters = self.counters
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(readable.wait(), IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    # Signal that we are not writing to the CSV file
+                    self.show_writing(False)
+                    continue
+                readable.clear()
+                try:
+                    data = os.read(fd, READ_SIZE)
+                except BlockingIOError:
+                    continue
+                except OSError as e:
+                    # EIO: the port (or the pty stand-in) went away
+                    logging.warning(f"Serial port closed: {e}")
+                    return
+                if not data:
+                    # pyserial sets VMIN=0, so an empty read just means nothing arrived
+                    continue
+                recv_time = monotonic()
+                wall_time = time()
+                counters.bytes_read += len(data)
+                for frame in splitter.feed(data):
+                    counters.frames += 1
+                    # The capture is buffered, so keeping every frame here costs no disk write
+                    self.output.capture_frame(frame, recv_time, wall_time)
+                    try:
+                        frames.put_nowait((frame, recv_time))
+                    except asyncio.QueueFull:
+                        counters.frames_dropped += 1
+                counters.max_frame_queue = max(counters.max_frame_queue, frames.qsize())
+        finally:
+            loop.remove_reader(fd)
+            counters.discarded_bytes = splitter.discarded
+            counters.bad_checksums = splitter.bad_checksums
+            # Let the later stages drain what is already queued
+            await frames.put(None)
+
+    async def _parse(self, frames, rows):
+        fuser = self.fuser
+        counters = self.counters
+        shedder = self.shedder
+        try:
+            while True:
+                item = await frames.get()
+                if item is None:
+                    break
+                frame, recv_time = item
+                if shedder and shedder.update() and shedder.skip(frame):
+                    continue
+                try:
+                    parsed = parse_frame(frame, validate=False)
+                except Exception as e:
+                    counters.parse_errors += 1
+                    logging.debug("Could not parse frame %r: %s", frame[:8], e)
+                    continue
+                if parsed is None:
+                    continue
+                row = fuser.update(parsed, recv_time)
+                # Signal that we are writing to the CSV file
+                self.show_writing(True)
+                if row:
+                    if rows.full():
+                        counters.backpressure_waits += 1
+                    await rows.put(row)
+                    counters.max_row_queue = max(counters.max_row_queue, rows.qsize())
+        finally:
+            fuser.flush()
+            await rows.put(None)
+
+    async def _write(self, rows):
+        loop = asyncio.get_running_loop()
+        writer = self.output.writer
+        counters = self.counters
+        while True:
+            row = await rows.get()
+            if row is None:
+                break
+            counters.rows += 1
+            if self.output.write_row(row) and self.on_first_row:
+                self.on_first_row()
+            if writer.commit_due():
+                # Only this stage waits for the SD card; reading and parsing carry on
+                await loop.run_in_executor(None, writer.commit)
+        counters.commits = writer.commits
+
+    async def _run_stages(self, stages):
+        """Waits for the stages to finish; if one fails the others are cancelled and its exception is raised."""
+        done, pending = await asyncio.wait(stages, return_when=asyncio.FIRST_EXCEPTION)
+        failed = [stage for stage in done if not stage.cancelled() and stage.exception()]
+        if not failed:
+            return
+        # A cancelled stage can block again sending its sentinel to a queue nobody reads, so cancel until done
+        while pending:
+            for stage in pending:
+                stage.cancel()
+            _, pending = await asyncio.wait(pending, timeout=CANCEL_WAIT)
+        raise failed[0].exception()
+
+    async def run(self):
+        """Records until stop() (or SIGINT/SIGTERM) and returns the counters."""
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, self.stop)
+
+        self.output = RunOutput(self.mow_id, raw_capture=self.raw_capture, header=RECORDING_MODES[self.mode]['fields'],
+                                auto_commit=False, rate=self.rate, health=self.health)
+        if self.shed:
+            self.shedder = LoadShedder(self.shed, self.fuser, self.stream, self.rate, on_rate=self.output.set_rate)
+        frames = asyncio.Queue(self.frame_queue_size)
+        rows = asyncio.Queue(self.row_queue_size)
+        try:
+            # Drop whatever queued up while the port sat idle
+            self.stream.reset_input_buffer()
+            fd = self.stream.fileno()
+            os.set_blocking(fd, False)
+            logging.info(f"Logging specific fields to {self.output.filename} (asyncio pipeline). Press Ctrl+C to stop.")
+
+            # Each stage passes a sentinel on when it ends, however it ends
+            self._reader_task = asyncio.create_task(self._read(fd, frames, FrameSplitter()))
+            await self._run_stages([self._reader_task, asyncio.create_task(self._parse(frames, rows)),
+                                    asyncio.create_task(self._write(rows))])
+            if self._reader_task.cancelled():
+                logging.info("Logging stopped by user.")
+        except Exception as e:
+            logging.error(f"Error: {e}")
+        finally:
+            if self.shedder:
+                self.shedder.close()
+            try:
+                self.output.close()
+            except OSError as e:
+                logging.error(f"Could not close {self.output.filename}: {e}")
+            # Ensure the LED turns off when exiting
+            self.show_writing(False)
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(signum)
+        logging.info(f"Pipeline counters: {self.counters.summary()}")
+        logging.info(f"Epoch fusion: {self.fuser.summary()}")
+        return self.counters
+
+def record_async(mow_id, stream, show_writing=None, raw_capture=False, on_first_row=None, mode='fused', rate=None,
+                 health=None, shed=None):
+    """Runs an AsyncRecorder on `stream` (an open serial port) until stopped."""
+    recorder = AsyncRecorder(mow_id, stream, show_writing, raw_capture=raw_capture, on_first_row=on_first_row,
+                             mode=mode, rate=rate, health=health, shed=shed)
+    return asyncio.run(recorder.run())
@@ -0,0 +1,311 @@
+import os
+import sys
+import csv
+import logging
+import argparse
+from bisect import bisect_left
+from time import perf_counter
+from concurrent.futures import ProcessPoolExecutor
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.rawCapture import iter_capture, read_index, capture_version, CAPTURE_MAGIC
+from Common.ubxFraming import FrameSplitter, UBX_SYNC, find_frame_start, parse_frame
+from Common.epochFusion import EpochFuser, RECORDING_MODES, itow_to_unix
+from Common.loadShedder import essential_keys
+from Common.columnarRun import ColumnarRun, convert_csv, columnar_path
+from Common.runArchive import ArchivedRun, ARCHIVE_SUFFIX
+from Common.recording import RECORD_DATA_DIR
+
+# Raw byte streams (u-center logs, a cat of the serial port) as well as the recorder's own captures
+RAW_SUFFIXES = ('.ubx', '.nmea', '.raw')
+RUN_SUFFIXES = ('.csv', ARCHIVE_SUFFIX)
+
+# Files larger than this are cut into pieces of about this size, each parsed by its own worker
+SPLIT_BYTES = 8 * 1024 * 1024
+# Bytes searched after a nominal cut for the next frame to start at
+SYNC_WINDOW = 64 * 1024
+
+OUTPUTS = ('csv', 'columnar')
+
+def file_kind(path):
+    """'capture' for a Common/rawCapture.py file, 'stream' for raw receiver bytes, 'run' for a CSV run or archive."""
+    if path.endswith(RUN_SUFFIXES):
+        return 'run'
+    return 'stream' if capture_version(path) is None else 'capture'
+
+def split_points(path, kind, split_bytes=SPLIT_BYTES):
+    """[(start, end)] byte ranges that each begin on a frame; end is None for the end of the file.
+
+    Captures are cut at entries of their sparse index, which always point
+    at a record; raw streams at the first valid UBX or NMEA frame after each
+    nominal cut.
+    """
+    size = os.path.getsize(path)
+    first = len(CAPTURE_MAGIC) if kind == 'capture' else 0
+    pieces = max(-(-size // split_bytes), 1)
+    cuts = [first]
+    if kind == 'capture':
+        offsets = [entry[1] for entry in read_index(path)]
+        for piece in range(1, pieces):
+            following = bisect_left(offsets, size * piece // pieces)
+            if following < len(offsets) and offsets[following] > cuts[-1]:
+                cuts.append(offsets[following])
+    elif kind == 'stream':
+        with open(path, 'rb') as raw:
+            for piece in range(1, pieces):
+                nominal = size * piece // pieces
+                raw.seek(nominal)
+                start = find_frame_start(raw.read(SYNC_WINDOW))
+                if start >= 0 and nominal + start > cuts[-1]:
+                    cuts.append(nominal + start)
+    return list(zip(cuts, cuts[1:] + [None]))
+
+def _frames(path, kind, start, end):
+    """(recv_time, wall_time, frame) for every frame in one piece; raw streams have no receive times."""
+    if kind == 'capture':
+        for recv_time, wall_time, frame, _ in iter_capture(path, start, end):
+            yield recv_time, wall_time, frame
+        return
+    with open(path, 'rb') as raw:
+        raw.seek(start)
+        data = raw.read() if end is None else raw.read(end - start)
+    for frame in FrameSplitter().feed(data):
+        yield None, None, frame
+
+def extract_piece(path, kind, start, end, mode):
+    """Parses one piece of a capture in a worker process.
+
+    Frames the recording mode has no extractor for are counted and left
+    unparsed. Returns (messages, frames, parse errors, seconds taken), with
+    messages as (identity, iTOW, values, recv_time, wall_time) ready for
+    EpochFuser.add() in file order.
+    """
+    started = perf_counter()
+    extractors = RECORDING_MODES[mode]['extractors']
+    wanted = essential_keys(extractors)
+    messages = []
+    frames = errors = 0
+    for recv_time, wall_time, frame in _frames(path, kind, start, end):
+        frames += 1
+        if (frame[2:4] if frame.startswith(UBX_SYNC) else frame[3:6]) not in wanted:
+            continue
+        try:
+            # A stream's UBX frames were checksummed by the FrameSplitter already
+            parsed = parse_frame(frame, validate=kind != 'stream')
+        except Exception:
+            errors += 1
+            continue
+        extractor = extractors.get(getattr(parsed, 'identity', None))
+        if extractor:
+            itow, values = extractor(parsed, False)
+            messages.append((parsed.identity, itow, values, recv_time, wall_time))
+    return messages, frames, errors, perf_counter() - started
+
+def output_stem(path):
+    """<id>_<ts>_GPSData for a recorder capture (<id>_<ts>_GPSRaw.ubx), <name>_GPSData for another stream,
+    and the run's own name for a CSV run or archive."""
+    name = os.path.basename(os.path.splitext(path)[0])
+    if path.endswith(RUN_SUFFIXES):
+        return name
+    if name.endswith('_GPSRaw'):
+        name = name[:-len('_GPSRaw')]
+    return name + '_GPSData'
+
+def convert_run(path, out_dir):
+    """Converts a CSV run or archive to a columnar run in out_dir, in a worker process; returns (rows, seconds)."""
+    started = perf_counter()
+    run = ColumnarRun(convert_csv(path, columnar_path(os.path.join(out_dir, output_stem(path)))))
+    rows = len(run)
+    run.close()
+    return rows, perf_counter() - started
+
+def live_recv_times(capture_path):
+    """{iTOW: recv_time} from the run the recorder wrote alongside a version 1 capture, or {} when it is gone."""
+    stem = os.path.join(os.path.dirname(capture_path), output_stem(capture_path))
+    for path in (stem + '.csv', stem + ARCHIVE_SUFFIX):
+        if not os.path.exists(path):
+            continue
+        if path.endswith(ARCHIVE_SUFFIX):
+            archive = ArchivedRun(path)
+            try:
+                lines = list(archive.lines())
+            finally:
+                archive.close()
+        else:
+            with open(path, newline='') as csvfile:
+                lines = csvfile.readlines()
+        recv_times = {}
+        for row in csv.DictReader(lines):
+            try:
+                recv_times[int(float(row['itow']))] = float(row['recv_time'])
+            except (KeyError, TypeError, ValueError):
+                continue
+        return recv_times
+    return {}
+
+def fuse_pieces(path, kind, pieces, out_dir, mode, output):
+    """Fuses the pieces of one capture, in order, into a run in out_dir; returns a summary dict.
+
+    recv_time means what it does in a live run: the monotonic receive
+    time of the epoch's last message, which a capture records next to the
+    unix wall_time that dates the row. A version 1 capture only holds the
+    wall clock, so its times are moved onto the monotonic clock of the
+    recorder's own run of it, matched by iTOW. Without that run (and for
+    raw streams, which have no receive times) recv_time is left empty.
+    """
+    fuser = EpochFuser.for_mode(mode, log_fields=False)
+    out_path = os.path.join(out_dir, output_stem(path) + '.csv')
+    # Raw streams carry no clock: their fixes are dated from iTOW in the week the file was last written
+    reference = os.path.getmtime(path)
+    legacy = kind == 'capture' and capture_version(path) == 1
+    live = live_recv_times(path) if legacy else {}
+    if legacy and not live:
+        logging.info(f"{os.path.basename(path)}: no recorded run to take receive times from, recv_time left empty")
+    itow_column = fuser.fields.index('itow')
+    recv_column = fuser.fields.index('recv_time')
+    offset = None
+    # Rows fused before the first epoch that is also in the recorded run, waiting for the clock offset
+    held = []
+    frames = errors = rows = 0
+    worker_seconds = 0.0
+    with open(out_path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(fuser.fields)
+
+        def write(row):
+            if kind == 'stream':
+                row[recv_column] = None
+            elif legacy:
+                # Fused with the capture's wall clock as recv_time; move it onto the live run's clock
+                captured = row[recv_column]
+                row[recv_column] = None if offset is None else round(captured + offset, 6)
+            writer.writerow(row)
+
+        for piece in pieces:
+            messages, piece_frames, piece_errors, seconds = piece.result()
+            frames += piece_frames
+            errors += piece_errors
+            worker_seconds += seconds
+            for identity, itow, values, recv_time, wall_time in messages:
+                if wall_time is None and itow is not None:
+                    wall_time = itow_to_unix(itow, reference)
+                row = fuser.add(identity, itow, values, wall_time if legacy else recv_time, wall_time)
+                if not row:
+                    continue
+                rows += 1
+                recorded = live.get(row[itow_column])
+                if recorded is not None:
+                    offset = recorded - row[recv_column]
+                if offset is None and live:
+                    held.append(row)
+                    continue
+                for waiting in held:
+                    write(waiting)
+                held.clear()
+                write(row)
+        for waiting in held:
+            write(waiting)
+    fuser.flush()
+    if output == 'columnar':
+        columnar = convert_csv(out_path)
+        os.remove(out_path)
+        out_path = columnar
+    return {'frames': frames, 'errors': errors, 'rows': rows, 'incomplete': fuser.incomplete,
+            'worker_seconds': worker_seconds, 'output': os.path.basename(out_path)}
+
+def find_inputs(in_dir):
+    """Captures and runs directly in in_dir, by name."""
+    return sorted(os.path.join(in_dir, name) for name in os.listdir(in_dir)
+                  if name.endswith(RAW_SUFFIXES + RUN_SUFFIXES) and os.path.isfile(os.path.join(in_dir, name)))
+
+def reprocess(paths, out_dir, mode='fused', output='csv', workers=None, split_bytes=SPLIT_BYTES):
+    """Re-parses and re-fuses captures (and converts runs) across a process pool; returns one summary dict per file.
+
+    Every piece of every file is queued up front so all cores stay busy
+    while the files are fused one after another in this process. Parsing,
+    the costly part, happens in the workers; the fusion itself runs here
+    over all pieces of a file in order, so an epoch whose messages fall
+    either side of a cut still becomes a row. Every output gets its own
+    name: a run whose raw capture is in the batch is left to the capture,
+    and any other file that would overwrite an earlier output is skipped.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    kinds = {path: file_kind(path) for path in paths}
+    # Captures and streams first, so they claim their output names before the runs they supersede
+    owners = {}
+    for path in sorted(paths, key=lambda path: kinds[path] == 'run'):
+        owners.setdefault(output_stem(path), path)
+    summaries = []
+    with ProcessPoolExecutor(workers) as pool:
+        plans = []
+        for path in paths:
+            kind = kinds[path]
+            owner = owners[output_stem(path)]
+            if owner != path:
+                skipped = ("its raw capture is reprocessed" if kind == 'run' and kinds[owner] == 'capture'
+                           else f"same output as {os.path.basename(owner)}")
+                plans.append((path, kind, None, f"skipped ({skipped})"))
+            elif kind == 'run':
+                if output == 'csv':
+                    # Already fused; there is nothing in a CSV to parse again
+                    plans.append((path, kind, None, 'skipped (already a CSV run)'))
+                else:
+                    plans.append((path, kind, [pool.submit(convert_run, path, out_dir)], None))
+            else:
+                pieces = [pool.submit(extract_piece, path, kind, start, end, mode)
+                          for start, end in split_points(path, kind, split_bytes)]
+                plans.append((path, kind, pieces, None))
+
+        for path, kind, pieces, skipped in plans:
+            summary = {'file': os.path.basename(path), 'kind': kind, 'bytes': os.path.getsize(path),
+                       'pieces': len(pieces or ()), 'frames': 0, 'errors': 0, 'rows': 0, 'incomplete': 0,
+                       'worker_seconds': 0.0, 'output': skipped}
+            try:
+                if kind == 'run' and pieces:
+                    rows, seconds = pieces[0].result()
+                    summary.update(rows=rows, worker_seconds=seconds,
+                                   output=os.path.basename(columnar_path(os.path.join(out_dir, output_stem(path)))))
+                elif pieces:
+                    summary.update(fuse_pieces(path, kind, pieces, out_dir, mode, output))
+            except Exception as e:
+                logging.error(f"Could not reprocess {os.path.basename(path)}: {e}")
+                summary['output'] = f"failed: {e}"
+            logging.info(f"{summary['file']}: {summary['rows']} rows -> {summary['output']}")
+            summaries.append(summary)
+    return summaries
+
+def summary_table(summaries, elapsed):
+    """Lines of a table of the files processed, with throughput."""
+    lines = [f"{'file':<40} {'kind':<8} {'MB':>8} {'pieces':>6} {'frames':>9} {'rows':>8} {'incompl':>7} "
+             f"{'MB/s/core':>9}  output"]
+    for entry in summaries:
+        rate = entry['bytes'] / 1e6 / entry['worker_seconds'] if entry['worker_seconds'] else 0
+        lines.append(f"{entry['file'][:40]:<40} {entry['kind']:<8} {entry['bytes'] / 1e6:8.2f} {entry['pieces']:6d} "
+                     f"{entry['frames']:9d} {entry['rows']:8d} {entry['incomplete']:7d} {rate:9.2f}  {entry['output']}")
+    total = sum(entry['bytes'] for entry in summaries) / 1e6
+    lines.append(f"{len(summaries)} files, {total:.2f} MB in {elapsed:.2f} s: {total / elapsed if elapsed else 0:.2f} MB/s")
+    return lines
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Re-parse raw captures (and convert CSV runs) in a directory, "
+                                                 "spread over all cores.")
+    parser.add_argument('in_dir', nargs='?', default=RECORD_DATA_DIR, help="directory of captures and runs (default: Record/Data)")
+    parser.add_argument('--out', help="output directory (default: <in_dir>/Reprocessed)")
+    parser.add_argument('--mode', choices=tuple(RECORDING_MODES), default='fused',
+                        help="fuse GNRMC with NAV-RELPOSNED, or NAV-PVT (default: fused)")
+    parser.add_argument('--output', choices=OUTPUTS, default='csv', help="write CSV or columnar runs (default: csv)")
+    parser.add_argument('--workers', type=int, help="worker processes (default: one per core)")
+    parser.add_argument('--split-mb', type=float, default=SPLIT_BYTES / 1024 / 1024,
+                        help=f"cut files larger than this many MB into pieces (default: {SPLIT_BYTES // 1024 // 1024})")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    inputs = find_inputs(args.in_dir)
+    if not inputs:
+        print(f"Nothing to reprocess in {args.in_dir}")
+        sys.exit(1)
+    started = perf_counter()
+    results = reprocess(inputs, args.out or os.path.join(args.in_dir, 'Reprocessed'), mode=args.mode,
+                        output=args.output, workers=args.workers, split_bytes=int(args.split_mb * 1024 * 1024))
+    print('\n'.join(summary_table(results, perf_counter() - started)))
@@ -0,0 +1,181 @@
+import os
+import sys
+import json
+import logging
+import argparse
+from time import strftime, monotonic
+from serial import Serial
+from pyubx2 import UBXMessage
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.ubxFraming import FrameSplitter, UBX_SYNC
+from Common.nmeaFast import nmea_checksum_ok
+from Common.receiverConfig import ReceiverConfigurator, ReceiverConfigError, LAYER_BBR, LAYER_FLASH
+
+# Where the detected baud rate is kept between start-ups
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Config')
+SERIAL_CONFIG = os.path.join(CONFIG_DIR, 'serial.json')
+
+# Rates the scripts have used, most likely first; the saved rate is always tried before these
+PROBE_BAUDS = (230400, 115200, 57600, 38400, 9600, 460800)
+# Rates worth upgrading to, fastest first (the ZED-F9P UARTs go up to 921600)
+UPGRADE_BAUDS = (921600, 460800, 230400, 115200)
+
+# Seconds to listen at each rate while probing
+PROBE_WINDOW = 0.25
+# Polls and tolerated share of garbage bytes for the error-rate check after an upgrade
+CHECK_POLLS = 20
+MAX_GARBAGE = 0.01
+
+def load_serial_config(port):
+    """Returns the saved settings for a port, or None."""
+    try:
+        with open(SERIAL_CONFIG) as config_file:
+            return json.load(config_file).get(port)
+    except (OSError, ValueError):
+        return None
+
+def save_serial_config(port, baud, **details):
+    """Saves the working baud rate of a port for later start-ups."""
+    os.makedirs(CONFIG_DIR, exist_ok=True)
+    try:
+        with open(SERIAL_CONFIG) as config_file:
+            config = json.load(config_file)
+    except (OSError, ValueError):
+        config = {}
+    config[port] = dict(details, baud=baud, saved_at=strftime('%Y-%m-%d %H:%M:%S'))
+    # Write a new file and rename it so a power loss cannot leave half a file
+    tmp_path = SERIAL_CONFIG + '.tmp'
+    with open(tmp_path, 'w') as config_file:
+        json.dump(config, config_file, indent=2)
+    os.replace(tmp_path, SERIAL_CONFIG)
+
+def saved_baud(port, default=None):
+    """The baud rate saved for a port by the last probe, or `default`."""
+    config = load_serial_config(port)
+    return config['baud'] if config else default
+
+def count_valid_frames(data):
+    """Returns (valid_frames, garbage_bytes) for a chunk of received bytes."""
+    splitter = FrameSplitter()
+    valid = 0
+    bad_nmea = 0
+    for frame in splitter.feed(data):
+        # The splitter checks UBX checksums itself; NMEA lines are only delimited
+        if frame.startswith(UBX_SYNC) or nmea_checksum_ok(frame):
+            valid += 1
+        else:
+            bad_nmea += len(frame)
+    return valid, splitter.discarded + bad_nmea
+
+def listen(stream, window, poll=True):
+    """Reads for `window` seconds, optionally asking for a CFG-VALGET reply so a silent receiver answers too."""
+    stream.reset_input_buffer()
+    if poll:
+        stream.write(UBXMessage.config_poll(0, 0, ['CFG_UART1_BAUDRATE']).serialize())
+    data = bytearray()
+    deadline = monotonic() + window
+    while monotonic() < deadline:
+        data += stream.read(max(1, stream.in_waiting))
+    return bytes(data)
+
+def probe_baud(port, bauds=PROBE_BAUDS, window=PROBE_WINDOW):
+    """Finds the baud rate the receiver is talking at; returns it or None.
+
+    The saved rate is tried first. A rate passes when at least one frame
+    with a valid checksum arrives within the window.
+    """
+    saved = saved_baud(port)
+    candidates = ([saved] if saved else []) + [baud for baud in bauds if baud != saved]
+    with Serial(port, candidates[0], timeout=window / 4) as stream:
+        for baud in candidates:
+            stream.baudrate = baud
+            started = monotonic()
+            valid, garbage = count_valid_frames(listen(stream, window))
+            logging.info(f"Probe {port} at {baud}: {valid} valid frames, {garbage} garbage bytes "
+                         f"in {monotonic() - started:.2f} s")
+            if valid:
+                return baud
+    return None
+
+def error_rate(stream, polls=CHECK_POLLS):
+    """Polls the receiver repeatedly; returns (failed_polls / polls, garbage share of the bytes)."""
+    configurator = ReceiverConfigurator(stream, timeout=0.5)
+    failed = 0
+    for _ in range(polls):
+        try:
+            configurator.poll(['CFG_UART1_BAUDRATE'])
+        except ReceiverConfigError:
+            failed += 1
+    data = listen(stream, PROBE_WINDOW, poll=False)
+    _, garbage = count_valid_frames(data)
+    return failed / polls, garbage / len(data) if data else 0.0
+
+def upgrade_baud(port, current, bauds=UPGRADE_BAUDS, max_baud=None):
+    """Moves the receiver's UART1 to the highest rate that passes the error-rate check.
+
+    Each candidate is set (in RAM), verified by reading it back and then
+    checked with CHECK_POLLS polls; a rate with any failed poll or more than
+    MAX_GARBAGE garbage goes back to the last good rate. The rate that
+    passes is also written to BBR and flash, so the receiver still talks at
+    the saved rate after a power cycle. Returns the rate the receiver ends
+    up at.
+    """
+    with Serial(port, current, timeout=0.5) as stream:
+        configurator = ReceiverConfigurator(stream)
+        for baud in bauds:
+            if baud <= current or (max_baud and baud > max_baud):
+                continue
+            try:
+                configurator.change_baud('CFG_UART1_BAUDRATE', baud, current)
+            except ReceiverConfigError as e:
+                logging.warning(f"{baud} baud not taken: {e}")
+                # The switch may have gone through with only the read-back lost
+                try:
+                    configurator.poll(['CFG_UART1_BAUDRATE'])
+                except ReceiverConfigError:
+                    logging.error(f"Receiver no longer answers at {current} baud; probe again")
+                    return probe_baud(port)
+                continue
+            failed, garbage = error_rate(stream)
+            logging.info(f"Error check at {baud}: {failed:.0%} failed polls, {garbage:.1%} garbage")
+            if failed == 0 and garbage <= MAX_GARBAGE:
+                try:
+                    configurator.set([('CFG_UART1_BAUDRATE', baud)], layers=LAYER_BBR | LAYER_FLASH)
+                    return baud
+                except ReceiverConfigError as e:
+                    # Left only in RAM the rate would be lost at the next power cycle, but kept in serial.json
+                    logging.warning(f"{baud} baud could not be stored on the receiver: {e}")
+            # Not reliable or not stored: put the receiver back on the last good rate
+            try:
+                configurator.change_baud('CFG_UART1_BAUDRATE', current, baud)
+            except ReceiverConfigError:
+                logging.error(f"Could not return to {current} baud; probe again")
+                return probe_baud(port)
+    return current
+
+def detect_and_upgrade(port, upgrade=True, max_baud=None):
+    """Probes, optionally upgrades, saves and returns the receiver's baud rate (None if not found)."""
+    started = monotonic()
+    baud = probe_baud(port)
+    if baud is None:
+        logging.error(f"No receiver found on {port}")
+        return None
+    found = baud
+    if upgrade:
+        baud = upgrade_baud(port, baud, max_baud=max_baud)
+    save_serial_config(port, baud, found_at=found)
+    logging.info(f"{port}: receiver at {baud} baud (found at {found}) after {monotonic() - started:.2f} s")
+    return baud
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Find the receiver's baud rate, upgrade it and save it.")
+    parser.add_argument('--port', default='/dev/ttyAMA0', help="serial port (default: /dev/ttyAMA0)")
+    parser.add_argument('--no-upgrade', action='store_true', help="only detect and save the current rate")
+    parser.add_argument('--max-baud', type=int, help="do not upgrade beyond this rate")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    baud = detect_and_upgrade(args.port, upgrade=not args.no_upgrade, max_baud=args.max_baud)
+    print(f"{args.port}: {baud} baud" if baud else f"{args.port}: no receiver found")
+    sys.exit(0 if baud else 1)
@@ -0,0 +1,185 @@
+import os
+import io
+import csv
+import sys
+import logging
+from time import monotonic
+
+# Width of the fixed-size commit marker record so it can be rewritten in place
+MARKER_FORMAT = b'%12d %16d %8d %8d\n'
+MARKER_SUFFIX = '.commit'
+
+class BufferedCsvWriter:
+    """Collects CSV rows in memory and commits them to disk in groups.
+
+    A commit happens every `commit_rows` rows, every `commit_ms` milliseconds
+    or on close(), whichever comes first. After each commit a small marker
+    file next to the CSV records how many rows and bytes are safely on disk,
+    so a run cut short by power loss can be repaired with recover_run().
+    With auto_commit=False writerow() never commits; the caller checks
+    commit_due() and calls commit() itself, e.g. from a thread so the disk
+    write does not block an event loop.
+    """
+
+    def __init__(self, csvfile, commit_rows=50, commit_ms=1000, fsync=True, auto_commit=True):
+        self.csvfile = csvfile
+        self.auto_commit = auto_commit
+        self.commit_rows = commit_rows
+        self.commit_ms = commit_ms
+        self.fsync = fsync
+
+        # Rows are formatted into this buffer and written out in one call
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer)
+        self._pending = 0
+        self._last_commit = monotonic()
+
+        self.rows_committed = 0
+        self.bytes_committed = 0
+        self.commits = 0
+
+        # The marker only exists while the run is open
+        self.marker_path = csvfile.name + MARKER_SUFFIX
+        self._marker_fd = os.open(self.marker_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+
+    def writeheader(self, fieldnames):
+        """Writes the header row and commits it straight away."""
+        self._writer.writerow(fieldnames)
+        self._pending += 1
+        # The header does not count as a data row
+        self.rows_committed -= 1
+        self.commit()
+
+    def writerow(self, row):
+        """Buffers a row, committing if the row or time limit is reached."""
+        self._writer.writerow(row)
+        self._pending += 1
+        if self.auto_commit and self.commit_due():
+            self.commit()
+
+    def commit_due(self):
+        """Returns True when the row or time limit of the commit policy has been reached."""
+        if self._pending >= self.commit_rows:
+            return True
+        return bool(self.commit_ms and self._pending and (monotonic() - self._last_commit) * 1000 >= self.commit_ms)
+
+    def commit(self):
+        """Writes all buffered rows with a single write and flush."""
+        self._last_commit = monotonic()
+        if not self._pending:
+            return
+        data = self._buffer.getvalue()
+        self.csvfile.write(data)
+        self.csvfile.flush()
+        if self.fsync:
+            os.fsync(self.csvfile.fileno())
+
+        self.rows_committed += self._pending
+        self.bytes_committed += len(data.encode())
+        self.commits += 1
+        self._pending = 0
+        self._buffer.seek(0)
+        self._buffer.truncate()
+
+        # Record what is now durable; the record is fixed width so it overwrites itself
+        os.pwrite(self._marker_fd, MARKER_FORMAT % (
+            self.rows_committed, self.bytes_committed, self.commit_rows, self.commit_ms), 0)
+
+    def close(self):
+        """Commits any remaining rows and removes the marker (clean shutdown)."""
+        self.commit()
+        os.close(self._marker_fd)
+        os.remove(self.marker_path)
+        logging.info(f"CSV writer closed: {self.rows_committed} rows in {self.commits} commits")
+
+def read_marker(marker_path):
+    """Returns (rows, bytes, commit_rows, commit_ms) from a commit marker, or None."""
+    try:
+        with open(marker_path, 'rb') as marker:
+            fields = marker.readline().split()
+        if len(fields) != 4:
+            return None
+        return tuple(int(field) for field in fields)
+    except (OSError, ValueError):
+        return None
+
+def recover_run(csv_path):
+    """Repairs a CSV left behind by a crash and reports how many rows were lost.
+
+    Trailing partial rows are cut off so the file ends on a complete row
+    with the same number of fields as the header. Rows that were still
+    buffered in memory cannot be recovered; the commit policy stored in the
+    marker gives the upper bound on how many that could have been.
+    """
+    marker_path = csv_path + MARKER_SUFFIX
+    marker = read_marker(marker_path)
+
+    with open(csv_path, 'r+b') as csvfile:
+        data = csvfile.read()
+        lines = data.split(b'\n')
+        # Anything after the last newline is a torn write
+        tail = lines.pop()
+        rows_dropped = 1 if tail.strip() else 0
+
+        # Drop complete-looking lines that do not match the header width
+        header_fields = len(lines[0].split(b',')) if lines else 0
+        while len(lines) > 1 and len(lines[-1].rstrip(b'\r').split(b',')) != header_fields:
+            lines.pop()
+            rows_dropped += 1
+
+        good_size = sum(len(line) + 1 for line in lines)
+        csvfile.truncate(good_size)
+        csvfile.flush()
+        os.fsync(csvfile.fileno())
+
+    rows_kept = max(len(lines) - 1, 0)
+    if marker:
+        committed_rows, _, commit_rows, commit_ms = marker
+        # Committed rows that did not survive (e.g. lost page cache) include any torn ones
+        rows_dropped = max(rows_dropped, committed_rows - rows_kept)
+        max_buffered_lost = commit_rows - 1
+    else:
+        commit_ms = 0
+        max_buffered_lost = None
+
+    report = {
+        'path': csv_path,
+        'rows_kept': rows_kept,
+        'rows_dropped': rows_dropped,
+        'max_buffered_lost': max_buffered_lost,
+        'commit_ms': commit_ms,
+    }
+    if os.path.exists(marker_path):
+        os.remove(marker_path)
+    logging.warning(
+        f"Recovered {csv_path}: kept {rows_kept} rows, dropped {rows_dropped} torn rows, "
+        f"up to {max_buffered_lost} buffered rows ({commit_ms} ms) lost")
+    return report
+
+def recover_stale_runs(data_dir):
+    """Recovers every run in data_dir that still has a commit marker."""
+    reports = []
+    if not os.path.isdir(data_dir):
+        return reports
+    for filename in sorted(os.listdir(data_dir)):
+        if filename.endswith(MARKER_SUFFIX):
+            csv_path = os.path.join(data_dir, filename[:-len(MARKER_SUFFIX)])
+            if os.path.exists(csv_path):
+                reports.append(recover_run(csv_path))
+            else:
+                os.remove(os.path.join(data_dir, filename))
+    return reports
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if len(sys.argv) != 2:
+        print("Usage: python3 bufferedCsvWriter.py <run.csv | data directory>")
+        sys.exit(1)
+    target = sys.argv[1]
+    if os.path.isdir(target):
+        reports = recover_stale_runs(target)
+    else:
+        reports = [recover_run(target)]
+    for report in reports:
+        print(f"{report['path']}: {report['rows_kept']} rows kept, {report['rows_dropped']} dropped, "
+              f"up to {report['max_buffered_lost']} buffered rows lost")
@@ -0,0 +1,207 @@
+import os
+import sys
+import csv
+import json
+import shutil
+import logging
+import numpy as np
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.bufferedCsvWriter import MARKER_SUFFIX
+from Common.runArchive import ArchivedRun, ARCHIVE_SUFFIX
+from Common.runTiming import run_times, stamp_seconds
+
+# A columnar run is a directory next to the CSV holding one float64 .npy per column
+COLUMNAR_SUFFIX = '.cols'
+HEADER_FILE = 'header.json'
+FORMAT_NAME = 'remow-columnar'
+FORMAT_VERSION = 1
+
+# Rows are turned into Python lists in blocks when iterating, not one by one
+ROW_BLOCK = 4096
+
+def columnar_path(csv_path):
+    """Returns the columnar directory that belongs to a CSV run."""
+    return os.path.splitext(csv_path)[0] + COLUMNAR_SUFFIX
+
+def _read_rows(lines, fields, time_column):
+    """Parses CSV lines once into (unix seconds, numeric rows, rows skipped).
+
+    Empty cells become NaN. A row with the wrong number of cells, a
+    non-numeric value or a bad timestamp (a torn last line, say) is
+    skipped as a whole, so every column keeps the same length. Each
+    distinct second is parsed once.
+    """
+    seconds = {}
+    stamps = []
+    table = []
+    skipped = 0
+    for row in csv.reader(lines):
+        if len(row) != len(fields):
+            skipped += 1
+            continue
+        stamp = row[time_column]
+        try:
+            value = seconds.get(stamp)
+            if value is None:
+                value = seconds[stamp] = stamp_seconds(stamp)
+            numbers = [float(cell) if cell else np.nan for column, cell in enumerate(row) if column != time_column]
+        except ValueError:
+            skipped += 1
+            continue
+        stamps.append(value)
+        table.append(numbers)
+    timestamps = np.array(stamps, dtype=np.float64)
+    table = np.array(table, dtype=np.float64).reshape(len(table), len(fields) - 1)
+    return timestamps, table, skipped
+
+def convert_csv(csv_path, out_dir=None):
+    """Converts a recorded CSV run to the columnar format and returns the output directory.
+
+    Empty cells become NaN and malformed rows are left out. The text
+    timestamp (local time) is stored as unix seconds and an extra 'time'
+    column holds seconds from the start of the run, timed by
+    Common/runTiming.py; a header-only run gives empty
+    columns. A run archive (Common/runArchive.py) is decompressed in
+    memory first.
+    """
+    out_dir = out_dir or columnar_path(csv_path)
+    if csv_path.endswith(ARCHIVE_SUFFIX):
+        archive = ArchivedRun(csv_path)
+        try:
+            lines = list(archive.lines())
+        finally:
+            archive.close()
+    else:
+        with open(csv_path, newline='') as csvfile:
+            lines = csvfile.readlines()
+    if not lines:
+        raise ValueError(f"{os.path.basename(csv_path)} has no header")
+    fields = next(csv.reader(lines[:1]))
+    time_column = fields.index('timestamp')
+    numeric = [column for column in range(len(fields)) if column != time_column]
+
+    timestamps, table, skipped = _read_rows(lines[1:], fields, time_column)
+    if skipped:
+        logging.warning(f"{os.path.basename(csv_path)}: skipped {skipped} malformed rows")
+
+    columns = {'timestamp': timestamps}
+    for position, column in enumerate(numeric):
+        columns[fields[column]] = table[:, position]
+    columns['time'], source = run_times(timestamps, columns.get('itow'), columns.get('recv_time'))
+
+    # Write into a temporary directory and swap it in so readers never see half a run
+    tmp_dir = out_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    for name, values in columns.items():
+        np.save(os.path.join(tmp_dir, f'{name}.npy'), np.ascontiguousarray(values, dtype=np.float64))
+    header = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'rows': len(timestamps),
+        'columns': ['time'] + fields,
+        'source': os.path.basename(csv_path),
+        'start_time': float(timestamps[0]) if len(timestamps) else None,
+        'time_source': source,
+    }
+    with open(os.path.join(tmp_dir, HEADER_FILE), 'w') as header_file:
+        json.dump(header, header_file, indent=1)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(tmp_dir, out_dir)
+    return out_dir
+
+def convert_all(data_dir):
+    """Converts every CSV run in data_dir that has no up-to-date columnar copy."""
+    converted = []
+    for filename in sorted(os.listdir(data_dir)):
+        if not filename.endswith('_GPSData.csv'):
+            continue
+        csv_path = os.path.join(data_dir, filename)
+        # Skip runs that are still being recorded or need recovery
+        if os.path.exists(csv_path + MARKER_SUFFIX):
+            continue
+        out_dir = columnar_path(csv_path)
+        header_path = os.path.join(out_dir, HEADER_FILE)
+        if os.path.exists(header_path) and os.path.getmtime(header_path) >= os.path.getmtime(csv_path):
+            continue
+        try:
+            converted.append(convert_csv(csv_path))
+            logging.info(f"Converted {filename} to columnar format")
+        except Exception as e:
+            # One bad run must not stop the others from being converted
+            logging.error(f"Could not convert {filename}: {e}")
+    return converted
+
+class ColumnarRun:
+    """A columnar run whose columns are memory-mapped float64 arrays.
+
+    Columns are read-only views onto the files, so opening a run costs no
+    parsing and no copying. It offers the same row interface as the CSV
+    replay reader (fields, rows(), row_for_time(), row_time()).
+    """
+
+    def __init__(self, path):
+        if path.endswith('.csv'):
+            path = columnar_path(path)
+        self.path = path
+        with open(os.path.join(path, HEADER_FILE)) as header_file:
+            self.header = json.load(header_file)
+        if self.header.get('format') != FORMAT_NAME:
+            raise ValueError(f"{path} is not a columnar run")
+        self.columns = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                        for name in self.header['columns']}
+        # Same field order as the CSV, with the timestamp slot carrying run time
+        self.fields = [name for name in self.header['columns'] if name != 'time']
+        self.start_time = self.header['start_time']
+        time = self.columns['time']
+        # First row at or after each whole second, for O(1) time seeks
+        self._seconds = np.searchsorted(time, np.arange(int(np.ceil(time[-1])) + 1 if len(time) else 0))
+
+    def __len__(self):
+        return self.header['rows']
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    def close(self):
+        self.columns = {}
+
+    def row_for_time(self, seconds_from_start):
+        """Returns the first row at or after the given offset into the run."""
+        second = int(seconds_from_start)
+        if second < 0:
+            return 0
+        if second >= len(self._seconds):
+            return len(self)
+        return int(self._seconds[second])
+
+    def row_time(self, row_number):
+        """Returns the row time in seconds from the start of the run."""
+        return float(self.columns['time'][row_number])
+
+    def rows(self, start_row=0, end_row=None):
+        """Yields (row_number, time_from_start, values) like the CSV reader does."""
+        end_row = len(self) if end_row is None else min(end_row, len(self))
+        names = ['time' if name == 'timestamp' else name for name in self.fields]
+        time = self.columns['time']
+        for block_start in range(start_row, end_row, ROW_BLOCK):
+            block_end = min(block_start + ROW_BLOCK, end_row)
+            block = np.stack([self.columns[name][block_start:block_end] for name in names], axis=1)
+            # NaN marks an empty cell, which the CSV reader reports as None
+            missing = np.isnan(block)
+            block = np.where(missing, None, block).tolist() if missing.any() else block.tolist()
+            times = time[block_start:block_end].tolist()
+            for offset, values in enumerate(block):
+                yield block_start + offset, times[offset], values
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Default to the recorder's data directory
+    targets = sys.argv[1:] or [os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Record', 'Data')]
+    for target in targets:
+        if os.path.isdir(target):
+            print(f"{len(convert_all(target))} runs converted in {target}")
+        else:
+            print(f"Converted {target} to {convert_csv(target)}")
@@ -0,0 +1,235 @@
+import math
+import logging
+from calendar import timegm
+from collections import OrderedDict
+from time import strftime, localtime, monotonic
+from Common.fastLogging import Sampler
+
+# GPS time starts 1980-01-06 and is ahead of UTC by the leap seconds since then
+GPS_EPOCH_UNIX = 315964800
+LEAP_SECONDS = 18
+SECONDS_PER_WEEK = 604800
+WEEK_MS = SECONDS_PER_WEEK * 1000
+
+# NMEA times have 10 ms resolution, so epochs are keyed on iTOW rounded to that
+KEY_RESOLUTION_MS = 10
+
+# Epochs waiting for their other messages; at 20 Hz four epochs is 200 ms of slack
+MAX_PENDING = 4
+
+# Incomplete epochs are logged one by one up to this many, then only counted
+LOG_INCOMPLETE = 10
+
+# Per-message field logging is sampled: at 20 Hz every message would cost a log line
+_field_log = Sampler()
+
+# CSV columns written by the recorder, in order; itow is GPS time of week in
+# ms and recv_time the time.monotonic() seconds at which the message that
+# completed the epoch was read from the serial port (every pipeline passes it in)
+FUSED_FIELDS = ['timestamp', 'latitude', 'longitude', 'speed', 'rel_north', 'rel_east', 'rel_down', 'heading',
+                'itow', 'recv_time']
+# NAV-PVT mode: heading is the heading of motion, accuracies are in m, km/h and degrees;
+# the rel_ columns stay empty unless a moving base sends NAV-RELPOSNED
+PVT_FIELDS = ['timestamp', 'latitude', 'longitude', 'speed', 'heading', 'h_acc', 'v_acc', 'speed_acc',
+              'heading_acc', 'fix_type', 'carr_soln', 'num_sv', 'rel_north', 'rel_east', 'rel_down', 'rel_heading',
+              'itow', 'recv_time']
+
+def gps_itow(unix_time):
+    """GPS time of week in milliseconds for a UTC unix time."""
+    return int(round((unix_time - GPS_EPOCH_UNIX + LEAP_SECONDS) % SECONDS_PER_WEEK * 1000))
+
+def itow_to_unix(itow, reference):
+    """UTC unix time for a GPS time of week (ms), taking the week that puts it at or before `reference` (unix)."""
+    week_start = reference - (reference - GPS_EPOCH_UNIX + LEAP_SECONDS) % SECONDS_PER_WEEK
+    unix_time = week_start + itow / 1000
+    # Some slack for a reference taken a little before the last fix
+    return unix_time - SECONDS_PER_WEEK if unix_time > reference + 3600 else unix_time
+
+_day_starts = {}
+
+def utc_itow(utc_time, utc_date):
+    """GPS time of week in ms for an NMEA UTC time and date (datetime.time/date), or None if either is empty."""
+    if not utc_time or not utc_date:
+        return None
+    day_start = _day_starts.get(utc_date)
+    if day_start is None:
+        day_start = _day_starts[utc_date] = timegm(utc_date.timetuple())
+    seconds = utc_time.hour * 3600 + utc_time.minute * 60 + utc_time.second + utc_time.microsecond / 1e6
+    return gps_itow(day_start + seconds)
+
+def _rmc_fields(parsed, log_fields):
+    latitude = parsed.lat
+    longitude = parsed.lon
+    speed = float(parsed.spd) * 1.852 if parsed.spd else 0  # Convert knots to km/h
+    if log_fields and _field_log.allow('GNRMC'):
+        logging.info("latitude %s, longitude %s, speed %s km/h", latitude, longitude, speed)
+    # A fix-less RMC has empty position fields; the epoch stays incomplete
+    if latitude == '' or longitude == '':
+        return utc_itow(parsed.time, parsed.date), {}
+    return utc_itow(parsed.time, parsed.date), {'latitude': latitude, 'longitude': longitude, 'speed': speed}
+
+def _relposned_fields(parsed, log_fields):
+    rel_north = parsed.relPosN / 100  # Convert to meters
+    rel_east = parsed.relPosE / 100   # Convert to meters
+    rel_down = parsed.relPosD / 100   # Convert to meters
+    heading = parsed.relPosHeading    # degrees
+    if heading == 0.0:
+        heading = math.degrees(math.atan2(rel_east, rel_north))
+        if heading < 0:
+            heading += 360  # Normalize to 0-360 degrees
+    if log_fields and _field_log.allow('NAV-RELPOSNED'):
+        logging.info("latest_rel_north %s, latest_rel_east %s, latest_rel_down %s latest_heading %s",
+                     rel_north, rel_east, rel_down, heading)
+    return parsed.iTOW, {'rel_north': rel_north, 'rel_east': rel_east, 'rel_down': rel_down, 'heading': heading}
+
+def _pvt_fields(parsed, log_fields):
+    if not parsed.gnssFixOk:
+        # No valid fix: the epoch stays incomplete
+        return parsed.iTOW, {}
+    speed = parsed.gSpeed * 3.6 / 1000  # Convert mm/s to km/h
+    if log_fields and _field_log.allow('NAV-PVT'):
+        logging.info("latitude %s, longitude %s, speed %s km/h, heading %s, hAcc %s mm, carrSoln %s",
+                     parsed.lat, parsed.lon, speed, parsed.headMot, parsed.hAcc, parsed.carrSoln)
+    return parsed.iTOW, {'latitude': parsed.lat, 'longitude': parsed.lon, 'speed': speed, 'heading': parsed.headMot,
+                         'h_acc': parsed.hAcc / 1000, 'v_acc': parsed.vAcc / 1000, 'speed_acc': parsed.sAcc * 3.6 / 1000,
+                         'heading_acc': parsed.headAcc, 'fix_type': parsed.fixType, 'carr_soln': parsed.carrSoln,
+                         'num_sv': parsed.numSV}
+
+def _moving_base_fields(parsed, log_fields):
+    # The receiver's own heading only; no atan2 stand-in when it is not valid
+    heading = parsed.relPosHeading if parsed.relPosHeadingValid else None
+    if log_fields and _field_log.allow('NAV-RELPOSNED'):
+        logging.info("rel_north %s, rel_east %s, rel_heading %s", parsed.relPosN / 100, parsed.relPosE / 100, heading)
+    return parsed.iTOW, {'rel_north': parsed.relPosN / 100, 'rel_east': parsed.relPosE / 100,
+                         'rel_down': parsed.relPosD / 100, 'rel_heading': heading}
+
+# Message identity: function returning (iTOW in ms or None, {column: value})
+FUSED_EXTRACTORS = {
+    'GNRMC': _rmc_fields,
+    'NAV-RELPOSNED': _relposned_fields,
+}
+PVT_EXTRACTORS = {
+    'NAV-PVT': _pvt_fields,
+    'NAV-RELPOSNED': _moving_base_fields,
+}
+
+# Recording modes: the messages each needs, its CSV columns, and the messages only a moving base sends
+RECORDING_MODES = {
+    'fused': {'extractors': FUSED_EXTRACTORS, 'fields': FUSED_FIELDS, 'optional': ()},
+    'pvt': {'extractors': PVT_EXTRACTORS, 'fields': PVT_FIELDS, 'optional': ('NAV-RELPOSNED',)},
+}
+
+class _Epoch:
+    __slots__ = ('itow', 'values', 'seen')
+
+    def __init__(self, itow):
+        self.itow = itow
+        self.values = {}
+        self.seen = set()
+
+class EpochFuser:
+    """Groups parsed messages by GNSS time of week and emits one row per navigation epoch.
+
+    Each message is keyed on its iTOW (GNRMC's UTC time is converted with
+    LEAP_SECONDS). An epoch becomes a row as soon as every required message
+    has arrived for it, whatever the values are, so a speed or heading of 0
+    no longer drops the row. Messages listed in `optional` (RELPOSNED from a
+    moving base in NAV-PVT mode) become required once the first one shows
+    up. At most `max_pending` epochs wait for their other messages; older
+    ones are dropped and counted as incomplete, with the message they were
+    missing. Messages for an epoch that is already gone are counted as late.
+    """
+
+    def __init__(self, extractors=FUSED_EXTRACTORS, fields=FUSED_FIELDS, optional=(), log_fields=True,
+                 max_pending=MAX_PENDING):
+        self.extractors = extractors
+        self.optional = frozenset(optional)
+        self.required = frozenset(extractors) - self.optional
+        self.fields = fields
+        self.log_fields = log_fields
+        self.max_pending = max_pending
+        self._pending = OrderedDict()
+        self._newest_done = None
+        self.epochs = 0
+        self.incomplete = 0
+        self.missing = dict.fromkeys(extractors, 0)
+        self.late = 0
+        self.untimed = 0
+
+    @classmethod
+    def for_mode(cls, mode, log_fields=True):
+        """A fuser for one of RECORDING_MODES."""
+        return cls(log_fields=log_fields, **RECORDING_MODES[mode])
+
+    def _is_old(self, key):
+        # Older than the newest emitted epoch, allowing for the week rollover
+        return self._newest_done is not None and 0 <= (self._newest_done - key) % WEEK_MS < WEEK_MS // 2
+
+    def update(self, parsed_data, recv_time=None):
+        """Takes one parsed message; returns a row when it completes an epoch, else None."""
+        identity = parsed_data.identity
+        extractor = self.extractors.get(identity)
+        if extractor is None:
+            return None
+        itow, values = extractor(parsed_data, self.log_fields)
+        return self.add(identity, itow, values, recv_time)
+
+    def add(self, identity, itow, values, recv_time=None, wall_time=None):
+        """Takes one message already run through its extractor; returns a row when it completes an epoch.
+
+        Offline reprocessing extracts in worker processes and fuses here;
+        wall_time (unix seconds) then dates the row instead of the clock.
+        """
+        if identity not in self.required:
+            self.required = self.required | {identity}
+            logging.info(f"{identity} present, expecting it in every epoch from now on")
+        if itow is None:
+            self.untimed += 1
+            return None
+        key = (itow + KEY_RESOLUTION_MS // 2) // KEY_RESOLUTION_MS * KEY_RESOLUTION_MS % WEEK_MS
+
+        epoch = self._pending.get(key)
+        if epoch is None:
+            if self._is_old(key):
+                self.late += 1
+                return None
+            epoch = self._pending[key] = _Epoch(itow)
+            while len(self._pending) > self.max_pending:
+                self._drop(self._pending.popitem(last=False)[1])
+        if identity.startswith('NAV-'):
+            # The UBX iTOW is exact; NMEA's is only good to 10 ms
+            epoch.itow = itow
+        epoch.values.update(values)
+        if values:
+            epoch.seen.add(identity)
+        if epoch.seen != self.required:
+            return None
+
+        del self._pending[key]
+        self._newest_done = key
+        self.epochs += 1
+        values = epoch.values
+        # localtime(None) is the current time, as the recorder wants
+        values['timestamp'] = strftime("%Y-%m-%d %H:%M:%S", localtime(wall_time))
+        values['itow'] = epoch.itow
+        values['recv_time'] = round(monotonic() if recv_time is None else recv_time, 6)
+        return [values.get(field) for field in self.fields]
+
+    def _drop(self, epoch):
+        self.incomplete += 1
+        missing = self.required - epoch.seen
+        for name in missing:
+            self.missing[name] += 1
+        if self.incomplete <= LOG_INCOMPLETE:
+            logging.warning(f"Incomplete epoch at iTOW {epoch.itow} ms: no {', '.join(sorted(missing))}"
+                            + (" (further ones are only counted)" if self.incomplete == LOG_INCOMPLETE else ""))
+
+    def flush(self):
+        """Counts the epochs still waiting as incomplete; call once at the end of a run."""
+        while self._pending:
+            self._drop(self._pending.popitem(last=False)[1])
+
+    def summary(self):
+        missing = ', '.join(f"{count} without {name}" for name, count in sorted(self.missing.items()) if count)
+        return (f"{self.epochs} epochs, {self.incomplete} incomplete" + (f" ({missing})" if missing else "")
+                + f", {self.late} late and {self.untimed} untimed messages")
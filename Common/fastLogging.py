@@ -0,0 +1,169 @@
+import os
+import sys
+import atexit
+import logging
+import logging.handlers
+from queue import SimpleQueue
+from time import strftime, monotonic
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Each run's log is capped at MAX_BYTES and rotated into BACKUP_COUNT older files
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 3
+
+# Messages below WARNING from one call site (one format string) pass at most this often per second
+PER_SECOND = 2
+
+# logging's module flags for record fields LOG_FORMAT never shows; turned off while fast logging is set up
+SKIPPED_RECORD_FIELDS = ('logThreads', 'logProcesses', 'logMultiprocessing')
+
+_listener = None
+_queue_handler = None
+# The flags' values before setup_logging(), put back by stop_logging()
+_saved_flags = None
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queues the record as it is; the listener thread does the formatting.
+
+    The stock handler formats every message in the caller's thread before
+    queueing it. The listener runs in this process, so the record can be
+    passed along untouched and a message the file never needs costs no
+    formatting at all.
+    """
+
+    def prepare(self, record):
+        return record
+
+class SamplingFilter(logging.Filter):
+    """Passes at most `per_second` records a second per call site below WARNING.
+
+    Call sites are told apart by their format string, so lazy calls such as
+    logging.info("speed %s", speed) share one budget however their
+    arguments change. The number held back is added to the next record
+    that gets through.
+    """
+
+    def __init__(self, per_second=PER_SECOND):
+        super().__init__()
+        self.per_second = per_second
+        self.second = None
+        # format string: [records passed this second, records held back since the last one passed]
+        self.windows = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not isinstance(record.msg, str):
+            return True
+        second = int(record.created)
+        if second != self.second:
+            # Start a new second, keeping only what still has held-back records to report
+            self.second = second
+            self.windows = {msg: [0, held] for msg, (_, held) in self.windows.items() if held}
+        window = self.windows.get(record.msg)
+        if window is None:
+            self.windows[record.msg] = [1, 0]
+            return True
+        if window[0] >= self.per_second:
+            window[1] += 1
+            return False
+        window[0] += 1
+        if window[1]:
+            record.msg = f"{record.msg} [{window[1]} similar held back]"
+            window[1] = 0
+        return True
+
+class Sampler:
+    """Decides per message type whether to log, before anything is formatted.
+
+    For loops that could log every message: `if sampler.allow('NAV-PVT'):`
+    costs a clock read and a dict lookup when the answer is no, where even
+    a filtered logging call has to build a LogRecord first.
+    """
+
+    def __init__(self, per_second=PER_SECOND):
+        self.interval = 1 / per_second if per_second else 0
+        self.next_allowed = {}
+
+    def allow(self, key):
+        now = monotonic()
+        if now < self.next_allowed.get(key, 0):
+            return False
+        self.next_allowed[key] = now + self.interval
+        return True
+
+def run_log_file(log_dir, name):
+    """A log file for this run: <name>_<date>-<time>.log, so runs on the same day keep their own logs."""
+    os.makedirs(log_dir, exist_ok=True)
+    return os.path.join(log_dir, f'{name}_{strftime("%Y%m%d-%H%M%S")}.log')
+
+def setup_logging(log_file, level=logging.INFO, console_format=None, per_second=PER_SECOND,
+                  max_bytes=MAX_BYTES, backup_count=BACKUP_COUNT, force=False):
+    """Sends the root logger to a size-capped rotating file through a background thread.
+
+    Logging calls only queue the record; formatting and the file write happen
+    on the listener thread. console_format also mirrors the log to stdout.
+    per_second samples chatty call sites (0 keeps everything). Without force
+    an existing configuration is left alone, like logging.basicConfig.
+
+    The thread and process fields are not collected while this logging is
+    set up. Those flags belong to the logging module, so this holds for
+    every logger and handler in the process, not only this file's, until
+    stop_logging() restores them.
+    """
+    global _listener, _queue_handler, _saved_flags
+    root = logging.getLogger()
+    if root.handlers and not force:
+        return
+    stop_logging()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+        handler.close()
+
+    # Thread and process details are not in the format; skip collecting them per record
+    _saved_flags = {name: getattr(logging, name) for name in SKIPPED_RECORD_FIELDS}
+    for name in SKIPPED_RECORD_FIELDS:
+        setattr(logging, name, False)
+
+    file_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handlers = [file_handler]
+    if console_format:
+        console = logging.StreamHandler(sys.stdout)
+        console.setFormatter(logging.Formatter(console_format))
+        handlers.append(console)
+
+    queue = SimpleQueue()
+    _queue_handler = _QueueHandler(queue)
+    if per_second:
+        _queue_handler.addFilter(SamplingFilter(per_second))
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+    _listener = logging.handlers.QueueListener(queue, *handlers)
+    _listener.start()
+
+def stop_logging():
+    """Writes out whatever is still queued, stops the listener thread and restores the record flags."""
+    global _listener, _saved_flags
+    if _listener:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    if _saved_flags:
+        for name, value in _saved_flags.items():
+            setattr(logging, name, value)
+        _saved_flags = None
+
+def _after_fork_in_child():
+    # The listener thread does not survive a fork: a child logs straight to the same files instead
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+    _listener = _queue_handler = None
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+atexit.register(stop_logging)
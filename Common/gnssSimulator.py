@@ -0,0 +1,368 @@
+import os
+import sys
+import pty
+import tty
+import math
+import select
+import termios
+import struct
+import argparse
+import threading
+from array import array
+from datetime import datetime, timezone
+from time import time, sleep, monotonic
+from pyubx2 import UBXMessage, UBXReader, SET, POLL, GET
+from pyubx2.ubxhelpers import cfgkey2name, val2bytes
+from pynmeagps import NMEAMessage
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.ubxFraming import FrameSplitter, UBX_SYNC
+from Common.epochFusion import gps_itow
+
+EARTH_RADIUS = 6378137.0
+
+# Every message the simulator can output, in output order, with its CFG-MSGOUT key name
+OUTPUT_KEYS = {
+    'NAV-RELPOSNED': 'UBX_NAV_RELPOSNED',
+    'NAV-PVT': 'UBX_NAV_PVT',
+    'GNRMC': 'NMEA_ID_RMC',
+    'GNVTG': 'NMEA_ID_VTG',
+    'GNGGA': 'NMEA_ID_GGA',
+    'GNGSA': 'NMEA_ID_GSA',
+    'GNGSV': 'NMEA_ID_GSV',
+    'GNGLL': 'NMEA_ID_GLL',
+}
+MESSAGES = tuple(OUTPUT_KEYS)
+DEFAULT_MESSAGES = ('NAV-RELPOSNED', 'GNRMC')
+# What a ZED-F9P sends on UART1 out of the box
+FACTORY_MESSAGES = ('GNRMC', 'GNVTG', 'GNGGA', 'GNGSA', 'GNGSV', 'GNGLL')
+
+# 8N1: every byte takes ten bit times on the wire
+BITS_PER_BYTE = 10
+
+# termios speed constants back to baud rates
+TERMIOS_BAUDS = {getattr(termios, name): int(name[1:]) for name in dir(termios)
+                 if name[0] == 'B' and name[1:].isdigit()}
+
+CFG_CLASS = 0x06
+CFG_VALSET = 0x8A
+CFG_VALGET = 0x8B
+
+def _satellite_sentences():
+    """GSA and GSV sentences for a fixed sky; they do not change between epochs."""
+    gsa = []
+    for system_id in range(1, 5):
+        gsa.append(NMEAMessage('GN', 'GSA', 0, opMode='A', navMode=3, svid_01=1, svid_02=3, svid_03=7,
+                               svid_04=8, PDOP=1.2, HDOP=0.6, VDOP=1.0, systemId=system_id).serialize())
+    gsv = []
+    for talker, count in (('GP', 3), ('GL', 2), ('GA', 2), ('GB', 2)):
+        for number in range(1, count + 1):
+            satellites = {}
+            for slot in range(1, 5):
+                svid = (number - 1) * 4 + slot
+                satellites.update({f'svid_0{slot}': svid, f'elv_0{slot}': 10 + svid * 5,
+                                   f'az_0{slot}': svid * 30, f'cno_0{slot}': 30 + svid})
+            gsv.append(NMEAMessage(talker, 'GSV', 0, numMsg=count, msgNum=number, numSV=count * 4,
+                                   signalID=1, **satellites).serialize())
+    return b''.join(gsa), b''.join(gsv)
+
+class GnssSimulator:
+    """A stand-in ZED-F9P on a pseudo-terminal.
+
+    Emits valid UBX NAV-RELPOSNED/NAV-PVT and NMEA GNRMC/GNGGA (and the
+    rest of the factory NMEA set) for a rover driving a straight line,
+    `rate_hz` epochs per second. Bytes are paced as a UART at `baud` would
+    deliver them, so an epoch that does not fit in the wire time makes the
+    output fall behind (counted in late_epochs). Like a UART the pty does
+    not wait for a slow reader: a message that finds the pty buffer full
+    is dropped and counted in `dropped`.
+
+    The simulator answers CFG-VALSET and CFG-VALGET with ACK-ACK/ACK-NAK
+    like the receiver does; CFG_RATE_MEAS/NAV, CFG_UART1_BAUDRATE and the
+    CFG_MSGOUT_*_UART1 rates of the messages above change its output.
+    Keys in `reject_keys` are NAKed, for testing rollback. When the host
+    opens the port at a different baud rate than the receiver's, output
+    arrives as noise and commands are ignored, as on a real UART.
+
+    Connect the code under test to `port`; `sent` maps each message name
+    to the monotonic times its messages finished writing, for latency
+    measurements.
+    """
+
+    def __init__(self, rate_hz=10, baud=230400, messages=DEFAULT_MESSAGES, lat=52.0, lon=5.0,
+                 speed=1.5, heading=45.0, baseline=(1.0, 0.5, -0.03), reject_keys=()):
+        unknown = set(messages) - set(MESSAGES)
+        if unknown:
+            raise ValueError(f"Unsupported messages: {', '.join(sorted(unknown))}")
+        self.lat = lat
+        self.lon = lon
+        self.speed = speed
+        self.heading = heading
+        self.baseline = baseline
+        self.reject_keys = set(reject_keys)
+
+        # The receiver's configuration by key name; keys not listed read back as 0
+        self.config = {'CFG_RATE_MEAS': int(round(1000 / rate_hz)), 'CFG_RATE_NAV': 1, 'CFG_UART1_BAUDRATE': baud}
+        for name, key in OUTPUT_KEYS.items():
+            self.config[f'CFG_MSGOUT_{key}_UART1'] = 1 if name in messages else 0
+        self._gsa, self._gsv = _satellite_sentences()
+
+        self.master_fd, self._slave_fd = pty.openpty()
+        # Raw mode so UBX bytes are not translated by the line discipline
+        tty.setraw(self._slave_fd)
+        os.set_blocking(self.master_fd, False)
+        self.port = os.ttyname(self._slave_fd)
+
+        self.epochs = 0
+        self.late_epochs = 0
+        self.bytes_sent = 0
+        self.dropped = 0
+        self.acks = 0
+        self.naks = 0
+        self.sent = {name: array('d') for name in MESSAGES}
+        self._write_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._closed = False
+        self._commands = threading.Thread(target=self._serve_commands, name='gnss-simulator-cfg', daemon=True)
+        self._commands.start()
+
+    @property
+    def baud(self):
+        return self.config['CFG_UART1_BAUDRATE']
+
+    @property
+    def rate_hz(self):
+        return 1000 / (self.config['CFG_RATE_MEAS'] * max(self.config['CFG_RATE_NAV'], 1))
+
+    @property
+    def messages(self):
+        """Messages currently enabled on UART1."""
+        return tuple(name for name, key in OUTPUT_KEYS.items() if self.config.get(f'CFG_MSGOUT_{key}_UART1'))
+
+    def _position(self, elapsed):
+        distance = self.speed * elapsed
+        north = distance * math.cos(math.radians(self.heading))
+        east = distance * math.sin(math.radians(self.heading))
+        lat = self.lat + math.degrees(north / EARTH_RADIUS)
+        lon = self.lon + math.degrees(east / (EARTH_RADIUS * math.cos(math.radians(self.lat))))
+        return lat, lon
+
+    def epoch_messages(self, unix_time, elapsed):
+        """Returns [(name, bytes)] for one navigation epoch."""
+        lat, lon = self._position(elapsed)
+        itow = gps_itow(unix_time)
+        utc = datetime.fromtimestamp(unix_time, timezone.utc)
+        north, east, down = self.baseline
+        knots = self.speed * 3600 / 1852
+        output = []
+        for name in self.messages:
+            if name == 'GNGSA':
+                # The sky is fixed, so GSA and GSV go out as prebuilt blocks for all constellations
+                output.append((name, self._gsa))
+                continue
+            if name == 'GNGSV':
+                output.append((name, self._gsv))
+                continue
+            if name == 'NAV-RELPOSNED':
+                message = UBXMessage('NAV', 'NAV-RELPOSNED', 0, version=1, iTOW=itow,
+                                     relPosN=int(north * 100), relPosE=int(east * 100), relPosD=int(down * 100),
+                                     relPosLength=int(math.hypot(north, east, down) * 100),
+                                     relPosHeading=math.degrees(math.atan2(east, north)) % 360,
+                                     gnssFixOK=1, carrSoln=2, relPosValid=1, relPosHeadingValid=1)
+            elif name == 'NAV-PVT':
+                message = UBXMessage('NAV', 'NAV-PVT', 0, iTOW=itow, year=utc.year, month=utc.month, day=utc.day,
+                                     hour=utc.hour, min=utc.minute, second=utc.second, validDate=1, validTime=1,
+                                     fixType=3, gnssFixOk=1, carrSoln=2, numSV=18, lat=lat, lon=lon,
+                                     height=12000, hMSL=10000, hAcc=14, vAcc=20, gSpeed=int(self.speed * 1000),
+                                     headMot=self.heading, pDOP=1.2)
+            elif name == 'GNRMC':
+                message = NMEAMessage('GN', 'RMC', 0, time=utc.time(), date=utc.date(), status='A',
+                                      lat=lat, NS='N', lon=lon, EW='E', spd=knots, cog=self.heading, posMode='R')
+            elif name == 'GNVTG':
+                message = NMEAMessage('GN', 'VTG', 0, cogt=self.heading, cogtUnit='T', cogm='', cogmUnit='M',
+                                      sogn=knots, sognUnit='N', sogk=self.speed * 3.6, sogkUnit='K', posMode='R')
+            elif name == 'GNGGA':
+                message = NMEAMessage('GN', 'GGA', 0, time=utc.time(), lat=lat, NS='N', lon=lon, EW='E',
+                                      quality=4, numSV=18, HDOP=0.6, alt=10.0, altUnit='M', sep=47.0, sepUnit='M')
+            else:
+                message = NMEAMessage('GN', 'GLL', 0, lat=lat, NS='N', lon=lon, EW='E', time=utc.time(),
+                                      status='A', posMode='R')
+            output.append((name, message.serialize()))
+        return output
+
+    def host_baud(self):
+        """The baud rate the host side has set on the port."""
+        return TERMIOS_BAUDS.get(termios.tcgetattr(self.master_fd)[5])
+
+    def _baud_matches(self):
+        return self.host_baud() == self.baud
+
+    def _write(self, data):
+        """Writes one message; returns False if it was dropped because nobody is reading."""
+        if not self._baud_matches():
+            # At the wrong baud rate the host only sees noise
+            data = os.urandom(len(data))
+        with self._write_lock:
+            try:
+                written = os.write(self.master_fd, data)
+            except BlockingIOError:
+                return False
+            # A partly written message is finished off so the stream stays framed
+            while written < len(data):
+                select.select([], [self.master_fd], [])
+                try:
+                    written += os.write(self.master_fd, data[written:])
+                except BlockingIOError:
+                    pass
+            return True
+
+    def _ack(self, msg_id, ok):
+        if ok:
+            self.acks += 1
+        else:
+            self.naks += 1
+        ack = UBXMessage('ACK', 'ACK-ACK' if ok else 'ACK-NAK', GET, clsID=CFG_CLASS, msgID=msg_id)
+        self._write(ack.serialize())
+
+    def _valset(self, frame):
+        try:
+            parsed = UBXReader.parse(frame, msgmode=SET)
+        except Exception:
+            # Unknown key IDs do not parse
+            return self._ack(CFG_VALSET, False)
+        settings = {name: value for name, value in vars(parsed).items() if name.startswith('CFG_')}
+        if not settings or self.reject_keys & set(settings):
+            return self._ack(CFG_VALSET, False)
+        baud = settings.pop('CFG_UART1_BAUDRATE', None)
+        self.config.update(settings)
+        # The ACK still goes out at the old baud rate
+        self._ack(CFG_VALSET, True)
+        if baud is not None:
+            self.config['CFG_UART1_BAUDRATE'] = baud
+
+    def _valget(self, frame):
+        try:
+            parsed = UBXReader.parse(frame, msgmode=POLL)
+        except Exception:
+            return self._ack(CFG_VALGET, False)
+        payload = bytearray((1, parsed.layer)) + struct.pack('<H', parsed.position)
+        for name, key_id in vars(parsed).items():
+            if not name.startswith('keys_'):
+                continue
+            try:
+                key_name, att = cfgkey2name(key_id)
+            except Exception:
+                return self._ack(CFG_VALGET, False)
+            payload += struct.pack('<I', key_id) + val2bytes(self.config.get(key_name, 0), att)
+        self._write(UBXMessage('CFG', 'CFG-VALGET', GET, payload=bytes(payload)).serialize())
+        self._ack(CFG_VALGET, True)
+
+    def _serve_commands(self):
+        """Answers configuration messages written to the port."""
+        splitter = FrameSplitter()
+        while not self._closed:
+            try:
+                readable, _, _ = select.select([self.master_fd], [], [], 0.2)
+                if not readable:
+                    continue
+                data = os.read(self.master_fd, 4096)
+            except (BlockingIOError, InterruptedError):
+                continue
+            except (OSError, ValueError):
+                # The pty was closed
+                return
+            if not self._baud_matches():
+                # Garbled on the way in as well
+                continue
+            for frame in splitter.feed(data):
+                if not frame.startswith(UBX_SYNC) or frame[2] != CFG_CLASS:
+                    continue
+                if frame[3] == CFG_VALSET:
+                    self._valset(frame)
+                elif frame[3] == CFG_VALGET:
+                    self._valget(frame)
+                else:
+                    self._ack(frame[3], False)
+
+    def run(self, duration=None):
+        """Emits epochs until stop() or for `duration` seconds."""
+        started = monotonic()
+        # Like a real receiver, epochs fall on whole milliseconds of the second they started in
+        started_unix = round(time())
+        deadline = started
+        wire_free = started
+        while not self._stop.is_set():
+            if duration is not None and deadline - started >= duration:
+                break
+            # The rate can change between epochs through CFG-VALSET
+            period = 1 / self.rate_hz
+            delay = deadline - monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            elif -delay > period:
+                # A whole period behind: the wire (or this thread) cannot keep up with the rate
+                self.late_epochs += 1
+            byte_time = BITS_PER_BYTE / self.baud
+            elapsed = round(deadline - started, 3)
+            for name, data in self.epoch_messages(started_unix + elapsed, elapsed):
+                # Hold each message back until the simulated UART has sent the previous one
+                wire_free = max(wire_free, monotonic()) + len(data) * byte_time
+                delay = wire_free - monotonic()
+                if delay > 0:
+                    sleep(delay)
+                if self._write(data):
+                    self.sent[name].append(monotonic())
+                    self.bytes_sent += len(data)
+                else:
+                    self.dropped += 1
+            self.epochs += 1
+            # Absolute deadlines keep the epoch rate exact
+            deadline += period
+
+    def start(self, duration=None):
+        """Runs the simulator on a background thread."""
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, args=(duration,), name='gnss-simulator', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def close(self):
+        self.stop()
+        self._closed = True
+        self._commands.join()
+        os.close(self.master_fd)
+        os.close(self._slave_fd)
+
+    def summary(self):
+        sent = sum(len(times) for times in self.sent.values())
+        return (f"{self.epochs} epochs at {self.rate_hz:g} Hz ({self.late_epochs} late), {sent} messages, "
+                f"{self.bytes_sent} bytes at {self.baud} baud, {self.dropped} dropped, "
+                f"{self.acks} ACK / {self.naks} NAK")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulated ZED-F9P on a pseudo-terminal.")
+    parser.add_argument('--rate', type=float, default=10, help="navigation rate in Hz (default: 10)")
+    parser.add_argument('--baud', type=int, default=230400, help="simulated baud rate (default: 230400)")
+    parser.add_argument('--messages', default=','.join(DEFAULT_MESSAGES),
+                        help=f"comma-separated messages out of {', '.join(MESSAGES)}, or 'factory'")
+    parser.add_argument('--duration', type=float, help="stop after this many seconds")
+    args = parser.parse_args()
+
+    messages = FACTORY_MESSAGES if args.messages == 'factory' else args.messages.split(',')
+    simulator = GnssSimulator(args.rate, args.baud, messages)
+    print(f"Simulated receiver on {simulator.port}, e.g.:")
+    print(f"  python3 Record/parseAndRecordData.py 12 --port {simulator.port} --baud {args.baud}")
+    sys.stdout.flush()
+    try:
+        simulator.run(args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(simulator.summary())
+        simulator.close()
@@ -0,0 +1,146 @@
+import os
+import sys
+import threading
+import argparse
+from collections import namedtuple
+from time import time, sleep
+
+# Seconds between samples
+INTERVAL = 1.0
+
+THERMAL_ZONE = '/sys/class/thermal/thermal_zone0/temp'
+# Per-port serial counters; ttyAMA for the PL011 UARTs, serial for the mini UART (ttyS0)
+TTY_DRIVER_DIR = '/proc/tty/driver'
+
+# One sample; None where the value could not be read. cpu_percent covers the time since the
+# previous sample, uart_* are the kernel's running counters for the receiver's port
+HealthSnapshot = namedtuple('HealthSnapshot', 'time cpu_percent load_1m mem_used_percent mem_available_mb '
+                            'soc_temp uart_rx uart_frame_errors uart_overruns uart_parity_errors')
+
+# Columns a recorder can add to every row, in snapshot order
+ROW_FIELDS = ['cpu_percent', 'load_1m', 'mem_used_percent', 'soc_temp', 'uart_frame_errors', 'uart_overruns']
+_ROW_INDEXES = [HealthSnapshot._fields.index(field) for field in ROW_FIELDS]
+
+EMPTY = HealthSnapshot(*([None] * len(HealthSnapshot._fields)))
+
+def read_cpu_times():
+    """(busy, total) jiffies over all CPUs from /proc/stat."""
+    with open('/proc/stat', 'rb') as stat:
+        values = [int(value) for value in stat.readline().split()[1:]]
+    idle = values[3] + (values[4] if len(values) > 4 else 0)  # idle + iowait
+    total = sum(values[:8])  # guest time is already counted in user
+    return total - idle, total
+
+def read_load():
+    with open('/proc/loadavg', 'rb') as loadavg:
+        return float(loadavg.read().split()[0])
+
+def read_memory():
+    """(used percent, available MB) from /proc/meminfo."""
+    fields = {}
+    with open('/proc/meminfo', 'rb') as meminfo:
+        for line in meminfo:
+            name, value = line.split(b':', 1)
+            if name in (b'MemTotal', b'MemAvailable'):
+                fields[name] = int(value.split()[0])  # kB
+                if len(fields) == 2:
+                    break
+    total, available = fields[b'MemTotal'], fields[b'MemAvailable']
+    return round(100 * (total - available) / total, 1), round(available / 1024, 1)
+
+def read_soc_temp(path=THERMAL_ZONE):
+    """SoC temperature in degrees C, or None where there is no thermal zone."""
+    try:
+        with open(path, 'rb') as zone:
+            return int(zone.read()) / 1000
+    except (OSError, ValueError):
+        return None
+
+def uart_counters_path(port):
+    """The /proc/tty/driver file and line number for a serial device such as /dev/ttyAMA0."""
+    name = os.path.basename(port)
+    for prefix, driver in (('ttyAMA', 'ttyAMA'), ('ttyS', 'serial')):
+        if name.startswith(prefix) and name[len(prefix):].isdigit():
+            return os.path.join(TTY_DRIVER_DIR, driver), int(name[len(prefix):])
+    return None, None
+
+def read_uart_counters(path, line_number):
+    """{'rx':, 'fe':, 'oe':, 'pe':} for one port; empty when the file is missing or not readable (it needs root)."""
+    if path is None:
+        return {}
+    try:
+        with open(path, 'rb') as driver:
+            prefix = b'%d:' % line_number
+            for line in driver:
+                if line.startswith(prefix):
+                    return {key.decode(): int(value) for key, _, value in
+                            (field.partition(b':') for field in line.split()[1:]) if value.isdigit()}
+    except OSError:
+        pass
+    return {}
+
+class HealthSampler:
+    """Samples CPU, load, memory, SoC temperature and UART error counters on a background thread.
+
+    Everything comes from /proc and /sys, a handful of small file reads, so
+    nothing in the recording loop waits on psutil or a vcgencmd process.
+    Each sample is a new HealthSnapshot bound to `latest` (and its
+    ROW_FIELDS to `latest_row`); rebinding an attribute is atomic, so
+    readers in any thread take the current sample without a lock and never
+    see half of one.
+    """
+
+    def __init__(self, interval=INTERVAL, port='/dev/ttyAMA0'):
+        self.interval = interval
+        self.uart_path, self.uart_line = uart_counters_path(port)
+        self._cpu = None
+        self.latest = EMPTY
+        self.latest_row = [None] * len(ROW_FIELDS)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        """Takes one sample, publishes it and returns it."""
+        busy, total = read_cpu_times()
+        cpu_percent = None
+        if self._cpu and total > self._cpu[1]:
+            cpu_percent = round(100 * (busy - self._cpu[0]) / (total - self._cpu[1]), 1)
+        self._cpu = busy, total
+        mem_used, mem_available = read_memory()
+        uart = read_uart_counters(self.uart_path, self.uart_line)
+        snapshot = HealthSnapshot(time(), cpu_percent, read_load(), mem_used, mem_available, read_soc_temp(),
+                                  uart.get('rx'), uart.get('fe'), uart.get('oe'), uart.get('pe'))
+        self.latest = snapshot
+        # The ROW_FIELDS of the same sample, ready to be appended to a CSV row
+        self.latest_row = [snapshot[index] for index in _ROW_INDEXES]
+        return snapshot
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        """Takes a first sample (so CPU usage has a baseline) and starts the thread."""
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name='health-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Print system health once a second.")
+    parser.add_argument('--port', default='/dev/ttyAMA0', help="serial port whose error counters to show")
+    parser.add_argument('--interval', type=float, default=INTERVAL, help=f"seconds between samples (default: {INTERVAL})")
+    args = parser.parse_args()
+    sampler = HealthSampler(args.interval, args.port).start()
+    try:
+        while True:
+            sleep(args.interval)
+            print(' '.join(f"{name}={value}" for name, value in sampler.latest._asdict().items() if name != 'time'))
+    except KeyboardInterrupt:
+        sampler.close()
+        sys.exit(0)
@@ -0,0 +1,105 @@
+import queue
+import logging
+import threading
+from array import array
+from functools import partial
+from time import monotonic
+from gpiozero import Button, OutputDevice
+
+# Default wiring of the 4x4 keypad on the rover
+ROW_PINS = (5, 6, 13, 19)
+COLUMN_PINS = (12, 16, 20, 21)
+KEYMAP = (
+    ("1", "2", "3", "A"),
+    ("4", "5", "6", "B"),
+    ("7", "8", "9", "C"),
+    ("*", "0", "#", "D"),
+)
+
+class MatrixKeypad:
+    """Interrupt-driven 4x4 matrix keypad that queues key presses.
+
+    All rows are driven high while idle, so pressing any key raises its
+    column and fires a gpiozero edge callback. The callback then scans the
+    rows once to find which key it was, applies the per-key debounce and
+    puts (key, monotonic press time) on a thread-safe queue. Nothing runs
+    between key presses.
+    """
+
+    def __init__(self, row_pins=ROW_PINS, column_pins=COLUMN_PINS, keymap=KEYMAP,
+                 debounce_time=0.5, bounce_time=0.1, pin_factory=None, max_events=32):
+        self.keymap = keymap
+        self.debounce_time = debounce_time
+        self.rows = [OutputDevice(pin, pin_factory=pin_factory) for pin in row_pins]
+        self.columns = [Button(pin, pull_up=False, bounce_time=bounce_time, pin_factory=pin_factory)
+                        for pin in column_pins]
+
+        # Last accepted press time per key, indexed row * columns + column
+        self._last_press = array('d', [0.0] * (len(self.rows) * len(self.columns)))
+        self._scan_lock = threading.Lock()
+        self.events = queue.Queue(maxsize=max_events)
+        self.dropped = 0
+
+        # Idle state: every row driven so a press on any row raises the column
+        for row in self.rows:
+            row.on()
+        for column_index, column in enumerate(self.columns):
+            column.when_pressed = partial(self._on_column, column_index)
+
+    def _find_row(self, column):
+        """Drives one row at a time to find which row the pressed key is on."""
+        for row in self.rows:
+            row.off()
+        try:
+            for row_index, row in enumerate(self.rows):
+                row.on()
+                pressed = column.is_pressed
+                row.off()
+                if pressed:
+                    return row_index
+            return None
+        finally:
+            for row in self.rows:
+                row.on()
+
+    def _on_column(self, column_index):
+        """Edge callback: identifies the key, debounces it and queues the event."""
+        pressed_at = monotonic()
+        with self._scan_lock:
+            row_index = self._find_row(self.columns[column_index])
+        if row_index is None:
+            return
+        key_index = row_index * len(self.columns) + column_index
+        # The rescan itself makes the column bounce, so debounce per key
+        if pressed_at - self._last_press[key_index] <= self.debounce_time:
+            return
+        self._last_press[key_index] = pressed_at
+        try:
+            self.events.put_nowait((self.keymap[row_index][column_index], pressed_at))
+        except queue.Full:
+            self.dropped += 1
+            logging.warning("Keypad event queue full, key press dropped")
+
+    def get_event(self, timeout=None):
+        """Waits for the next (key, press_time) event; returns None on timeout."""
+        try:
+            return self.events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def get_key(self, timeout=None):
+        """Waits for the next key; returns None on timeout."""
+        event = self.get_event(timeout)
+        return event[0] if event else None
+
+    def clear(self):
+        """Discards key presses that nobody has consumed yet."""
+        while True:
+            try:
+                self.events.get_nowait()
+            except queue.Empty:
+                return
+
+    def close(self):
+        for device in self.columns + self.rows:
+            device.close()
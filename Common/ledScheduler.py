@@ -0,0 +1,139 @@
+import logging
+import threading
+from collections import namedtuple
+from time import monotonic
+import gpiozero
+
+# A pattern is a sequence of (led_on, seconds) steps played `repeat` times (None = forever)
+Pattern = namedtuple('Pattern', ['steps', 'repeat'])
+
+def solid(duration=None):
+    """LED on, for `duration` seconds or until something else is played."""
+    return Pattern(((True, duration),), 1)
+
+def blink(on_time=0.5, off_time=0.5, count=None):
+    """Regular blinking, `count` times or forever."""
+    return Pattern(((True, on_time), (False, off_time)), count)
+
+def burst(flashes=3, on_time=0.1, off_time=0.1, pause=1.0, count=None):
+    """Groups of quick flashes separated by a pause."""
+    steps = ((True, on_time), (False, off_time)) * flashes
+    return Pattern(steps[:-1] + ((False, pause),), count)
+
+class _Playing:
+    """Playback state of one LED."""
+    __slots__ = ('pattern', 'step', 'repeats_left', 'deadline', 'done')
+
+    def __init__(self, pattern, now):
+        self.pattern = pattern
+        self.step = -1
+        self.repeats_left = pattern.repeat
+        self.deadline = now
+        self.done = threading.Event()
+
+class LedScheduler:
+    """Plays LED patterns for all LEDs from a single timer thread.
+
+    Starting a pattern never blocks: it is recorded and the thread applies
+    each step when its deadline comes up, sleeping on a condition variable
+    in between. Playing a new pattern on an LED replaces the old one.
+    """
+
+    def __init__(self):
+        self._playing = {}
+        self._state = {}
+        self._condition = threading.Condition()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='led-scheduler', daemon=True)
+        self._thread.start()
+
+    def play(self, led, pattern):
+        """Starts a pattern on an LED; returns an Event that is set when it ends."""
+        with self._condition:
+            previous = self._playing.get(led)
+            if previous:
+                previous.done.set()
+            playing = self._playing[led] = _Playing(pattern, monotonic())
+            self._condition.notify()
+        return playing.done
+
+    def solid(self, led, duration=None):
+        return self.play(led, solid(duration))
+
+    def blink(self, led, on_time=0.5, off_time=0.5, count=None):
+        return self.play(led, blink(on_time, off_time, count))
+
+    def burst(self, led, flashes=3, on_time=0.1, off_time=0.1, pause=1.0, count=None):
+        return self.play(led, burst(flashes, on_time, off_time, pause, count))
+
+    def off(self, led):
+        """Stops any pattern and turns the LED off."""
+        with self._condition:
+            previous = self._playing.pop(led, None)
+            if previous:
+                previous.done.set()
+            self._set(led, False)
+
+    def set(self, led, on):
+        """Cheap direct on/off for status LEDs; does nothing if the state is unchanged."""
+        if self._state.get(led) == on and led not in self._playing:
+            return
+        with self._condition:
+            previous = self._playing.pop(led, None)
+            if previous:
+                previous.done.set()
+            self._set(led, on)
+
+    def _set(self, led, on):
+        try:
+            if on:
+                led.on()
+            else:
+                led.off()
+            self._state[led] = on
+        except gpiozero.exc.GPIODeviceClosed:
+            logging.warning("Attempted to turn on/off an already closed or uninitialized LED")
+            self._playing.pop(led, None)
+
+    def _advance(self, led, playing, now):
+        """Applies the next step of a pattern; returns False when the pattern has ended."""
+        steps = playing.pattern.steps
+        playing.step += 1
+        if playing.step == len(steps):
+            if playing.repeats_left is not None:
+                playing.repeats_left -= 1
+                if playing.repeats_left <= 0:
+                    return False
+            playing.step = 0
+        on, duration = steps[playing.step]
+        self._set(led, on)
+        # Deadlines are absolute so a late wake-up does not stretch the pattern
+        playing.deadline = None if duration is None else max(playing.deadline + duration, now)
+        return True
+
+    def _run(self):
+        with self._condition:
+            while self._running:
+                now = monotonic()
+                next_deadline = None
+                for led, playing in list(self._playing.items()):
+                    while playing.deadline is not None and playing.deadline <= now:
+                        if not self._advance(led, playing, now):
+                            # A finished pattern leaves the LED off
+                            self._playing.pop(led, None)
+                            self._set(led, False)
+                            playing.done.set()
+                            break
+                    else:
+                        if playing.deadline is not None and (next_deadline is None or playing.deadline < next_deadline):
+                            next_deadline = playing.deadline
+                self._condition.wait(None if next_deadline is None else next_deadline - now)
+
+    def close(self):
+        """Stops the timer thread and turns every LED off."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+        for led in list(self._state):
+            self._set(led, False)
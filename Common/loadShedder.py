@@ -0,0 +1,173 @@
+import logging
+from time import monotonic
+from pyubx2 import UBXMessage
+from pyubx2.ubxtypes_core import UBX_MSGIDS
+from Common.ubxFraming import UBX_SYNC
+from Common.receiverConfig import LAYER_RAM
+
+# Load-shedding stages, in the order they are taken
+FULL = 0            # everything parsed, per-message fields logged
+QUIET = 1           # logging below WARNING and the per-message field logging off
+ESSENTIAL = 2       # frames the recording mode does not use are dropped before parsing
+REDUCED_RATE = 3    # the receiver's measurement rate is lowered through CFG-RATE
+STAGE_NAMES = ('full', 'quiet', 'essential messages only', 'reduced rate')
+
+# A sample at or above either limit is constrained; the Pi 4 starts soft-throttling at 80 'C
+CPU_HIGH = 85.0
+TEMP_HIGH = 75.0
+# Headroom: both readings below these
+CPU_OK = 60.0
+TEMP_OK = 70.0
+
+# Consecutive health samples needed before stepping down or back up; stepping up waits longer so it does not flap
+STEP_DOWN_SAMPLES = 3
+STEP_UP_SAMPLES = 10
+
+# REDUCED_RATE measures this many times less often
+RATE_DIVISOR = 2
+
+# UBX message name: class and ID bytes as they appear at frame[2:4]
+_UBX_IDS = {name: msg_id for msg_id, name in UBX_MSGIDS.items()}
+
+def essential_keys(identities):
+    """Frame keys (UBX class and ID, or the NMEA sentence type) of the messages a fuser uses."""
+    keys = set()
+    for identity in identities:
+        if identity in _UBX_IDS:
+            keys.add(_UBX_IDS[identity])
+        else:
+            # NMEA: any talker, so GNRMC covers GPRMC as well
+            keys.add(identity[2:].encode())
+    return frozenset(keys)
+
+class LoadShedder:
+    """Steps the recorder down when the Pi runs hot or out of CPU, and back up when it recovers.
+
+    Driven by a HealthSampler's `latest` snapshot (anything with the same
+    attribute will do, see Random Test Files/testLoadShedding.py). After
+    STEP_DOWN_SAMPLES constrained samples in a row it goes one stage down:
+    QUIET turns the debug and field logging off, ESSENTIAL drops frames
+    the fuser has no use for before they are parsed, REDUCED_RATE sends a
+    CFG-VALSET (RAM layer) for CFG_RATE_MEAS to slow the receiver. After
+    STEP_UP_SAMPLES samples with headroom it undoes the last stage. Every
+    transition is logged as a warning, so it stays in the log while QUIET.
+
+    REDUCED_RATE needs the receiver's navigation `rate` (Hz) and a `stream`
+    to write to; without them shedding stops at ESSENTIAL. on_rate(hz) is
+    called when the receiver's rate changes. update() is cheap when there
+    is no new sample, so it can be called for every frame.
+    """
+
+    def __init__(self, health, fuser, stream=None, rate=None, on_rate=None,
+                 cpu_high=CPU_HIGH, temp_high=TEMP_HIGH, cpu_ok=CPU_OK, temp_ok=TEMP_OK,
+                 step_down_samples=STEP_DOWN_SAMPLES, step_up_samples=STEP_UP_SAMPLES):
+        self.health = health
+        self.fuser = fuser
+        self.stream = stream
+        self.rate = rate
+        self.on_rate = on_rate
+        self.cpu_high = cpu_high
+        self.temp_high = temp_high
+        self.cpu_ok = cpu_ok
+        self.temp_ok = temp_ok
+        self.step_down_samples = step_down_samples
+        self.step_up_samples = step_up_samples
+        self.max_stage = REDUCED_RATE if stream is not None and rate else ESSENTIAL
+        self.essential = essential_keys(fuser.extractors)
+        self.stage = FULL
+        self.transitions = []
+        self.skipped = 0
+        self._seen = None
+        self._constrained = 0
+        self._clear = 0
+        self._saved_level = None
+        self._saved_log_fields = None
+        self._stage_started = monotonic()
+        self._stage_seconds = [0.0] * len(STAGE_NAMES)
+        if self.max_stage < REDUCED_RATE:
+            logging.info("Load shedding stops at dropping messages: the receiver's rate or port is not known")
+
+    def update(self):
+        """Looks at the latest health sample, if it is new, and changes stage when needed; returns the stage."""
+        snapshot = self.health.latest
+        if snapshot is self._seen:
+            return self.stage
+        self._seen = snapshot
+        cpu, temp = snapshot.cpu_percent, snapshot.soc_temp
+        if (cpu is not None and cpu >= self.cpu_high) or (temp is not None and temp >= self.temp_high):
+            self._constrained += 1
+            self._clear = 0
+        elif (cpu is None or cpu < self.cpu_ok) and (temp is None or temp < self.temp_ok):
+            self._clear += 1
+            self._constrained = 0
+        else:
+            # In between: hold the current stage
+            self._constrained = self._clear = 0
+
+        if self._constrained >= self.step_down_samples and self.stage < self.max_stage:
+            self._change(self.stage + 1, snapshot)
+        elif self._clear >= self.step_up_samples and self.stage > FULL:
+            self._change(self.stage - 1, snapshot)
+        return self.stage
+
+    def skip(self, frame):
+        """True for a raw frame that should not be parsed at the current stage."""
+        if self.stage < ESSENTIAL:
+            return False
+        key = frame[2:4] if frame.startswith(UBX_SYNC) else frame[3:6]
+        if key in self.essential:
+            return False
+        self.skipped += 1
+        return True
+
+    def _change(self, stage, snapshot):
+        old = self.stage
+        if stage > old:
+            self._enter(stage)
+        else:
+            self._leave(old)
+        now = monotonic()
+        self._stage_seconds[old] += now - self._stage_started
+        self._stage_started = now
+        self.stage = stage
+        self._constrained = self._clear = 0
+        self.transitions.append((snapshot.time, old, stage))
+        logging.warning(f"Load shedding: stage {old} -> {stage} ({STAGE_NAMES[stage]}), "
+                        f"cpu {snapshot.cpu_percent}%, SoC {snapshot.soc_temp} 'C")
+
+    def _enter(self, stage):
+        if stage == QUIET:
+            root = logging.getLogger()
+            self._saved_level = root.level
+            root.setLevel(max(root.level, logging.WARNING))
+            self._saved_log_fields = self.fuser.log_fields
+            self.fuser.log_fields = False
+        elif stage == REDUCED_RATE:
+            self._set_rate(self.rate / RATE_DIVISOR)
+
+    def _leave(self, stage):
+        if stage == QUIET:
+            logging.getLogger().setLevel(self._saved_level)
+            self.fuser.log_fields = self._saved_log_fields
+        elif stage == REDUCED_RATE:
+            self._set_rate(self.rate)
+
+    def _set_rate(self, rate):
+        # The ACK comes back through the recorder's own reader, which ignores it
+        meas_ms = int(round(1000 / rate))
+        self.stream.write(UBXMessage.config_set(LAYER_RAM, 0, [('CFG_RATE_MEAS', meas_ms)]).serialize())
+        self.stream.flush()
+        if self.on_rate:
+            self.on_rate(1000 / meas_ms)
+
+    def close(self):
+        """Undoes every stage still in force (the receiver goes back to its rate) and logs the time spent in each."""
+        while self.stage > FULL:
+            self._change(self.stage - 1, self.health.latest)
+        self._stage_seconds[FULL] += monotonic() - self._stage_started
+        self._stage_started = monotonic()
+        logging.info(f"Load shedding: {self.summary()}")
+
+    def summary(self):
+        spent = ', '.join(f"{seconds:.0f} s {name}" for name, seconds in zip(STAGE_NAMES, self._stage_seconds) if seconds)
+        return f"{len(self.transitions)} transitions, {self.skipped} frames skipped; {spent or 'no time recorded'}"
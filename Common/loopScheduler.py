@@ -0,0 +1,165 @@
+import logging
+from bisect import bisect_left
+from time import monotonic, sleep
+
+# Histogram bucket upper edges in ms; the last bucket takes everything above
+BUCKET_EDGES_MS = (0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# What to do with deadlines that have already passed when a late tick is over
+CATCH_UP = 'catch-up'   # run them back to back until the loop is on schedule again
+SKIP = 'skip'           # drop them and carry on at the next deadline still ahead
+
+# Catch-up gives up and skips after this many periods behind, so a long stall is not followed by a burst
+MAX_CATCH_UP = 5
+
+class Histogram:
+    """Counts of millisecond values in BUCKET_EDGES_MS buckets, plus count, mean and max."""
+
+    def __init__(self, edges=BUCKET_EDGES_MS):
+        self.edges = edges
+        self.counts = [0] * (len(edges) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect_left(self.edges, ms)] += 1
+        self.count += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def lines(self):
+        """One line per non-empty bucket: range, count and share."""
+        lines = []
+        for bucket, count in enumerate(self.counts):
+            if not count:
+                continue
+            low = self.edges[bucket - 1] if bucket else 0
+            label = f"> {low} ms" if bucket == len(self.edges) else f"{low}-{self.edges[bucket]} ms"
+            lines.append(f"{label:>14}: {count:8d} ({count / self.count:6.1%})")
+        return lines
+
+    def summary(self):
+        if not self.count:
+            return "no samples"
+        return f"{self.count} samples, mean {self.total / self.count:.3f} ms, max {self.max:.3f} ms"
+
+class LoopScheduler:
+    """Keeps a loop at a fixed rate against absolute monotonic deadlines.
+
+    Deadline k is start + k * period, so time spent in the loop body or a
+    late wake-up never shifts the ticks that follow. wait() sleeps until
+    the next deadline; when the body ran past it the tick is an overrun,
+    and the deadlines already missed are caught up or skipped according to
+    `policy`. wait_until() sleeps until an arbitrary offset from the start
+    (replay follows the recorded row times), and tick() only measures a
+    loop that something else paces, such as a receiver sending epochs.
+
+    Jitter (how late each tick starts) and overrun (how far past its
+    deadline the body ran) are kept in histograms; log_report() writes them
+    to the log at the end of a run.
+    """
+
+    def __init__(self, rate_hz=None, policy=SKIP, name='loop', clock=monotonic, sleeper=sleep):
+        if policy not in (CATCH_UP, SKIP):
+            raise ValueError(f"Unknown policy {policy!r}")
+        self.period = 1 / rate_hz if rate_hz else None
+        self.policy = policy
+        self.name = name
+        self.clock = clock
+        self.sleeper = sleeper
+        self.start = None
+        self.last_tick = None
+        self.tick_number = 0
+        self.next_deadline = None
+        self.jitter = Histogram()
+        self.overrun = Histogram()
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped = 0
+
+    def _begin(self, now):
+        self.start = self.last_tick = now
+        self.next_deadline = now
+
+    def wait(self):
+        """Sleeps until the next deadline; returns the tick number (missed ticks included)."""
+        now = self.clock()
+        if self.start is None:
+            self._begin(now)
+        elif now > self.next_deadline:
+            self.overruns += 1
+            self.overrun.add((now - self.next_deadline) * 1000)
+            self._fall_behind(now)
+        self._sleep_until(self.next_deadline)
+        tick = self.tick_number
+        self.tick_number += 1
+        self.next_deadline = self.start + self.tick_number * self.period
+        return tick
+
+    def _fall_behind(self, now):
+        behind = int((now - self.next_deadline) / self.period)
+        if behind and (self.policy == SKIP or behind > MAX_CATCH_UP):
+            # Jump to the last deadline that has passed and run it now
+            self.skipped += behind
+            self.tick_number += behind
+            self.next_deadline = self.start + self.tick_number * self.period
+
+    def wait_until(self, offset):
+        """Sleeps until `offset` seconds after the first call; returns how late it woke (s)."""
+        now = self.clock()
+        if self.start is None:
+            self._begin(now)
+        deadline = self.start + offset
+        if now > deadline:
+            self.overruns += 1
+            self.overrun.add((now - deadline) * 1000)
+        return self._sleep_until(deadline)
+
+    def _sleep_until(self, deadline):
+        delay = deadline - self.clock()
+        if delay > 0:
+            self.sleeper(delay)
+        self.last_tick = self.clock()
+        late = max(self.last_tick - deadline, 0.0)
+        self.jitter.add(late * 1000)
+        self.ticks += 1
+        return late
+
+    def tick(self, now=None):
+        """Records a tick of a loop paced elsewhere; never sleeps.
+
+        The receiver's clock and ours drift apart, so jitter here is how far
+        each interval is from a whole number of periods; the extra periods
+        are counted as skipped ticks.
+        """
+        now = self.clock() if now is None else now
+        if self.start is None:
+            self._begin(now)
+        else:
+            interval = now - self.last_tick
+            # A row can come up to 3/4 of a period late before it counts as a missing one
+            periods = max(int(interval / self.period + 0.25), 1)
+            self.skipped += periods - 1
+            self.jitter.add(abs(interval - periods * self.period) * 1000)
+        self.last_tick = now
+        self.ticks += 1
+
+    def report(self):
+        """The run's counters and both histograms, as log lines."""
+        elapsed = self.last_tick - self.start if self.start is not None else 0.0
+        rate = f"{(self.ticks - 1) / elapsed:.2f} Hz achieved" if elapsed else "no ticks"
+        target = f" of {1 / self.period:g} Hz" if self.period else ""
+        lines = [f"{self.name}: {self.ticks} ticks in {elapsed:.1f} s, {rate}{target}, "
+                 f"{self.overruns} overruns, {self.skipped} ticks skipped",
+                 f"{self.name} jitter: {self.jitter.summary()}"]
+        lines += self.jitter.lines()
+        if self.overrun.count:
+            lines.append(f"{self.name} overrun: {self.overrun.summary()}")
+            lines += self.overrun.lines()
+        return lines
+
+    def log_report(self):
+        for line in self.report():
+            logging.info(line)
@@ -0,0 +1,244 @@
+import queue
+import signal
+import logging
+import multiprocessing
+from time import time, monotonic
+from types import SimpleNamespace
+from Common.shmRing import ShmRing, DEFAULT_CAPACITY
+from Common.ubxFraming import FrameSplitter, parse_frame
+from Common.rawCapture import RawCaptureWriter
+from Common.recording import RunOutput
+from Common.epochFusion import EpochFuser, RECORDING_MODES
+
+# Frames a parser claims from the ring at a time
+PARSE_BATCH = 64
+
+# Seconds without results before the writing indicator goes off
+IDLE_TIMEOUT = 1.0
+
+# Seconds between pipeline counter log lines
+STATS_EVERY = 10
+
+def _ignore_signals():
+    # Ctrl+C and terminate() reach the recorder, which stops the children through the stop event
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+
+def _reader_main(ring, open_stream, stop, capture_path):
+    """Reader process: copies frames from the UART into the ring and nothing else."""
+    _ignore_signals()
+    splitter = FrameSplitter()
+    capture = RawCaptureWriter(capture_path) if capture_path else None
+    try:
+        with open_stream() as stream:
+            # Drop whatever queued up while the port sat idle
+            stream.reset_input_buffer()
+            while not stop.is_set():
+                data = stream.read(max(1, stream.in_waiting))
+                if not data:
+                    continue
+                recv_time = monotonic()
+                frames = splitter.feed(data)
+                if capture:
+                    wall_time = time()
+                    for frame in frames:
+                        capture.write(frame, recv_time, wall_time)
+                ring.put(frames, len(data), recv_time)
+    except Exception as e:
+        logging.error(f"Reader process error: {e}")
+    finally:
+        ring.close_writer()
+        if capture:
+            capture.close()
+        ring.close()
+
+def summarize(parsed_data):
+    """Keeps only the fields EpochFuser needs, so parsed messages are cheap to send between processes."""
+    if parsed_data is None:
+        return None
+    identity = parsed_data.identity
+    if identity.startswith("GNRMC"):
+        return SimpleNamespace(identity=identity, time=parsed_data.time, date=parsed_data.date,
+                               lat=parsed_data.lat, lon=parsed_data.lon, spd=parsed_data.spd)
+    if identity == "NAV-RELPOSNED":
+        return SimpleNamespace(identity=identity, iTOW=parsed_data.iTOW, relPosN=parsed_data.relPosN, relPosE=parsed_data.relPosE,
+                               relPosD=parsed_data.relPosD, relPosHeading=parsed_data.relPosHeading,
+                               relPosHeadingValid=parsed_data.relPosHeadingValid)
+    if identity == "NAV-PVT":
+        return SimpleNamespace(identity=identity, iTOW=parsed_data.iTOW, gnssFixOk=parsed_data.gnssFixOk,
+                               lat=parsed_data.lat, lon=parsed_data.lon, gSpeed=parsed_data.gSpeed,
+                               headMot=parsed_data.headMot, hAcc=parsed_data.hAcc, vAcc=parsed_data.vAcc,
+                               sAcc=parsed_data.sAcc, headAcc=parsed_data.headAcc, fixType=parsed_data.fixType,
+                               carrSoln=parsed_data.carrSoln, numSV=parsed_data.numSV)
+    return None
+
+def _parser_main(ring, results):
+    """Parser process: claims batches of frames and sends back (first_seq, [(summary, recv_time)], parse_errors)."""
+    _ignore_signals()
+    try:
+        while True:
+            claimed = ring.get(PARSE_BATCH, timeout=IDLE_TIMEOUT)
+            if claimed is None:
+                break
+            first_seq, frames = claimed
+            if not frames:
+                continue
+            summaries = []
+            errors = 0
+            for frame, recv_time in frames:
+                try:
+                    summaries.append((summarize(parse_frame(frame, validate=False)), recv_time))
+                except Exception:
+                    # Keep the slot so the sequence has no gap
+                    summaries.append((None, recv_time))
+                    errors += 1
+            results.put((first_seq, summaries, errors))
+    finally:
+        results.put(None)
+        ring.close()
+
+class MultiprocessRecorder:
+    """Records a run with the serial reader, the parsers and the writer in separate processes.
+
+    A minimal reader process copies frames from the UART into a shared-memory
+    ring (Common/shmRing.py); `parsers` parser processes claim batches from
+    it and decode them with Common.ubxFraming.parse_frame in parallel; this
+    process puts the results back in receive order, fuses them into rows and
+    writes the CSV. With the default of two parsers the pipeline uses all
+    four cores of the Pi. Overruns (frames the ring had no room for), lag and
+    occupancy are logged every STATS_EVERY seconds and at the end of the
+    run. A reader or parser that dies stops the run within IDLE_TIMEOUT.
+    """
+
+    def __init__(self, mow_id, open_stream, show_writing=None, raw_capture=False, on_first_row=None,
+                 parsers=2, ring_capacity=DEFAULT_CAPACITY, mode='fused', rate=None, health=None):
+        self.mow_id = mow_id
+        self.mode = mode
+        self.rate = rate
+        self.health = health
+        self.open_stream = open_stream
+        self.show_writing = show_writing or (lambda writing: None)
+        self.raw_capture = raw_capture
+        self.on_first_row = on_first_row
+        self.parsers = parsers
+        self.ring_capacity = ring_capacity
+        self.rows = 0
+        self.parse_errors = 0
+        self.max_reorder_backlog = 0
+        self.ring_stats = None
+        self.process_died = False
+
+    def _log_stats(self, ring, pending):
+        stats = ring.stats()
+        logging.info(f"Pipeline: ring {stats['occupancy']}/{stats['capacity']} bytes "
+                     f"(max {stats['max_occupancy']}), lag {stats['lag_frames']} frames, "
+                     f"{stats['overruns']} overruns, {stats['frames_written']} frames from "
+                     f"{stats['bytes_in']} bytes, {self.parse_errors} parse errors, "
+                     f"reorder backlog {len(pending)} batches (max {self.max_reorder_backlog}), {self.rows} rows")
+        return stats
+
+    def _check_processes(self, processes, stop):
+        """Stops the run if a reader or parser process has died; returns True if one has."""
+        dead = [process.name for process in processes if not process.is_alive() and process.exitcode != 0]
+        if dead and not self.process_died:
+            logging.error(f"Recorder process {', '.join(dead)} died, stopping the run")
+            self.process_died = True
+            stop.set()
+        return self.process_died
+
+    def run(self):
+        """Records until SIGINT/SIGTERM; returns the final ring counters."""
+        ctx = multiprocessing.get_context('fork')
+        # The raw capture is written by the reader, which sees every frame first
+        output = RunOutput(self.mow_id, header=RECORDING_MODES[self.mode]['fields'], rate=self.rate,
+                           health=self.health)
+        ring = ShmRing(self.ring_capacity, ctx)
+        results = ctx.Queue()
+        stop = ctx.Event()
+
+        processes = [ctx.Process(target=_reader_main, name='gnss-reader', daemon=True,
+                                 args=(ring, self.open_stream, stop, output.capture_path if self.raw_capture else None))]
+        processes += [ctx.Process(target=_parser_main, name=f'gnss-parser-{n}', daemon=True, args=(ring, results))
+                      for n in range(self.parsers)]
+        for process in processes:
+            process.start()
+
+        def request_stop(signum, frame):
+            stop.set()
+        previous_handlers = [signal.signal(signum, request_stop) for signum in (signal.SIGINT, signal.SIGTERM)]
+        logging.info(f"Logging specific fields to {output.filename} ({self.parsers} parser processes). Press Ctrl+C to stop.")
+
+        fuser = EpochFuser.for_mode(self.mode, log_fields=not self.raw_capture)
+        pending = {}
+        next_seq = 0
+        finished = 0
+        next_stats = monotonic() + STATS_EVERY
+        try:
+            while finished < self.parsers:
+                try:
+                    item = results.get(timeout=IDLE_TIMEOUT)
+                except queue.Empty:
+                    # Signal that we are not writing to the CSV file
+                    self.show_writing(False)
+                    item = ()
+                # Checked after every batch as well as on the timeout, since a surviving parser
+                # keeps results coming past a dead one
+                if self._check_processes(processes, stop) and item == ():
+                    # A dead process never sends its end marker and can leave the ring locked,
+                    # so once the results dry up stop waiting for the others
+                    break
+                if monotonic() >= next_stats:
+                    next_stats += STATS_EVERY
+                    self._log_stats(ring, pending)
+                if item is None:
+                    finished += 1
+                    continue
+                if not item:
+                    continue
+
+                first_seq, summaries, errors = item
+                self.parse_errors += errors
+                pending[first_seq] = summaries
+                self.max_reorder_backlog = max(self.max_reorder_backlog, len(pending))
+                # Fuse strictly in receive order, whichever parser finished first
+                while next_seq in pending:
+                    batch = pending.pop(next_seq)
+                    next_seq += len(batch)
+                    self._fuse(batch, fuser, output)
+            if stop.is_set() and not self.process_died:
+                logging.info("Logging stopped by user.")
+            # Anything left after a gap (a parser that died) is still written in order
+            for first_seq in sorted(pending):
+                self._fuse(pending.pop(first_seq), fuser, output)
+            fuser.flush()
+        except Exception as e:
+            logging.error(f"Error: {e}")
+        finally:
+            stop.set()
+            for signum, handler in zip((signal.SIGINT, signal.SIGTERM), previous_handlers):
+                signal.signal(signum, handler)
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    # The children ignore SIGTERM, and one stuck on a ring lock will not see the stop event
+                    process.kill()
+                    process.join()
+            output.close()
+            # Ensure the LED turns off when exiting
+            self.show_writing(False)
+            self.ring_stats = self._log_stats(ring, pending)
+            logging.info(f"Epoch fusion: {fuser.summary()}")
+            ring.unlink()
+        return self.ring_stats
+
+    def _fuse(self, batch, fuser, output):
+        for parsed_data, recv_time in batch:
+            if parsed_data is None:
+                continue
+            row = fuser.update(parsed_data, recv_time)
+            if row:
+                self.rows += 1
+                if output.write_row(row) and self.on_first_row:
+                    self.on_first_row()
+        # Signal that we are writing to the CSV file
+        self.show_writing(True)
@@ -0,0 +1,80 @@
+from functools import reduce
+from operator import xor
+from collections import namedtuple
+from datetime import time, date
+
+# Only the fields the scripts use; names and units follow pynmeagps
+NmeaRmc = namedtuple('NmeaRmc', 'identity time status lat lon spd date')
+NmeaGga = namedtuple('NmeaGga', 'identity time lat lon quality numSV HDOP alt')
+
+SOUTH_WEST = (b'S', b'W')
+
+def nmea_checksum_ok(frame):
+    """True when an NMEA sentence's *hh checksum matches its body."""
+    star = frame.rfind(b'*')
+    if star < 1:
+        return False
+    try:
+        return reduce(xor, frame[1:star], 0) == int(frame[star + 1:star + 3], 16)
+    except ValueError:
+        return False
+
+def _degrees(value, hemisphere):
+    # (d)ddmm.mmmmm to signed decimal degrees, rounded like pynmeagps
+    dot = value.find(b'.')
+    if dot < 4:
+        return ''
+    degrees = round(int(value[:dot - 2]) + float(value[dot - 2:]) / 60, 10)
+    return -degrees if hemisphere in SOUTH_WEST else degrees
+
+def _time(value):
+    # hhmmss.ss to a datetime.time, as pynmeagps returns it
+    if len(value) < 6:
+        return ''
+    microsecond = round(float(value[6:]) * 1e6) if len(value) > 7 else 0
+    return time(int(value[0:2]), int(value[2:4]), int(value[4:6]), microsecond)
+
+def _date(value):
+    # ddmmyy to a datetime.date
+    if len(value) != 6:
+        return ''
+    return date(2000 + int(value[4:6]), int(value[2:4]), int(value[0:2]))
+
+def _number(value, kind=float):
+    return kind(value) if value else ''
+
+def _rmc(identity, fields):
+    return NmeaRmc(identity, _time(fields[1]), fields[2].decode(), _degrees(fields[3], fields[4]),
+                   _degrees(fields[5], fields[6]), _number(fields[7]), _date(fields[9]))
+
+def _gga(identity, fields):
+    return NmeaGga(identity, _time(fields[1]), _degrees(fields[2], fields[3]), _degrees(fields[4], fields[5]),
+                   _number(fields[6], int), _number(fields[7], int), _number(fields[8]), _number(fields[9]))
+
+# Sentence type: (fields needed, parser), for any talker (GN, GP, ...)
+PARSERS = {
+    b'RMC': (10, _rmc),
+    b'GGA': (10, _gga),
+}
+
+def parse_nmea(frame):
+    """Parses a GGA or RMC sentence straight from bytes; returns None for anything else.
+
+    The checksum is checked on the raw bytes and the line is split into
+    fields without decoding it; only the fields above are converted. Empty
+    fields come back as '' like pynmeagps does. None also covers a bad
+    checksum, so a caller falling back to pynmeagps gets its error.
+    """
+    star = frame.rfind(b'*')
+    if star < 7:
+        return None
+    parser = PARSERS.get(frame[3:6])
+    if parser is None or not nmea_checksum_ok(frame):
+        return None
+    fields = frame[1:star].split(b',')
+    if len(fields) < parser[0]:
+        return None
+    try:
+        return parser[1](fields[0].decode(), fields)
+    except ValueError:
+        return None
@@ -0,0 +1,300 @@
+import os
+import sys
+import math
+import argparse
+import logging
+from collections import namedtuple
+from time import perf_counter
+import numpy as np
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.trajectory import Trajectory, enu
+
+# Cached index next to the run: <run>.pathidx.npz
+INDEX_SUFFIX = '.pathidx.npz'
+INDEX_VERSION = 1
+
+# Douglas-Peucker tolerance (m): simplified path stays this close to the recorded fixes
+TOLERANCE = 0.05
+
+# Grid cell edge (m); grown when the run is so large the grid would pass MAX_CELLS
+CELL_SIZE = 2.0
+MAX_CELLS = 4_000_000
+
+# A path needs at least one segment
+MIN_POINTS = 2
+
+# Rings of cells searched around a query before falling back to checking every segment
+MAX_RINGS = 8
+
+# Douglas-Peucker starts from spans of this many points, so a run of out-and-back lanes
+# costs n log n rather than n per lane; each span border stays a vertex
+SIMPLIFY_SPAN = 1024
+
+# segment: index of the path segment, distance: to it (m), cross_track: signed distance (m, positive
+# right of the direction of travel), along_track: distance along the path to the closest point (m),
+# heading: direction of the segment (degrees from north)
+PathMatch = namedtuple('PathMatch', 'segment distance cross_track along_track heading')
+
+def index_path(run_path):
+    """Returns the cache file that belongs to a run."""
+    if run_path.endswith(os.sep):
+        run_path = run_path[:-1]
+    return os.path.splitext(run_path)[0] + INDEX_SUFFIX
+
+def simplify(east, north, tolerance=TOLERANCE):
+    """Douglas-Peucker: indices of the points to keep so no dropped point is further than `tolerance` away.
+
+    Distances are to the segment, not its infinite line, so a lane that
+    turns back on itself is not collapsed. Iterative with a stack; the
+    distances within each span are computed with NumPy in one go.
+    """
+    count = len(east)
+    if count < 3:
+        return np.arange(count)
+    keep = np.zeros(count, dtype=bool)
+    borders = list(range(0, count - 1, SIMPLIFY_SPAN)) + [count - 1]
+    keep[borders] = True
+    stack = list(zip(borders[:-1], borders[1:]))
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        distances = _segment_distances(east[first + 1:last], north[first + 1:last],
+                                       east[first], north[first], east[last], north[last])
+        worst = int(np.argmax(distances))
+        if distances[worst] > tolerance:
+            split = first + 1 + worst
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+    return np.flatnonzero(keep)
+
+def _segment_distances(px, py, ax, ay, bx, by):
+    # Distance from points to one segment a-b
+    dx, dy = bx - ax, by - ay
+    squared = dx * dx + dy * dy
+    if squared == 0:
+        return np.hypot(px - ax, py - ay)
+    t = np.clip(((px - ax) * dx + (py - ay) * dy) / squared, 0, 1)
+    return np.hypot(px - ax - t * dx, py - ay - t * dy)
+
+class PathIndex:
+    """Nearest-segment lookups on a simplified recorded path, for following it at 10-20 Hz.
+
+    The path is simplified with Douglas-Peucker and every segment is
+    registered in the cells of a uniform grid it passes through (stored as
+    two flat arrays, cell -> first entry and entry -> segment). A query looks
+    at its own cell and then rings of cells around it until no unseen
+    segment could be closer, so it only ever measures a handful of segments.
+    Positions are metres east/north of the run's first fix; locate() takes
+    latitude/longitude.
+    """
+
+    def __init__(self, east, north, origin, cell_size=CELL_SIZE, tolerance=TOLERANCE):
+        self.east = np.asarray(east, dtype=np.float64)
+        self.north = np.asarray(north, dtype=np.float64)
+        if len(self.east) < MIN_POINTS:
+            raise ValueError(f"A path index needs at least {MIN_POINTS} points, got {len(self.east)}")
+        self.origin = tuple(float(value) for value in origin)
+        self.tolerance = tolerance
+        self.requested_cell = cell_size
+        self._segment_arrays()
+        self._build_grid(cell_size)
+
+    def _segment_arrays(self):
+        self.seg_east = np.diff(self.east)
+        self.seg_north = np.diff(self.north)
+        self.seg_length = np.hypot(self.seg_east, self.seg_north)
+        self.seg_heading = np.degrees(np.arctan2(self.seg_east, self.seg_north)) % 360
+        # Path distance at the start of every segment
+        self.along = np.concatenate(([0.0], np.cumsum(self.seg_length)))
+
+    def _build_grid(self, cell_size):
+        self.min_east = float(self.east.min()) - cell_size
+        self.min_north = float(self.north.min()) - cell_size
+        span = max(float(self.east.max()) - self.min_east, float(self.north.max()) - self.min_north) + cell_size
+        while (span / cell_size) ** 2 > MAX_CELLS:
+            cell_size *= 2
+        self.cell_size = cell_size
+        self.columns = int((float(self.east.max()) - self.min_east) // cell_size) + 2
+        self.rows = int((float(self.north.max()) - self.min_north) // cell_size) + 2
+
+        # Every cell in each segment's bounding box...
+        col_a, row_a = self._cell(self.east[:-1], self.north[:-1])
+        col_b, row_b = self._cell(self.east[1:], self.north[1:])
+        col_low, col_high = np.minimum(col_a, col_b), np.maximum(col_a, col_b)
+        row_low, row_high = np.minimum(row_a, row_b), np.maximum(row_a, row_b)
+        widths, heights = col_high - col_low + 1, row_high - row_low + 1
+        counts = widths * heights
+        segments = np.repeat(np.arange(len(counts)), counts)
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        cols = col_low[segments] + offset % widths[segments]
+        rows = row_low[segments] + offset // widths[segments]
+
+        # ...less the ones the segment does not actually pass through
+        centre_east = self.min_east + (cols + 0.5) * cell_size
+        centre_north = self.min_north + (rows + 0.5) * cell_size
+        start_east, start_north = self.east[segments], self.north[segments]
+        dx, dy = self.seg_east[segments], self.seg_north[segments]
+        squared = np.where(self.seg_length[segments] > 0, self.seg_length[segments] ** 2, 1)
+        t = np.clip(((centre_east - start_east) * dx + (centre_north - start_north) * dy) / squared, 0, 1)
+        reach = np.hypot(centre_east - start_east - t * dx, centre_north - start_north - t * dy)
+        inside = reach <= cell_size * math.sqrt(0.5)
+        cells = (rows * self.columns + cols)[inside]
+        segments = segments[inside]
+
+        order = np.argsort(cells, kind='stable')
+        self.cell_segments = segments[order].astype(np.int32)
+        self.cell_start = np.searchsorted(cells[order], np.arange(self.rows * self.columns + 1)).astype(np.int32)
+        self._cell_lookup()
+
+    def _cell_lookup(self):
+        # Queries run in plain Python: a dict of the occupied cells and the segment values as lists
+        # are much quicker to index one at a time than NumPy arrays
+        occupied = np.flatnonzero(np.diff(self.cell_start))
+        starts, ends = self.cell_start[occupied].tolist(), self.cell_start[occupied + 1].tolist()
+        segments = self.cell_segments.tolist()
+        self._cells = {cell: segments[start:end] for cell, start, end in zip(occupied.tolist(), starts, ends)}
+        self._segments = list(zip(self.east[:-1].tolist(), self.north[:-1].tolist(), self.seg_east.tolist(),
+                                  self.seg_north.tolist(), self.seg_length.tolist(), self.along[:-1].tolist(),
+                                  self.seg_heading.tolist()))
+
+    def _cell(self, east, north):
+        return (((east - self.min_east) // self.cell_size).astype(np.int64),
+                ((north - self.min_north) // self.cell_size).astype(np.int64))
+
+    def __len__(self):
+        return len(self.seg_length)
+
+    @property
+    def length(self):
+        """Path length (m)."""
+        return float(self.along[-1])
+
+    @classmethod
+    def from_run(cls, run_path, tolerance=TOLERANCE, cell_size=CELL_SIZE):
+        """Builds the index of a recorded run from its fixes, leaving out outliers."""
+        trajectory = Trajectory.from_run(run_path)
+        good = ~trajectory.outlier
+        if np.count_nonzero(good) < MIN_POINTS:
+            raise ValueError(f"{run_path} has too few fixes for a path index: {np.count_nonzero(good)} usable "
+                             f"of {len(trajectory)}")
+        east, north = trajectory.east[good], trajectory.north[good]
+        keep = simplify(east, north, tolerance)
+        index = cls(east[keep], north[keep], trajectory.origin, cell_size, tolerance)
+        logging.info(f"Path index for {run_path}: {len(trajectory)} fixes simplified to {len(keep)} "
+                     f"points at {tolerance} m, {index.columns}x{index.rows} cells of {index.cell_size} m")
+        return index
+
+    @classmethod
+    def for_run(cls, run_path, tolerance=TOLERANCE, cell_size=CELL_SIZE):
+        """The run's cached index, rebuilt when it is missing, older than the run or built with other settings."""
+        cache = index_path(run_path)
+        if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(run_path):
+            try:
+                index = cls.load(cache)
+                if index.tolerance == tolerance and index.requested_cell == cell_size:
+                    return index
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(f"Rebuilding path index {cache}: {e}")
+        index = cls.from_run(run_path, tolerance, cell_size)
+        index.save(cache)
+        return index
+
+    def save(self, path):
+        """Writes the index to an .npz file, atomically."""
+        temp_path = f'{path}.tmp.npz'
+        np.savez(temp_path, version=INDEX_VERSION, east=self.east, north=self.north, origin=self.origin,
+                 tolerance=self.tolerance, cell_size=self.cell_size,
+                 requested_cell=self.requested_cell,
+                 grid=(self.min_east, self.min_north), shape=(self.columns, self.rows),
+                 cell_start=self.cell_start, cell_segments=self.cell_segments)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Reads an index written by save(); the grid is loaded, not rebuilt."""
+        with np.load(path) as data:
+            if int(data['version']) != INDEX_VERSION:
+                raise ValueError(f"{path} has index version {int(data['version'])}")
+            index = cls.__new__(cls)
+            index.east, index.north = data['east'], data['north']
+            index.origin = tuple(float(value) for value in data['origin'])
+            index.tolerance = float(data['tolerance'])
+            index.cell_size = float(data['cell_size'])
+            index.requested_cell = float(data['requested_cell'])
+            index.min_east, index.min_north = (float(value) for value in data['grid'])
+            index.columns, index.rows = (int(value) for value in data['shape'])
+            index.cell_start, index.cell_segments = data['cell_start'], data['cell_segments']
+        index._segment_arrays()
+        index._cell_lookup()
+        return index
+
+    def to_local(self, lat, lon):
+        """East, north (m) of a fix relative to the path's origin."""
+        east, north, _ = enu(lat, lon, origin=self.origin)
+        return float(east), float(north)
+
+    def locate(self, lat, lon):
+        """nearest() for a latitude/longitude fix."""
+        return self.nearest(*self.to_local(lat, lon))
+
+    def nearest(self, east, north):
+        """The closest path segment to a point, with cross-track and along-track position."""
+        size = self.cell_size
+        col = int((east - self.min_east) // size)
+        row = int((north - self.min_north) // size)
+        # How far the point is from the edges of its own cell
+        margin = min(east - self.min_east - col * size, (col + 1) * size - (east - self.min_east),
+                     north - self.min_north - row * size, (row + 1) * size - (north - self.min_north))
+        cells = self._cells
+        seen = set()
+        best = None
+        for ring in range(MAX_RINGS + 1):
+            for r in range(row - ring, row + ring + 1):
+                if not 0 <= r < self.rows:
+                    continue
+                edge = r in (row - ring, row + ring)
+                for c in (range(col - ring, col + ring + 1) if edge else (col - ring, col + ring)):
+                    if not 0 <= c < self.columns:
+                        continue
+                    for segment in cells.get(r * self.columns + c, ()):
+                        if segment in seen:
+                            continue
+                        seen.add(segment)
+                        match = self._measure(segment, east, north)
+                        if best is None or match[1] < best[1]:
+                            best = match
+            # Anything not seen yet lies outside these rings
+            if best is not None and best[1] <= margin + ring * size:
+                return PathMatch(*best)
+        return self._nearest_anywhere(east, north) if best is None else PathMatch(*best)
+
+    def _measure(self, segment, east, north):
+        start_east, start_north, dx, dy, length, along, heading = self._segments[segment]
+        px, py = east - start_east, north - start_north
+        t = min(max((px * dx + py * dy) / (length * length), 0.0), 1.0) if length else 0.0
+        distance = math.hypot(px - t * dx, py - t * dy)
+        cross = (dy * px - dx * py) / length if length else distance
+        return segment, distance, cross, along + t * length, heading
+
+    def _nearest_anywhere(self, east, north):
+        # Far off the path: measure every segment at once
+        squared = np.where(self.seg_length > 0, self.seg_length ** 2, 1)
+        px, py = east - self.east[:-1], north - self.north[:-1]
+        t = np.clip((px * self.seg_east + py * self.seg_north) / squared, 0, 1)
+        segment = int(np.argmin(np.hypot(px - t * self.seg_east, py - t * self.seg_north)))
+        return PathMatch(*self._measure(segment, east, north))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build (or load) the cached path index of a recorded run.")
+    parser.add_argument('run', help="path to a *_GPSData.csv run or its .csvz archive")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help=f"simplification tolerance in m (default: {TOLERANCE})")
+    parser.add_argument('--cell', type=float, default=CELL_SIZE, help=f"grid cell size in m (default: {CELL_SIZE})")
+    args = parser.parse_args()
+    started = perf_counter()
+    index = PathIndex.for_run(args.run, args.tolerance, args.cell)
+    print(f"{len(index)} segments, {index.length:.1f} m, {index.columns}x{index.rows} cells of {index.cell_size} m "
+          f"in {(perf_counter() - started) * 1000:.1f} ms -> {index_path(args.run)}")
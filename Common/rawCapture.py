@@ -0,0 +1,129 @@
+import os
+import sys
+import struct
+import bisect
+from time import time, monotonic
+
+# Every capture file starts with this magic so readers can reject other files
+CAPTURE_MAGIC = b'RMWRAW2\n'
+# Captures written before recv_time moved to the monotonic clock; still readable
+CAPTURE_MAGIC_V1 = b'RMWRAW1\n'
+
+# Each frame is stored as: recv_time (float64, time.monotonic() seconds as in the
+# CSV's recv_time column), wall_time (float64, unix seconds), length (uint32), raw bytes
+RECORD_HEADER = struct.Struct('<ddI')
+# Version 1 records: wall_time (float64, unix seconds), length (uint32), raw bytes
+RECORD_HEADER_V1 = struct.Struct('<dI')
+
+# Sparse index entry: frame number, byte offset of the frame record, wall_time
+INDEX_ENTRY = struct.Struct('<QQd')
+INDEX_SUFFIX = '.idx'
+
+# Large write buffer so the SD card sees big sequential writes instead of one per frame
+CAPTURE_BUFFER = 1 << 20
+INDEX_EVERY = 500
+
+class RawCaptureWriter:
+    """Appends every raw UBX/NMEA frame, exactly as received, to a capture file.
+
+    Frames are never re-serialized: the bytes handed over by the reader are
+    written behind a small fixed header holding both receive clocks: the
+    monotonic recv_time the recorded rows carry, and the unix wall_time
+    that dates them. Every INDEX_EVERY frames an entry
+    is appended to a sidecar index so a reader can jump into a long capture.
+    """
+
+    def __init__(self, path, index_every=INDEX_EVERY):
+        self.path = path
+        self.index_every = index_every
+        self._file = open(path, 'wb', buffering=CAPTURE_BUFFER)
+        self._index = open(path + INDEX_SUFFIX, 'wb', buffering=CAPTURE_BUFFER)
+        self._file.write(CAPTURE_MAGIC)
+        self.offset = len(CAPTURE_MAGIC)
+        self.frames = 0
+
+    def write(self, raw_data, recv_time=None, wall_time=None):
+        """Appends one raw frame with its monotonic recv_time and unix wall_time (both default to now)."""
+        if recv_time is None:
+            recv_time = monotonic()
+        if wall_time is None:
+            wall_time = time()
+        if self.frames % self.index_every == 0:
+            self._index.write(INDEX_ENTRY.pack(self.frames, self.offset, wall_time))
+        self._file.write(RECORD_HEADER.pack(recv_time, wall_time, len(raw_data)))
+        self._file.write(raw_data)
+        self.offset += RECORD_HEADER.size + len(raw_data)
+        self.frames += 1
+
+    def close(self):
+        """Flushes the remaining buffered frames and closes both files."""
+        self._file.close()
+        self._index.close()
+
+def read_index(path):
+    """Returns the sparse index of a capture as a list of (frame, offset, wall_time)."""
+    try:
+        with open(path + INDEX_SUFFIX, 'rb') as index_file:
+            data = index_file.read()
+    except FileNotFoundError:
+        return []
+    # Ignore a torn entry at the end of an index cut short by a crash
+    usable = len(data) - len(data) % INDEX_ENTRY.size
+    return list(INDEX_ENTRY.iter_unpack(data[:usable]))
+
+def offset_for_time(index, wall_time):
+    """Returns the offset of the last indexed frame received at or before wall_time (unix seconds)."""
+    times = [entry[2] for entry in index]
+    position = bisect.bisect_right(times, wall_time) - 1
+    return index[position][1] if position >= 0 else len(CAPTURE_MAGIC)
+
+def capture_version(path):
+    """Returns the format version of a capture file, or None if it is not one."""
+    with open(path, 'rb') as capture:
+        magic = capture.read(len(CAPTURE_MAGIC))
+    return {CAPTURE_MAGIC: 2, CAPTURE_MAGIC_V1: 1}.get(magic)
+
+def iter_capture(path, start_offset=None, end_offset=None):
+    """Yields (recv_time, wall_time, raw_data, offset) for every frame in a capture file.
+
+    recv_time is None in a version 1 capture, which only has the wall
+    clock. Reading stops quietly at a truncated record, which is what a
+    capture cut short by power loss ends with.
+    """
+    version = capture_version(path)
+    if version is None:
+        raise ValueError(f"{path} is not a raw capture file")
+    header_format = RECORD_HEADER if version == 2 else RECORD_HEADER_V1
+    with open(path, 'rb', buffering=CAPTURE_BUFFER) as capture:
+        offset = start_offset or len(CAPTURE_MAGIC)
+        capture.seek(offset)
+        while end_offset is None or offset < end_offset:
+            header = capture.read(header_format.size)
+            if len(header) < header_format.size:
+                return
+            if version == 2:
+                recv_time, wall_time, length = header_format.unpack(header)
+            else:
+                recv_time = None
+                wall_time, length = header_format.unpack(header)
+            raw_data = capture.read(length)
+            if len(raw_data) < length:
+                return
+            yield recv_time, wall_time, raw_data, offset
+            offset += header_format.size + length
+
+if __name__ == '__main__':
+    # Print a short summary of a capture file
+    if len(sys.argv) != 2:
+        print("Usage: python3 rawCapture.py <capture.ubx>")
+        sys.exit(1)
+    frames = total = 0
+    first = last = None
+    for _, wall_time, raw_data, _ in iter_capture(sys.argv[1]):
+        frames += 1
+        total += len(raw_data)
+        first = wall_time if first is None else first
+        last = wall_time
+    duration = (last - first) if frames else 0
+    print(f"{frames} frames, {total} bytes, {duration:.1f} s, "
+          f"{len(read_index(sys.argv[1]))} index entries, {os.path.getsize(sys.argv[1])} bytes on disk")
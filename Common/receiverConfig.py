@@ -0,0 +1,248 @@
+import json
+import logging
+from time import sleep, monotonic
+from pyubx2 import UBXMessage, UBXReader, UBX_PROTOCOL
+
+# Configuration layers for CFG-VALSET
+LAYER_RAM = 1
+LAYER_BBR = 2
+LAYER_FLASH = 4
+
+# A single CFG-VALSET/VALGET carries at most 64 keys
+MAX_KEYS = 64
+
+CFG_CLASS = 0x06
+CFG_VALSET = 0x8A
+CFG_VALGET = 0x8B
+
+# NMEA messages the ZED-F9P outputs on every port out of the box
+FACTORY_NMEA = ('NMEA_ID_GGA', 'NMEA_ID_GLL', 'NMEA_ID_GSA', 'NMEA_ID_GSV', 'NMEA_ID_RMC', 'NMEA_ID_VTG')
+
+# Typical bytes per navigation epoch for each message (GSA/GSV are several sentences)
+MESSAGE_BYTES = {
+    'NMEA_ID_GGA': 80,
+    'NMEA_ID_GLL': 55,
+    'NMEA_ID_GSA': 4 * 65,
+    'NMEA_ID_GSV': 12 * 70,
+    'NMEA_ID_RMC': 75,
+    'NMEA_ID_VTG': 40,
+    'UBX_NAV_RELPOSNED': 8 + 64,
+    'UBX_NAV_PVT': 8 + 92,
+    'UBX_NAV_HPPOSLLH': 8 + 36,
+    'UBX_RXM_RAWX': 8 + 16 + 32 * 30,
+}
+
+# 8N1: every byte takes ten bit times on the wire
+BITS_PER_BYTE = 10
+
+# Declarative receiver profiles: UART baud rates, measurement rate and the
+# per-message output rate (per navigation solution) on each port. Factory
+# NMEA messages not listed for a port are switched off on that port.
+PROFILES = {
+    'recorder': {
+        'description': "GNRMC and NAV-RELPOSNED at 1 Hz on UART1, nothing else",
+        'baud': {'UART1': 230400},
+        'meas_rate_ms': 1000,
+        'nav_rate': 1,
+        'outputs': {'UART1': {'NMEA_ID_RMC': 1, 'UBX_NAV_RELPOSNED': 1}},
+    },
+    'recorder-10hz': {
+        'description': "GNRMC and NAV-RELPOSNED at 10 Hz on UART1, nothing else",
+        'baud': {'UART1': 230400},
+        'meas_rate_ms': 100,
+        'nav_rate': 1,
+        'outputs': {'UART1': {'NMEA_ID_RMC': 1, 'UBX_NAV_RELPOSNED': 1}},
+    },
+    'recorder-pvt': {
+        'description': "NAV-PVT alone at 10 Hz on UART1 (recorder --mode pvt, selectMode C)",
+        'baud': {'UART1': 230400},
+        'meas_rate_ms': 100,
+        'nav_rate': 1,
+        'outputs': {'UART1': {'UBX_NAV_PVT': 1, 'UBX_NAV_RELPOSNED': 0}},
+    },
+    'recorder-pvt-moving-base': {
+        'description': "NAV-PVT and NAV-RELPOSNED at 10 Hz on UART1, for a moving-base rover",
+        'baud': {'UART1': 230400},
+        'meas_rate_ms': 100,
+        'nav_rate': 1,
+        'outputs': {'UART1': {'UBX_NAV_PVT': 1, 'UBX_NAV_RELPOSNED': 1}},
+    },
+    'factory-nmea': {
+        'description': "The factory NMEA set on UART1 at 1 Hz and 38400 baud",
+        'baud': {'UART1': 38400},
+        'meas_rate_ms': 1000,
+        'nav_rate': 1,
+        'outputs': {'UART1': {message: 1 for message in FACTORY_NMEA}},
+    },
+}
+
+class ReceiverConfigError(Exception):
+    """The receiver NAKed, did not answer, or did not read back what was set.
+
+    When raised by apply(), `report` holds what was planned and whether it was rolled back.
+    """
+    report = None
+
+def load_profile(name_or_path):
+    """Returns a built-in profile by name, or loads one from a JSON file."""
+    if name_or_path in PROFILES:
+        return PROFILES[name_or_path]
+    with open(name_or_path) as profile_file:
+        return json.load(profile_file)
+
+def profile_settings(profile):
+    """Expands a profile into [(key, value)] for CFG-VALSET, baud rates excluded."""
+    settings = [('CFG_RATE_MEAS', profile['meas_rate_ms']), ('CFG_RATE_NAV', profile.get('nav_rate', 1))]
+    for port, outputs in profile.get('outputs', {}).items():
+        # Trim the factory NMEA flood down to what the profile asks for
+        for message in FACTORY_NMEA:
+            if message not in outputs:
+                settings.append((f'CFG_MSGOUT_{message}_{port}', 0))
+        for message, rate in outputs.items():
+            settings.append((f'CFG_MSGOUT_{message}_{port}', rate))
+    return settings
+
+def baud_settings(profile):
+    return [(f'CFG_{port}_BAUDRATE', baud) for port, baud in profile.get('baud', {}).items()]
+
+def output_budget(values, port='UART1'):
+    """Estimates the bytes per second a configuration sends on a port.
+
+    `values` maps key names to values (as read back from the receiver).
+    Returns (bytes_per_second, share_of_the_port's_capacity).
+    """
+    epochs_per_second = 1000 / (values.get('CFG_RATE_MEAS', 1000) * max(values.get('CFG_RATE_NAV', 1), 1))
+    suffix = f'_{port}'
+    per_epoch = 0
+    for key, rate in values.items():
+        if key.startswith('CFG_MSGOUT_') and key.endswith(suffix) and rate:
+            message = key[len('CFG_MSGOUT_'):-len(suffix)]
+            per_epoch += MESSAGE_BYTES.get(message, 0) / rate
+    bytes_per_second = per_epoch * epochs_per_second
+    baud = values.get(f'CFG_{port}_BAUDRATE')
+    return bytes_per_second, (bytes_per_second / (baud / BITS_PER_BYTE) if baud else None)
+
+class ReceiverConfigurator:
+    """Reads and changes receiver configuration over an open serial port.
+
+    Every CFG-VALSET waits for its ACK-ACK; a NAK or no answer raises
+    ReceiverConfigError. apply() reads the current values first and puts
+    them back if any step of the profile fails.
+    """
+
+    def __init__(self, stream, timeout=1.0, layers=LAYER_RAM, link_port='UART1'):
+        self.stream = stream
+        # The receiver port the stream is wired to; only its baud change needs a host-side switch
+        self.link_port = link_port
+        self.timeout = timeout
+        self.layers = layers
+        self.reader = UBXReader(stream, protfilter=UBX_PROTOCOL)
+
+    def _wait_for(self, msg_id, want_values=False):
+        """Reads until the ACK for a CFG message; returns the CFG-VALGET values seen on the way."""
+        values = {}
+        deadline = monotonic() + self.timeout
+        while monotonic() < deadline:
+            try:
+                _, parsed = self.reader.read()
+            except Exception as e:
+                logging.debug(f"Skipping unreadable data while waiting for ACK: {e}")
+                continue
+            if parsed is None:
+                continue
+            if want_values and parsed.identity == 'CFG-VALGET':
+                values.update({name: value for name, value in vars(parsed).items() if name.startswith('CFG_')})
+            elif parsed.identity in ('ACK-ACK', 'ACK-NAK') and parsed.clsID == CFG_CLASS and parsed.msgID == msg_id:
+                if parsed.identity == 'ACK-NAK':
+                    raise ReceiverConfigError(f"Receiver rejected CFG message 0x{msg_id:02x}")
+                return values
+        raise ReceiverConfigError(f"No ACK for CFG message 0x{msg_id:02x} within {self.timeout} s")
+
+    def poll(self, keys):
+        """Reads the current (RAM layer) value of each key."""
+        values = {}
+        for start in range(0, len(keys), MAX_KEYS):
+            self.stream.write(UBXMessage.config_poll(0, 0, keys[start:start + MAX_KEYS]).serialize())
+            values.update(self._wait_for(CFG_VALGET, want_values=True))
+        return values
+
+    def set(self, settings, layers=None):
+        """Sets [(key, value)] and waits for the receiver to ACK each message."""
+        layers = self.layers if layers is None else layers
+        chunks = [settings[start:start + MAX_KEYS] for start in range(0, len(settings), MAX_KEYS)]
+        for number, chunk in enumerate(chunks):
+            # Split sets go in one transaction so the receiver applies all or nothing
+            transaction = 0 if len(chunks) == 1 else (1 if number == 0 else (3 if number == len(chunks) - 1 else 2))
+            self.stream.write(UBXMessage.config_set(layers, transaction, chunk).serialize())
+            self._wait_for(CFG_VALSET)
+
+    def change_baud(self, key, baud, old_baud):
+        """Switches a UART's baud rate; the ACK is lost in the switch, so the new rate is verified by reading it back."""
+        self.stream.write(UBXMessage.config_set(self.layers, 0, [(key, baud)]).serialize())
+        self.stream.flush()
+        # Let the ACK (sent at the old rate) arrive before switching
+        sleep(0.1)
+        self.stream.baudrate = baud
+        self.stream.reset_input_buffer()
+        try:
+            if self.poll([key]).get(key) == baud:
+                return
+        except ReceiverConfigError:
+            pass
+        # Nothing sensible at the new rate: go back to the old one
+        self.stream.baudrate = old_baud
+        self.stream.reset_input_buffer()
+        raise ReceiverConfigError(f"Receiver did not come back at {baud} baud on {key}")
+
+    def apply(self, profile, dry_run=False):
+        """Applies a profile; returns a report dict (before/after values and output budgets).
+
+        Only keys whose values differ are written. On any failure the keys
+        already written are set back to their old values and the error is
+        re-raised with its report attached. The link's baud rate is changed
+        last and is not rolled back once the receiver answers at the new rate.
+        """
+        settings = profile_settings(profile)
+        bauds = baud_settings(profile)
+        keys = [key for key, _ in settings + bauds]
+        before = self.poll(keys)
+        link_key = f'CFG_{self.link_port}_BAUDRATE'
+        changes = [(key, value) for key, value in settings + bauds if before.get(key) != value and key != link_key]
+        baud_changes = [(key, value) for key, value in bauds if before.get(key) != value and key == link_key]
+        planned = dict(before, **dict(settings + bauds))
+        report = {
+            'profile': profile.get('description', ''),
+            'before': before,
+            'changes': changes + baud_changes,
+            'budget_before': output_budget(before, self.link_port),
+            'budget_planned': output_budget(planned, self.link_port),
+            'rolled_back': False,
+        }
+        if dry_run:
+            return report
+
+        applied = []
+        try:
+            if changes:
+                self.set(changes)
+                applied = changes
+            # The link's baud rate last: after the switch only the new rate can talk to the receiver
+            for key, baud in baud_changes:
+                self.change_baud(key, baud, before[key])
+            after = self.poll(keys)
+            mismatched = [key for key, value in settings + bauds if after.get(key) != value]
+            if mismatched:
+                raise ReceiverConfigError(f"Receiver reads back different values for {', '.join(mismatched)}")
+        except ReceiverConfigError as e:
+            e.report = report
+            if applied:
+                logging.warning(f"Rolling back {len(applied)} configuration keys")
+                try:
+                    self.set([(key, before[key]) for key, _ in applied])
+                    report['rolled_back'] = True
+                except ReceiverConfigError as rollback_error:
+                    logging.error(f"Rollback failed: {rollback_error}")
+            raise
+        report['after'] = after
+        report['budget_after'] = output_budget(after, self.link_port)
+        return report
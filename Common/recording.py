@@ -0,0 +1,86 @@
+import os
+import logging
+from time import strftime
+from Common.bufferedCsvWriter import BufferedCsvWriter, recover_stale_runs
+from Common.rawCapture import RawCaptureWriter
+from Common.runCatalog import RunCatalog, RunStats
+from Common.epochFusion import FUSED_FIELDS
+from Common.loopScheduler import LoopScheduler
+from Common.healthSampler import ROW_FIELDS as HEALTH_FIELDS
+
+# Recorded runs live in Record/Data
+RECORD_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Record', 'Data')
+
+CSV_HEADER = FUSED_FIELDS
+
+# CSV commit policy: write to the SD card every N rows or every T milliseconds
+COMMIT_ROWS = 50
+COMMIT_MS = 2000
+
+class RunOutput:
+    """Everything one recording writes: the CSV, an optional raw capture and the catalog entry.
+
+    Opening an output first repairs any run left behind by a power loss.
+    With auto_commit=False the caller decides when to commit (see
+    BufferedCsvWriter.commit_due), e.g. to commit off the event loop.
+    Given the receiver's navigation `rate` (Hz), the row cadence is
+    measured from each row's recv_time and its jitter logged at close. With
+    a running HealthSampler as `health`, every row also gets the latest
+    system health sample (HEALTH_FIELDS columns).
+    """
+
+    def __init__(self, mow_id, raw_capture=False, data_dir=RECORD_DATA_DIR, header=CSV_HEADER, auto_commit=True,
+                 rate=None, health=None):
+        # Create the "Data" directory if it doesn't exist
+        os.makedirs(data_dir, exist_ok=True)
+
+        # Repair any run that was cut short by a power loss before starting a new one
+        self.catalog = RunCatalog(data_dir)
+        for report in recover_stale_runs(data_dir):
+            self.catalog.add_csv(report['path'])
+        self.stats = RunStats()
+
+        # Create a new CSV file with Mow ID and date/time in the filename
+        run_stamp = strftime('%Y%m%d-%H%M%S')
+        self.filename = os.path.join(data_dir, f"{mow_id}_{run_stamp}_GPSData.csv")
+        self.csvfile = open(self.filename, 'w', newline='')
+        self.writer = BufferedCsvWriter(self.csvfile, commit_rows=COMMIT_ROWS, commit_ms=COMMIT_MS,
+                                        auto_commit=auto_commit)
+        # Write CSV header
+        self.health = health
+        self.writer.writeheader(header + HEALTH_FIELDS if health else header)
+        self.capture_path = os.path.join(data_dir, f"{mow_id}_{run_stamp}_GPSRaw.ubx")
+        self.capture = RawCaptureWriter(self.capture_path) if raw_capture else None
+        self.cadence = LoopScheduler(rate, name='Recorded rows') if rate else None
+        self.recv_column = header.index('recv_time') if rate else None
+
+    def capture_frame(self, raw_data, recv_time=None, wall_time=None):
+        """Appends a raw frame to the capture, if capturing; recv_time is monotonic, wall_time unix."""
+        if self.capture:
+            self.capture.write(raw_data, recv_time, wall_time)
+
+    def write_row(self, row):
+        """Buffers a fused row; returns True for the first row of the run."""
+        self.writer.writerow(row + self.health.latest_row if self.health else row)
+        self.stats.update(row[1], row[2])
+        if self.cadence:
+            self.cadence.tick(row[self.recv_column])
+        return self.stats.rows == 1
+
+    def set_rate(self, rate):
+        """The receiver's navigation rate changed (load shedding); the cadence is measured against the new one."""
+        if self.cadence:
+            self.cadence.period = 1 / rate
+
+    def close(self):
+        # Commit the buffered rows and mark the run as cleanly closed
+        self.writer.close()
+        self.csvfile.close()
+        # Register the closed run so selectMode can find it without scanning
+        self.catalog.add_run(self.filename, self.stats)
+        self.catalog.close()
+        if self.capture:
+            self.capture.close()
+            logging.info(f"Raw capture closed: {self.capture.frames} frames, {self.capture.offset} bytes")
+        if self.cadence:
+            self.cadence.log_report()
@@ -0,0 +1,320 @@
+import os
+import sys
+import gzip
+import lzma
+import json
+import zlib
+import struct
+import bisect
+import argparse
+import numpy as np
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.runTiming import run_times, time_source, first_value, stamp_seconds
+
+# An archive is: magic, independently compressed chunks of CSV rows, a JSON chunk index, trailer
+ARCHIVE_MAGIC = b'RMWARC1\n'
+# Trailer: byte offset of the JSON index, then a tag so a cut-short archive is recognised
+TRAILER = struct.Struct('<Q8s')
+TRAILER_TAG = b'RMWARCIX'
+FORMAT_NAME = 'remow-archive'
+# Version 2 adds the clock the rows are timed from and the time of each chunk's first row
+FORMAT_VERSION = 2
+
+# <id>_<ts>_GPSData.csvz next to where the CSV was, so the .cols and .pathidx.npz sidecars keep their names
+ARCHIVE_SUFFIX = '.csvz'
+
+# Rows per chunk, rounded up to the end of the second so a chunk holds whole seconds;
+# 4096 rows is 200 s at 20 Hz and decompresses in a few milliseconds
+CHUNK_ROWS = 4096
+
+# Name: (compress, decompress); both ship with Python
+CODECS = {
+    'gzip': (lambda data: gzip.compress(data, 9, mtime=0), gzip.decompress),
+    'lzma': (lambda data: lzma.compress(data, preset=6), lzma.decompress),
+}
+DEFAULT_CODEC = 'lzma'
+
+class ArchiveStopped(Exception):
+    """archive_csv() was told to stop; the partly written archive has been removed."""
+
+def archive_path(csv_path):
+    """Returns the archive that belongs to a CSV run."""
+    return os.path.splitext(csv_path)[0] + ARCHIVE_SUFFIX
+
+def _clock_columns(fields):
+    """(timestamp, itow, recv_time, number of fields) column positions for _row_clocks; a missing clock is None."""
+    return (fields.index('timestamp'), fields.index('itow') if 'itow' in fields else None,
+            fields.index('recv_time') if 'recv_time' in fields else None, len(fields))
+
+def _row_clocks(line, columns, cache):
+    """(unix second, iTOW, recv_time) of a CSV line, or None if it is malformed (torn); empty clocks are NaN."""
+    time_column, itow_column, recv_column, count = columns
+    values = line.rstrip(b'\r\n').split(b',')
+    if len(values) != count:
+        return None
+    try:
+        stamp = values[time_column]
+        second = cache.get(stamp)
+        if second is None:
+            second = cache[stamp] = stamp_seconds(stamp.decode())
+        return (second, float(values[itow_column]) if itow_column is not None and values[itow_column] else np.nan,
+                float(values[recv_column]) if recv_column is not None and values[recv_column] else np.nan)
+    except ValueError:
+        return None
+
+def _row_times(clocks, source, origin=None, floor=0.0):
+    """Run times of rows from their _row_clocks, timed by Common/runTiming.py as the CSV reader times them.
+
+    Malformed rows (None) are left out of the timing, as the CSV reader
+    skips them, and hold the time of the row before them.
+    """
+    good = np.array([row is not None for row in clocks], dtype=bool)
+    present = np.array([row for row in clocks if row is not None], dtype=np.float64).reshape(-1, 3)
+    times = np.full(len(clocks), np.nan)
+    times[good] = run_times(present[:, 0], present[:, 1], present[:, 2], source=source, origin=origin, floor=floor)[0]
+    return np.fmax.accumulate(np.fmax(times, floor))
+
+def archive_csv(csv_path, out_path=None, codec=DEFAULT_CODEC, chunk_rows=CHUNK_ROWS, should_stop=None):
+    """Writes a CSV run to a chunked archive and returns the archive path.
+
+    Rows are stored byte for byte, so extracting gives back the same file.
+    Each chunk records its first row, the unix seconds it covers and the
+    run time of its first row (Common/runTiming.py), for seeking. The
+    archive is written next to its final name and swapped in, and gets the CSV's modification time so age-based tools see the run's
+    age, not the compaction's. should_stop() is asked before every chunk;
+    when it says so ArchiveStopped is raised. On any failure the partly
+    written archive is removed.
+    """
+    compress = CODECS[codec][0]
+    out_path = out_path or archive_path(csv_path)
+    tmp_path = out_path + '.tmp'
+    try:
+        _write_archive(csv_path, tmp_path, codec, compress, chunk_rows, should_stop)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    source = os.stat(csv_path)
+    os.utime(out_path, (source.st_atime, source.st_mtime))
+    return out_path
+
+def _write_archive(csv_path, tmp_path, codec, compress, chunk_rows, should_stop):
+    chunks = []
+    crc = 0
+    seconds_cache = {}
+    # Every row's clocks (None for a malformed row), to time the rows once the whole run has been seen
+    clocks = []
+    with open(csv_path, 'rb') as csvfile, open(tmp_path, 'wb') as archive:
+        header = csvfile.readline()
+        crc = zlib.crc32(header, crc)
+        columns = _clock_columns(header.decode().strip().split(','))
+        archive.write(ARCHIVE_MAGIC)
+        rows = 0
+        lines = []
+        first_second = last_second = None
+
+        def write_chunk():
+            if should_stop and should_stop():
+                raise ArchiveStopped(f"Stopped archiving {os.path.basename(csv_path)}")
+            data = b''.join(lines)
+            packed = compress(data)
+            chunks.append([archive.tell(), len(packed), rows - len(lines), len(lines), first_second, last_second,
+                           zlib.crc32(data)])
+            archive.write(packed)
+            lines.clear()
+
+        for line in csvfile:
+            row = _row_clocks(line, columns, seconds_cache)
+            # Only cut between seconds (at a good row), so every second's rows are in one chunk
+            if len(lines) >= chunk_rows and row is not None and row[0] != last_second:
+                write_chunk()
+            if not lines:
+                first_second = None
+            if row is not None:
+                first_second = row[0] if first_second is None else first_second
+                last_second = row[0]
+            clocks.append(row)
+            lines.append(line)
+            crc = zlib.crc32(line, crc)
+            rows += 1
+        if lines:
+            write_chunk()
+
+        present = np.array([row for row in clocks if row is not None], dtype=np.float64).reshape(-1, 3)
+        source = time_source(present[:, 1], present[:, 2])
+        origin = first_value({'itow': present[:, 1], 'recv_time': present[:, 2]}.get(source, present[:, 0]))
+        times = _row_times(clocks, source, origin)
+        index = {
+            'format': FORMAT_NAME,
+            'version': FORMAT_VERSION,
+            'codec': codec,
+            'header': header.decode(),
+            'rows': rows,
+            'source': os.path.basename(csv_path),
+            'source_size': os.path.getsize(csv_path),
+            'crc32': crc,
+            'start_time': chunks[0][4] if chunks else None,
+            # offset, compressed size, first row, rows, first and last unix second, crc32 of the rows
+            'chunks': chunks,
+            # The clock the rows are timed from, its value at the first row, and the run time of each chunk's first row
+            'time_source': source,
+            'time_origin': origin,
+            'chunk_times': [float(times[chunk[2]]) for chunk in chunks],
+        }
+        index_offset = archive.tell()
+        archive.write(json.dumps(index).encode())
+        archive.write(TRAILER.pack(index_offset, TRAILER_TAG))
+        archive.flush()
+        os.fsync(archive.fileno())
+
+class ArchivedRun:
+    """Reads a chunked run archive with the row interface of the CSV replay reader.
+
+    Only the JSON index is read on open. A seek (row_for_time, row_time,
+    rows from a given row) decompresses just the chunk it lands in, so a
+    time range costs the chunks it spans, not the whole run. The last
+    chunk used is kept decompressed. Rows are timed like the CSV reader
+    times them (Common/runTiming.py), so seeks agree across the formats;
+    version 1 archives, which lack the clock, spread rows within each
+    second of their timestamps.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        if self._file.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+            raise ValueError(f"{path} is not a run archive")
+        self._file.seek(-TRAILER.size, os.SEEK_END)
+        index_offset, tag = TRAILER.unpack(self._file.read(TRAILER.size))
+        if tag != TRAILER_TAG:
+            raise ValueError(f"{path} is incomplete: no chunk index")
+        self._file.seek(index_offset)
+        self.index = json.loads(self._file.read(os.path.getsize(path) - TRAILER.size - index_offset))
+        self._decompress = CODECS[self.index['codec']][1]
+        self.chunks = self.index['chunks']
+        self.header = self.index['header']
+        self.fields = self.header.strip().split(',')
+        self._columns = _clock_columns(self.fields)
+        self._time_column = self._columns[0]
+        self.start_time = self.index['start_time']
+        self._first_rows = [chunk[2] for chunk in self.chunks]
+        self.time_source = self.index.get('time_source', 'timestamp')
+        self._origin = self.index.get('time_origin')
+        self._chunk_times = self.index.get('chunk_times') or [chunk[4] - self.start_time for chunk in self.chunks]
+        self._cached = None
+
+    def __len__(self):
+        return self.index['rows']
+
+    def close(self):
+        self._file.close()
+        self._cached = None
+
+    def chunk_data(self, number):
+        """Decompresses one chunk and returns its rows as raw bytes."""
+        offset, size, _, _, _, _, crc = self.chunks[number]
+        self._file.seek(offset)
+        data = self._decompress(self._file.read(size))
+        if zlib.crc32(data) != crc:
+            raise ValueError(f"{self.path}: chunk {number} is corrupt")
+        return data
+
+    def _chunk(self, number):
+        """(lines, row times) of a chunk, timed exactly as the whole run was when it was archived."""
+        if self._cached and self._cached[0] == number:
+            return self._cached[1]
+        lines = self.chunk_data(number).splitlines()
+        seconds_cache = {}
+        clocks = [_row_clocks(line, self._columns, seconds_cache) for line in lines]
+        first_time = self._chunk_times[number]
+        origin = self._origin
+        if self.time_source == 'timestamp':
+            # Text timestamps parse to other unix seconds in another time zone (and version 1 parsed them as
+            # UTC), so shift the origin by how far this chunk's first second moved since it was archived
+            chunk_first_second = self.chunks[number][4]
+            base = self.start_time if origin is None else origin
+            if chunk_first_second is not None:
+                first_second = next(row[0] for row in clocks if row is not None)
+                origin = base + first_second - chunk_first_second
+            else:
+                origin = base
+        times = _row_times(clocks, self.time_source, origin, first_time).tolist()
+        self._cached = number, (lines, times)
+        return lines, times
+
+    def _chunk_of_row(self, row_number):
+        return bisect.bisect_right(self._first_rows, row_number) - 1
+
+    def row_for_time(self, seconds_from_start):
+        """Returns the first row at or after the given offset into the run."""
+        # The last chunk starting before that time; past its end the answer is the next chunk's first row
+        number = bisect.bisect_left(self._chunk_times, seconds_from_start) - 1
+        if number < 0:
+            return 0
+        _, times = self._chunk(number)
+        return self._first_rows[number] + bisect.bisect_left(times, seconds_from_start)
+
+    def row_time(self, row_number):
+        """Returns the row time in seconds from the start of the run."""
+        number = self._chunk_of_row(row_number)
+        return self._chunk(number)[1][row_number - self._first_rows[number]]
+
+    def rows(self, start_row=0, end_row=None):
+        """Yields (row_number, time_from_start, values) with values parsed to floats, like the CSV reader."""
+        end_row = len(self) if end_row is None else min(end_row, len(self))
+        if start_row >= end_row:
+            return
+        time_column = self._time_column
+        for number in range(self._chunk_of_row(start_row), len(self.chunks)):
+            first_row = self._first_rows[number]
+            if first_row >= end_row:
+                return
+            lines, times = self._chunk(number)
+            for position in range(max(start_row - first_row, 0), min(end_row - first_row, len(lines))):
+                row_time = times[position]
+                values = [row_time if column == time_column else (float(value) if value else None)
+                          for column, value in enumerate(lines[position].split(b','))]
+                yield first_row + position, row_time, values
+
+    def lines(self):
+        """Yields the CSV text line by line, header first, for csv/NumPy readers."""
+        yield self.header
+        for number in range(len(self.chunks)):
+            yield from self.chunk_data(number).decode().splitlines(keepends=True)
+
+    def verify(self):
+        """True when every chunk decompresses and the whole matches the CSV it was made from."""
+        crc = zlib.crc32(self.header.encode())
+        for number in range(len(self.chunks)):
+            crc = zlib.crc32(self.chunk_data(number), crc)
+        return crc == self.index['crc32']
+
+    def extract(self, csv_path):
+        """Writes the original CSV back out."""
+        with open(csv_path, 'wb') as csvfile:
+            csvfile.write(self.header.encode())
+            for number in range(len(self.chunks)):
+                csvfile.write(self.chunk_data(number))
+        return csv_path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Archive a CSV run into compressed chunks, or extract or describe an archive.")
+    parser.add_argument('run', help=f"a *_GPSData.csv run, or a *{ARCHIVE_SUFFIX} archive")
+    parser.add_argument('--codec', choices=tuple(CODECS), default=DEFAULT_CODEC, help=f"compression (default: {DEFAULT_CODEC})")
+    parser.add_argument('--extract', metavar='CSV', help="write the archive's CSV back out to this path")
+    args = parser.parse_args()
+    if args.run.endswith(ARCHIVE_SUFFIX):
+        run = ArchivedRun(args.run)
+        if args.extract:
+            print(f"Extracted {run.extract(args.extract)}")
+        else:
+            print(f"{len(run)} rows in {len(run.chunks)} {run.index['codec']} chunks, "
+                  f"{os.path.getsize(args.run)} bytes from {run.index['source_size']}, "
+                  f"{'verified' if run.verify() else 'CORRUPT'}")
+        run.close()
+    else:
+        path = archive_csv(args.run, codec=args.codec)
+        print(f"Archived {args.run} to {path}: {os.path.getsize(args.run)} -> {os.path.getsize(path)} bytes")
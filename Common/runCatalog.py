@@ -0,0 +1,208 @@
+import os
+import csv
+import sys
+import sqlite3
+import logging
+from calendar import timegm
+from time import strptime, time
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.bufferedCsvWriter import MARKER_SUFFIX
+from Common.runArchive import ArchivedRun, ARCHIVE_SUFFIX
+
+CATALOG_FILE = 'catalog.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    path TEXT PRIMARY KEY,
+    mow_id TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    duration REAL,
+    min_lat REAL, max_lat REAL, min_lon REAL, max_lon REAL,
+    size INTEGER NOT NULL,
+    closed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_mow_id ON runs (mow_id, path);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value
+);
+"""
+
+def mow_id_of(path):
+    """Returns the Mow ID a run file is named after (<id>_<ts>_GPSData.csv, or .csvz once archived)."""
+    return os.path.basename(path).split('_', 1)[0]
+
+class RunStats:
+    """Accumulates the catalog entry for a run while it is being recorded."""
+
+    def __init__(self):
+        self.rows = 0
+        self.first_time = self.last_time = None
+        self.min_lat = self.max_lat = self.min_lon = self.max_lon = None
+
+    def update(self, latitude, longitude, row_time=None):
+        """Adds one row; row_time is in seconds and defaults to now."""
+        row_time = time() if row_time is None else row_time
+        if self.first_time is None:
+            self.first_time = row_time
+        self.last_time = row_time
+        self.rows += 1
+        if latitude is None or longitude is None:
+            return
+        if self.min_lat is None:
+            self.min_lat = self.max_lat = latitude
+            self.min_lon = self.max_lon = longitude
+            return
+        # Plain comparisons are cheaper than min()/max() calls on the hot path
+        if latitude < self.min_lat:
+            self.min_lat = latitude
+        elif latitude > self.max_lat:
+            self.max_lat = latitude
+        if longitude < self.min_lon:
+            self.min_lon = longitude
+        elif longitude > self.max_lon:
+            self.max_lon = longitude
+
+    @property
+    def duration(self):
+        return (self.last_time - self.first_time) if self.rows else 0.0
+
+def _stats_from_rows(rows):
+    stats = RunStats()
+    last_stamp = last_seconds = None
+    for row in rows:
+        stamp = row.get('timestamp')
+        if stamp != last_stamp:
+            last_stamp = stamp
+            try:
+                last_seconds = timegm(strptime(stamp, "%Y-%m-%d %H:%M:%S"))
+            except (TypeError, ValueError):
+                last_seconds = None
+        try:
+            latitude, longitude = float(row['latitude']), float(row['longitude'])
+        except (KeyError, TypeError, ValueError):
+            latitude = longitude = None
+        stats.update(latitude, longitude, last_seconds or 0)
+    return stats
+
+def stats_from_csv(path):
+    """Builds RunStats by streaming an existing CSV run or archive (used to backfill the catalog)."""
+    if path.endswith(ARCHIVE_SUFFIX):
+        archive = ArchivedRun(path)
+        try:
+            return _stats_from_rows(csv.DictReader(archive.lines()))
+        finally:
+            archive.close()
+    with open(path, newline='') as csvfile:
+        return _stats_from_rows(csv.DictReader(csvfile))
+
+class RunCatalog:
+    """Persistent index of the recorded runs in a data directory.
+
+    The recorder adds an entry when a run closes, so looking up a Mow ID is
+    an indexed SQLite query instead of a directory scan. The catalog is
+    reconciled with the directory when it is created, by rebuild(), and
+    before a lookup if the directory's mtime has changed since the last
+    scan (runs copied on or off the card behind the catalog's back).
+    """
+
+    def __init__(self, data_dir):
+        self.data_dir = data_dir
+        os.makedirs(data_dir, exist_ok=True)
+        self.path = os.path.join(data_dir, CATALOG_FILE)
+        is_new = not os.path.exists(self.path)
+        # The recorder and selectMode use the catalog from different processes
+        self.db = sqlite3.connect(self.path, timeout=5)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(SCHEMA)
+        if is_new:
+            self.rebuild()
+
+    def close(self):
+        self.db.close()
+
+    def add_run(self, path, stats):
+        """Adds or replaces the entry for a closed run."""
+        with self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (os.path.basename(path), mow_id_of(path), stats.rows, stats.duration,
+                 stats.min_lat, stats.max_lat, stats.min_lon, stats.max_lon,
+                 os.path.getsize(path), time()))
+
+    def add_csv(self, path):
+        """Adds an existing CSV run, reading it once to compute its stats."""
+        self.add_run(path, stats_from_csv(path))
+
+    def rename_run(self, path, new_path):
+        """Moves an entry to the file that now holds the run (an archive), keeping its stats."""
+        with self.db:
+            self.db.execute("UPDATE runs SET path = ?, size = ? WHERE path = ?",
+                            (os.path.basename(new_path), os.path.getsize(new_path), os.path.basename(path)))
+
+    def remove_run(self, path):
+        with self.db:
+            self.db.execute("DELETE FROM runs WHERE path = ?", (os.path.basename(path),))
+
+    def _latest_entry(self, mow_id):
+        row = self.db.execute(
+            "SELECT path FROM runs WHERE mow_id = ? ORDER BY path DESC LIMIT 1", (mow_id,)).fetchone()
+        return os.path.join(self.data_dir, row[0]) if row else None
+
+    def has_run(self, mow_id):
+        """Returns True if at least one run is recorded for the Mow ID."""
+        return self.latest_run(mow_id) is not None
+
+    def latest_run(self, mow_id):
+        """Returns the full path of the most recent run for a Mow ID, or None."""
+        if self._directory_changed():
+            self.rebuild()
+        path = self._latest_entry(mow_id)
+        while path and not os.path.exists(path):
+            # Gone without the directory changing since the scan (a coarse mtime); forget it
+            self.remove_run(path)
+            path = self._latest_entry(mow_id)
+        return path
+
+    def runs(self, mow_id=None):
+        """Returns catalog entries as dicts, optionally for one Mow ID."""
+        query = "SELECT * FROM runs" + (" WHERE mow_id = ?" if mow_id else "") + " ORDER BY path"
+        cursor = self.db.execute(query, (mow_id,) if mow_id else ())
+        names = [column[0] for column in cursor.description]
+        return [dict(zip(names, row)) for row in cursor]
+
+    def _directory_changed(self):
+        """Returns True if files were added to or removed from the data directory since the last scan."""
+        row = self.db.execute("SELECT value FROM meta WHERE key = 'scanned_mtime'").fetchone()
+        return row is None or row[0] != os.stat(self.data_dir).st_mtime_ns
+
+    def rebuild(self):
+        """Re-scans the data directory once: adds missing runs and drops deleted ones."""
+        # Taken before listing, so a change made during the scan is picked up by the next lookup
+        scanned_mtime = os.stat(self.data_dir).st_mtime_ns
+        known = {row[0] for row in self.db.execute("SELECT path FROM runs")}
+        present = set()
+        for filename in os.listdir(self.data_dir):
+            # Runs with a commit marker are still open or awaiting recovery
+            if (filename.endswith('_GPSData' + ARCHIVE_SUFFIX) or filename.endswith('_GPSData.csv')
+                    and not os.path.exists(os.path.join(self.data_dir, filename + MARKER_SUFFIX))):
+                present.add(filename)
+                if filename not in known:
+                    self.add_csv(os.path.join(self.data_dir, filename))
+        for filename in known - present:
+            self.remove_run(filename)
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('scanned_mtime', ?)", (scanned_mtime,))
+        logging.info(f"Run catalog rebuilt: {len(present)} runs in {self.data_dir}")
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    # Rebuild and list the catalog of the recorder's data directory (or the one given)
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Record', 'Data')
+    catalog = RunCatalog(data_dir)
+    catalog.rebuild()
+    for entry in catalog.runs():
+        print(f"{entry['path']}: {entry['rows']} rows, {entry['duration']:.0f} s, {entry['size']} bytes")
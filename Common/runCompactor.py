@@ -0,0 +1,165 @@
+import os
+import sys
+import shutil
+import logging
+import argparse
+import threading
+from time import time, monotonic
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.bufferedCsvWriter import MARKER_SUFFIX
+from Common.columnarRun import columnar_path
+from Common.runArchive import archive_csv, ArchivedRun, ArchiveStopped, CODECS, DEFAULT_CODEC
+from Common.runCatalog import RunCatalog
+
+RECORD_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Record', 'Data')
+
+# CSV runs untouched for this many days are archived
+COMPACT_AFTER_DAYS = 7
+
+# Seconds between looks at the data directory
+CHECK_INTERVAL = 3600
+
+# Lowest CPU priority for the compactor thread
+NICENESS = 19
+
+def stale_runs(data_dir, older_than_days=COMPACT_AFTER_DAYS, now=None):
+    """CSV runs last written more than `older_than_days` ago, oldest first; open or unrecovered runs are left out."""
+    cutoff = (time() if now is None else now) - older_than_days * 86400
+    runs = []
+    for filename in os.listdir(data_dir):
+        path = os.path.join(data_dir, filename)
+        if (filename.endswith('_GPSData.csv') and not os.path.exists(path + MARKER_SUFFIX)
+                and os.path.getmtime(path) < cutoff):
+            runs.append(path)
+    return sorted(runs, key=os.path.getmtime)
+
+def compact_run(csv_path, catalog=None, codec=DEFAULT_CODEC, should_stop=None):
+    """Archives one CSV run and removes the CSV and its columnar copy; returns (archive path, bytes saved).
+
+    The archive is read back and checked against the CSV before anything
+    is deleted, and the catalog entry is moved over to it. should_stop is
+    passed on to archive_csv().
+    """
+    size = os.path.getsize(csv_path)
+    path = archive_csv(csv_path, codec=codec, should_stop=should_stop)
+    archive = ArchivedRun(path)
+    try:
+        verified = archive.verify() and archive.index['source_size'] == size
+    finally:
+        archive.close()
+    if not verified:
+        os.remove(path)
+        raise ValueError(f"{os.path.basename(path)} does not read back as {os.path.basename(csv_path)}")
+    if catalog:
+        catalog.rename_run(csv_path, path)
+    os.remove(csv_path)
+    # The columnar copy can be rebuilt from the archive; the path index is small and stays
+    shutil.rmtree(columnar_path(csv_path), ignore_errors=True)
+    return path, size - os.path.getsize(path)
+
+def compact_old_runs(data_dir=RECORD_DATA_DIR, older_than_days=COMPACT_AFTER_DAYS, codec=DEFAULT_CODEC,
+                     should_stop=None, failed=None):
+    """Archives every stale run in data_dir and returns the archives.
+
+    should_stop() is asked between runs and between the chunks of a run; a
+    run cut short is left as it was. Runs that could not be archived are
+    recorded in `failed` (path: modification time) and skipped while they
+    stay unchanged.
+    """
+    archives = []
+    failed = {} if failed is None else failed
+    runs = [path for path in stale_runs(data_dir, older_than_days) if failed.get(path) != os.path.getmtime(path)]
+    if not runs:
+        return archives
+    catalog = RunCatalog(data_dir)
+    try:
+        for csv_path in runs:
+            if should_stop and should_stop():
+                break
+            started = monotonic()
+            try:
+                path, saved = compact_run(csv_path, catalog, codec, should_stop)
+            except ArchiveStopped:
+                logging.info(f"Archiving of {os.path.basename(csv_path)} stopped, it is left as it was")
+                break
+            except (OSError, ValueError) as e:
+                if os.path.exists(csv_path):
+                    failed[csv_path] = os.path.getmtime(csv_path)
+                logging.error(f"Could not archive {os.path.basename(csv_path)}, skipping it until it changes: {e}")
+                continue
+            archives.append(path)
+            logging.info(f"Archived {os.path.basename(csv_path)} to {os.path.basename(path)}: "
+                         f"{saved / 1024:.0f} KiB saved in {monotonic() - started:.1f} s")
+    finally:
+        catalog.close()
+    return archives
+
+class RunCompactor:
+    """Archives old runs on a low-priority background thread.
+
+    Every `interval` seconds the data directory is checked for CSV runs
+    older than `older_than_days`, and each is replaced by its archive (see
+    Common/runArchive.py). pause() stops the compactor at the next chunk,
+    so a recording or replay does not share the SD card with it; resume()
+    lets it carry on at the next check. Runs that fail to archive are not
+    tried again while their file stays the same.
+    """
+
+    def __init__(self, data_dir=RECORD_DATA_DIR, older_than_days=COMPACT_AFTER_DAYS, codec=DEFAULT_CODEC,
+                 interval=CHECK_INTERVAL):
+        self.data_dir = data_dir
+        self.older_than_days = older_than_days
+        self.codec = codec
+        self.interval = interval
+        self.archived = 0
+        self.failed = {}
+        self._stop = threading.Event()
+        self._paused = threading.Event()
+        self._thread = None
+
+    def _should_stop(self):
+        return self._stop.is_set() or self._paused.is_set()
+
+    def _run(self):
+        try:
+            # On Linux a thread ID works as a process ID here and only this thread is lowered
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), NICENESS)
+        except (AttributeError, OSError):
+            pass
+        while not self._stop.is_set():
+            if not self._paused.is_set():
+                try:
+                    self.archived += len(compact_old_runs(self.data_dir, self.older_than_days, self.codec,
+                                                          self._should_stop, self.failed))
+                except Exception as e:
+                    logging.error(f"Run compactor: {e}")
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='run-compactor', daemon=True)
+        self._thread.start()
+        return self
+
+    def pause(self):
+        self._paused.set()
+
+    def resume(self):
+        self._paused.clear()
+
+    def close(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Archive recorded runs older than a number of days, once.")
+    parser.add_argument('data_dir', nargs='?', default=RECORD_DATA_DIR, help="directory of the runs (default: Record/Data)")
+    parser.add_argument('--days', type=float, default=COMPACT_AFTER_DAYS,
+                        help=f"archive runs older than this (default: {COMPACT_AFTER_DAYS})")
+    parser.add_argument('--codec', choices=tuple(CODECS), default=DEFAULT_CODEC, help=f"compression (default: {DEFAULT_CODEC})")
+    args = parser.parse_args()
+    archives = compact_old_runs(args.data_dir, args.days, args.codec)
+    print(f"{len(archives)} runs archived in {args.data_dir}")
@@ -0,0 +1,77 @@
+from time import mktime, strptime
+import numpy as np
+
+from Common.epochFusion import WEEK_MS
+
+# Clocks a recorded run can be timed from, best first: the receiver's GPS
+# time of week, the monotonic time each fix was read, then the text timestamp
+TIME_SOURCES = ('itow', 'recv_time', 'timestamp')
+
+# Format of the recorder's text timestamp, written in local time
+STAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+def stamp_seconds(stamp):
+    """Unix seconds for a recorded timestamp (local time, one-second resolution)."""
+    return mktime(strptime(stamp, STAMP_FORMAT))
+
+def time_source(itow=None, recv_time=None):
+    """Returns the best clock that every row has a value for.
+
+    itow and recv_time are float arrays with NaN for an empty cell; a run
+    missing either on any row falls back to the next one.
+    """
+    for source, values in (('itow', itow), ('recv_time', recv_time)):
+        if values is not None and len(values) and not np.isnan(values).any():
+            return source
+    return 'timestamp'
+
+def first_value(clock):
+    """The first value of a clock that is not NaN (0.0 if there is none)."""
+    present = clock[~np.isnan(clock)]
+    return float(present[0]) if len(present) else 0.0
+
+def _elapsed(clock, origin, wrap=None):
+    """How far a clock has run since origin, in its own units."""
+    elapsed = clock - origin
+    if wrap:
+        # iTOW wraps at the end of the GPS week; a run is far shorter than half a week
+        elapsed = (elapsed + wrap / 2) % wrap - wrap / 2
+    return elapsed
+
+def spread_within_seconds(seconds, origin):
+    """Seconds from origin, spreading each run of rows stamped with the same second evenly across it."""
+    whole = seconds - origin
+    # A second seen again after a clock step starts a run of its own
+    new_run = np.concatenate(([True], whole[1:] != whole[:-1]))
+    starts = np.flatnonzero(new_run)
+    run = np.cumsum(new_run) - 1
+    counts = np.diff(np.append(starts, len(whole)))
+    within = np.arange(len(whole)) - starts[run]
+    return whole + within / counts[run]
+
+def run_times(seconds, itow=None, recv_time=None, source=None, origin=None, floor=0.0):
+    """Returns (seconds from the start of the run for every row, the clock they came from).
+
+    iTOW and recv_time keep the cadence the fixes arrived at and do not move
+    when NTP steps the wall clock; the one-second text timestamp is only used
+    when a run lacks both. A row with no value (NaN) for the clock holds
+    the time of the row before it. To time part of a run (an archive chunk,
+    say) exactly as the whole run would be, pass the run's source, the
+    first value of that clock as origin and the time of the part's first
+    row as floor.
+    """
+    source = source or time_source(itow, recv_time)
+    clock = np.asarray({'itow': itow, 'recv_time': recv_time}.get(source, seconds), dtype=np.float64)
+    if not len(clock):
+        return np.empty(0, dtype=np.float64), source
+    if origin is None:
+        origin = first_value(clock)
+    if source == 'itow':
+        times = _elapsed(clock, origin, WEEK_MS) / 1000
+    elif source == 'recv_time':
+        times = _elapsed(clock, origin)
+    else:
+        times = spread_within_seconds(clock, origin)
+    # A repeated epoch or a clock stepped back holds the time rather than rewinding it, so seeks can bisect;
+    # fmax passes over NaN
+    return np.fmax.accumulate(np.fmax(times, floor)), source
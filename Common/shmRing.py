@@ -0,0 +1,161 @@
+import struct
+import multiprocessing
+from multiprocessing import shared_memory
+
+# Each frame is stored as a little-endian uint32 length and float64 monotonic receive time, then the frame bytes
+RECORD_HEADER = struct.Struct('<Id')
+
+# uint64 slots at the start of the shared block
+WRITE_POS, READ_POS, FRAMES_WRITTEN, FRAMES_READ, OVERRUNS, BYTES_IN, MAX_OCCUPANCY, CLOSED = range(8)
+HEADER_SLOTS = 8
+HEADER_SIZE = HEADER_SLOTS * 8
+
+DEFAULT_CAPACITY = 4 << 20
+
+# Seconds stats() waits for the lock before reading the counters without it
+STATS_LOCK_TIMEOUT = 1.0
+
+class ShmRing:
+    """Single-producer, multi-consumer frame ring in multiprocessing.shared_memory.
+
+    The producer (the serial reader process) appends whole frames; a frame
+    that does not fit in the free space is dropped and counted as an
+    overrun instead of blocking the reader. Consumers claim batches of
+    frames in order under a shared lock, so every frame gets a sequence
+    number and results from several consumers can be put back in order.
+    Positions are running byte counts; the data wraps modulo the capacity.
+
+    Create the ring before starting the processes (fork start method) so
+    they all share the same block, and call unlink() in the creator once
+    everyone is done with it.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, ctx=None):
+        ctx = ctx or multiprocessing.get_context('fork')
+        self.capacity = capacity
+        self.shm = shared_memory.SharedMemory(create=True, size=HEADER_SIZE + capacity)
+        self._header = self.shm.buf[:HEADER_SIZE].cast('Q')
+        self._data = self.shm.buf[HEADER_SIZE:HEADER_SIZE + capacity]
+        for slot in range(HEADER_SLOTS):
+            self._header[slot] = 0
+        # The lock also orders the producer's data writes before the position update
+        self.lock = ctx.Lock()
+        self._readable = ctx.Condition(self.lock)
+        # Producer-private copy of the write position
+        self._write_pos = 0
+
+    def _copy_in(self, position, data):
+        start = position % self.capacity
+        first = min(len(data), self.capacity - start)
+        self._data[start:start + first] = data[:first]
+        if first < len(data):
+            self._data[:len(data) - first] = data[first:]
+
+    def _copy_out(self, position, length):
+        start = position % self.capacity
+        end = start + length
+        if end <= self.capacity:
+            return bytes(self._data[start:end])
+        return bytes(self._data[start:]) + bytes(self._data[:end - self.capacity])
+
+    def put(self, frames, bytes_in=0, recv_time=0.0):
+        """Producer: appends frames received at recv_time, dropping (and counting) any that do not fit.
+
+        Returns how many were written.
+        """
+        header = self._header
+        with self.lock:
+            read_pos = header[READ_POS]
+        write_pos = self._write_pos
+        written = overruns = 0
+        for frame in frames:
+            size = RECORD_HEADER.size + len(frame)
+            if write_pos + size - read_pos > self.capacity:
+                overruns += 1
+                continue
+            self._copy_in(write_pos, RECORD_HEADER.pack(len(frame), recv_time))
+            self._copy_in(write_pos + RECORD_HEADER.size, frame)
+            write_pos += size
+            written += 1
+        self._write_pos = write_pos
+
+        # Publish the new frames and wake the consumers
+        with self._readable:
+            header[WRITE_POS] = write_pos
+            header[FRAMES_WRITTEN] += written
+            header[OVERRUNS] += overruns
+            header[BYTES_IN] += bytes_in
+            occupancy = write_pos - header[READ_POS]
+            if occupancy > header[MAX_OCCUPANCY]:
+                header[MAX_OCCUPANCY] = occupancy
+            if written:
+                self._readable.notify_all()
+        return written
+
+    def close_writer(self):
+        """Producer: no more frames; consumers return None once the ring is drained."""
+        with self._readable:
+            self._header[CLOSED] = 1
+            self._readable.notify_all()
+
+    def get(self, max_frames=64, timeout=None):
+        """Consumer: claims up to max_frames frames.
+
+        Returns (first_seq, [(frame, recv_time)]), (None, []) on timeout, or
+        None once the producer has closed the ring and every frame has been
+        claimed.
+        """
+        header = self._header
+        with self._readable:
+            if header[READ_POS] == header[WRITE_POS]:
+                if header[CLOSED]:
+                    return None
+                self._readable.wait(timeout)
+                if header[READ_POS] == header[WRITE_POS]:
+                    return None if header[CLOSED] else (None, [])
+            read_pos = header[READ_POS]
+            write_pos = header[WRITE_POS]
+            first_seq = header[FRAMES_READ]
+            frames = []
+            while read_pos < write_pos and len(frames) < max_frames:
+                length, recv_time = RECORD_HEADER.unpack(self._copy_out(read_pos, RECORD_HEADER.size))
+                frames.append((self._copy_out(read_pos + RECORD_HEADER.size, length), recv_time))
+                read_pos += RECORD_HEADER.size + length
+            header[READ_POS] = read_pos
+            header[FRAMES_READ] += len(frames)
+        return first_seq, frames
+
+    def stats(self):
+        """Returns the ring's counters: occupancy and lag show how far the consumers are behind."""
+        header = self._header
+        if self.lock.acquire(timeout=STATS_LOCK_TIMEOUT):
+            try:
+                values = list(header)
+            finally:
+                self.lock.release()
+        else:
+            # A process killed inside put() or get() leaves the lock held; an unlocked snapshot still tells why
+            values = list(header)
+        return {
+            'capacity': self.capacity,
+            'occupancy': values[WRITE_POS] - values[READ_POS],
+            'max_occupancy': values[MAX_OCCUPANCY],
+            'frames_written': values[FRAMES_WRITTEN],
+            'frames_read': values[FRAMES_READ],
+            'lag_frames': values[FRAMES_WRITTEN] - values[FRAMES_READ],
+            'overruns': values[OVERRUNS],
+            'bytes_in': values[BYTES_IN],
+        }
+
+    def close(self):
+        """Detaches this process from the shared block."""
+        if self._header is not None:
+            self._header.release()
+            self._data.release()
+            self._header = self._data = None
+            self.shm.close()
+
+    def unlink(self):
+        """Frees the shared block; only the process that created the ring should call this."""
+        self.close()
+        self.shm.unlink()
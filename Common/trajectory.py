@@ -0,0 +1,180 @@
+import os
+import sys
+import argparse
+from time import perf_counter
+import numpy as np
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.columnarRun import ColumnarRun, columnar_path, convert_csv, HEADER_FILE
+from Common.epochFusion import WEEK_MS
+
+# WGS84 ellipsoid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+
+# Segments shorter than this (m) are standing still; their heading is noise and left as NaN
+MIN_SEGMENT = 0.02
+
+# Outlier flags: faster than MAX_SPEED (m/s) between fixes, or a spike out and back
+# longer than SPIKE_FACTOR times the run's median step
+MAX_SPEED = 15.0
+SPIKE_FACTOR = 10.0
+
+def geodetic_to_ecef(lat, lon, height=0.0):
+    """WGS84 latitude/longitude (degrees) and height (m) to ECEF x, y, z (m); works on whole arrays."""
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    radius = WGS84_A / np.sqrt(1 - WGS84_E2 * sin_lat * sin_lat)
+    x = (radius + height) * cos_lat * np.cos(lon)
+    y = (radius + height) * cos_lat * np.sin(lon)
+    z = (radius * (1 - WGS84_E2) + height) * sin_lat
+    return x, y, z
+
+def first_fix(lat, lon, height=0.0):
+    """(lat, lon, height) of the first fix with a position, the default ENU origin."""
+    first = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon)))
+    first = first[0] if len(first) else 0
+    return float(lat[first]), float(lon[first]), float(height if np.isscalar(height) else height[first])
+
+def enu(lat, lon, height=0.0, origin=None):
+    """Local east, north, up (m) around `origin` (lat, lon, height); defaults to the first fix."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    lat0, lon0, height0 = origin or first_fix(lat, lon, height)
+    x, y, z = geodetic_to_ecef(lat, lon, height)
+    x0, y0, z0 = geodetic_to_ecef(lat0, lon0, height0)
+    dx, dy, dz = x - x0, y - y0, z - z0
+    sin_lat0, cos_lat0 = np.sin(np.radians(lat0)), np.cos(np.radians(lat0))
+    sin_lon0, cos_lon0 = np.sin(np.radians(lon0)), np.cos(np.radians(lon0))
+    east = -sin_lon0 * dx + cos_lon0 * dy
+    north = -sin_lat0 * cos_lon0 * dx - sin_lat0 * sin_lon0 * dy + cos_lat0 * dz
+    up = cos_lat0 * cos_lon0 * dx + cos_lat0 * sin_lon0 * dy + sin_lat0 * dz
+    return east, north, up
+
+def _per_fix(segment_values):
+    # Segment i runs from fix i-1 to fix i; the first fix has no segment
+    return np.concatenate(([np.nan], segment_values))
+
+def segment_lengths(east, north):
+    """Horizontal distance (m) from the previous fix, NaN for the first."""
+    return _per_fix(np.hypot(np.diff(east), np.diff(north)))
+
+def segment_headings(east, north):
+    """Heading (degrees, 0-360 clockwise from north) of the step from the previous fix.
+
+    Steps shorter than MIN_SEGMENT are NaN: standing still has no direction.
+    """
+    de, dn = np.diff(east), np.diff(north)
+    headings = np.degrees(np.arctan2(de, dn)) % 360
+    headings[np.hypot(de, dn) < MIN_SEGMENT] = np.nan
+    return _per_fix(headings)
+
+def curvature(headings, lengths):
+    """Change of heading per metre (1/m, positive turning right) at each fix."""
+    turn = (np.diff(headings) + 180) % 360 - 180
+    return _per_fix(np.radians(turn) / lengths[1:])
+
+def speeds(lengths, time):
+    """Speed (m/s) from positions: each step's length over its time."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _per_fix(lengths[1:] / np.diff(time))
+
+def outliers(east, north, lengths, speed, max_speed=MAX_SPEED, spike_factor=SPIKE_FACTOR):
+    """Boolean flags for fixes that cannot be right.
+
+    A fix is flagged when its position is missing, when reaching it needs
+    more than `max_speed`, or when it is a spike: a step out and a step
+    back that are both longer than `spike_factor` times the median step,
+    while its neighbours are close to each other.
+    """
+    flags = np.isnan(east) | np.isnan(north)
+    with np.errstate(invalid='ignore'):
+        if len(east) >= 3:
+            median = np.nanmedian(lengths[1:])
+            limit = spike_factor * max(median, MIN_SEGMENT)
+            step_in, step_out = lengths[1:-1], lengths[2:]
+            skip = np.hypot(east[2:] - east[:-2], north[2:] - north[:-2])
+            flags[1:-1] |= (step_in > limit) & (step_out > limit) & (skip < np.minimum(step_in, step_out) / 2)
+        # The step back from a spike is fast too, but the fix it lands on is fine
+        too_fast = speed > max_speed
+        too_fast[1:] &= ~flags[:-1]
+        flags |= too_fast
+    return flags
+
+class Trajectory:
+    """A recorded run as NumPy arrays, with its geometry worked out for every fix at once.
+
+    east/north/up are metres around `origin`, the first fix; length,
+    heading, speed and curvature belong to the step from the previous fix
+    (NaN for the first); outlier flags fixes that cannot be right. Time
+    comes from the GNSS time of week when the run has it, else from the
+    recorded run time.
+    """
+
+    def __init__(self, lat, lon, time, height=0.0):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.time = np.asarray(time, dtype=np.float64)
+        self.origin = first_fix(self.lat, self.lon, height) if len(self.lat) else (0.0, 0.0, 0.0)
+        self.east, self.north, self.up = enu(self.lat, self.lon, height, self.origin)
+        self.length = segment_lengths(self.east, self.north)
+        self.heading = segment_headings(self.east, self.north)
+        self.speed = speeds(self.length, self.time)
+        self.curvature = curvature(self.heading, self.length)
+        self.outlier = outliers(self.east, self.north, self.length, self.speed)
+
+    @classmethod
+    def from_run(cls, path):
+        """Loads a recorded run (CSV, archive or columnar); one without a current columnar copy is converted first."""
+        if not os.path.isdir(path):
+            header_path = os.path.join(columnar_path(path), HEADER_FILE)
+            if not (os.path.exists(header_path) and os.path.getmtime(header_path) >= os.path.getmtime(path)):
+                convert_csv(path)
+            path = columnar_path(path)
+        run = ColumnarRun(path)
+        try:
+            time = run['time']
+            if 'itow' in run.columns and len(run) and not np.isnan(run['itow']).any():
+                # Time of week in ms; the modulo carries a run across the week rollover
+                time = (run['itow'] - run['itow'][0]) % WEEK_MS / 1000
+            return cls(run['latitude'], run['longitude'], time)
+        finally:
+            run.close()
+
+    def __len__(self):
+        return len(self.lat)
+
+    def summary(self):
+        """Totals over the fixes that are not flagged as outliers."""
+        good = ~self.outlier
+        # A step counts when both of its ends are good
+        steps = good.copy()
+        steps[1:] &= good[:-1]
+        steps[0] = False
+        duration = float(self.time[-1] - self.time[0]) if len(self) > 1 else 0.0
+        distance = float(np.nansum(self.length[steps]))
+        return {
+            'fixes': len(self),
+            'outliers': int(self.outlier.sum()),
+            'duration_s': duration,
+            'distance_m': distance,
+            'mean_speed_ms': distance / duration if duration else float('nan'),
+            'max_speed_ms': float(np.nanmax(self.speed[steps])) if steps.any() else float('nan'),
+            'extent_m': (float(np.nanmax(self.east) - np.nanmin(self.east)),
+                         float(np.nanmax(self.north) - np.nanmin(self.north))) if len(self) else (0.0, 0.0),
+        }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Distances, ENU track, speeds and outliers of a recorded run.")
+    parser.add_argument('run', help="path to a *_GPSData.csv run, its .csvz archive or its .cols directory")
+    args = parser.parse_args()
+    started = perf_counter()
+    trajectory = Trajectory.from_run(args.run)
+    elapsed = perf_counter() - started
+    for name, value in trajectory.summary().items():
+        print(f"{name:>14}: {value}")
+    print(f"{'processed in':>14}: {elapsed * 1000:.1f} ms")
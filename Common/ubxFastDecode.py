@@ -0,0 +1,108 @@
+import struct
+from itertools import accumulate
+from collections import namedtuple
+
+# Payload layouts of the messages the recorder reads every epoch (u-blox F9 HPG interface description)
+NAV_RELPOSNED = struct.Struct('<BxHIiiiii4xbbbbIIIII4xI')   # version 1, 64 bytes
+NAV_PVT = struct.Struct('<IHBBBBBBIiBBBBiiiiIIiiiiiIIHH4xihH')  # 92 bytes
+NAV_HPPOSLLH = struct.Struct('<B2xBIiiiibbbbII')            # 36 bytes
+
+# Class, ID and payload length sit behind the two sync bytes
+UBX_HEADER = struct.Struct('<BBH')
+PAYLOAD_OFFSET = 6
+
+class NavRelPosNed(namedtuple('NavRelPosNed', 'version refStationID iTOW relPosN relPosE relPosD relPosLength '
+                              'relPosHeading accN accE accD accLength accHeading flags')):
+    """NAV-RELPOSNED with pyubx2's names and scaling (cm, degrees, mm; high-precision parts added in)."""
+    __slots__ = ()
+    identity = 'NAV-RELPOSNED'
+    gnssFixOK = property(lambda self: self.flags & 1)
+    diffSoln = property(lambda self: (self.flags >> 1) & 1)
+    relPosValid = property(lambda self: (self.flags >> 2) & 1)
+    carrSoln = property(lambda self: (self.flags >> 3) & 3)
+    isMoving = property(lambda self: (self.flags >> 5) & 1)
+    relPosHeadingValid = property(lambda self: (self.flags >> 8) & 1)
+
+class NavPvt(namedtuple('NavPvt', 'iTOW year month day hour min second valid tAcc nano fixType flags flags2 numSV '
+                        'lon lat height hMSL hAcc vAcc velN velE velD gSpeed headMot sAcc headAcc pDOP flags3 '
+                        'headVeh magDec magAcc')):
+    """NAV-PVT with pyubx2's names and scaling (degrees, mm, mm/s)."""
+    __slots__ = ()
+    identity = 'NAV-PVT'
+    validDate = property(lambda self: self.valid & 1)
+    validTime = property(lambda self: (self.valid >> 1) & 1)
+    fullyResolved = property(lambda self: (self.valid >> 2) & 1)
+    gnssFixOk = property(lambda self: self.flags & 1)
+    diffSoln = property(lambda self: (self.flags >> 1) & 1)
+    headVehValid = property(lambda self: (self.flags >> 5) & 1)
+    carrSoln = property(lambda self: (self.flags >> 6) & 3)
+    invalidLlh = property(lambda self: self.flags3 & 1)
+
+class NavHpPosLlh(namedtuple('NavHpPosLlh', 'version flags iTOW lon lat height hMSL hAcc vAcc')):
+    """NAV-HPPOSLLH with pyubx2's names and scaling (degrees, mm; high-precision parts added in)."""
+    __slots__ = ()
+    identity = 'NAV-HPPOSLLH'
+    invalidLlh = property(lambda self: self.flags & 1)
+
+def ubx_checksum(data):
+    """8-bit Fletcher checksum over class, id, length and payload.
+
+    CK_A is the byte sum and CK_B the sum of the running sums, so both are
+    computed by sum()/accumulate() in C rather than a per-byte Python loop.
+    Iterating bytes is quicker than iterating a memoryview, so pass bytes.
+    """
+    return bytes((sum(data) & 0xFF, sum(accumulate(data)) & 0xFF))
+
+def checksum_ok(frame):
+    """True when a complete UBX frame's checksum matches."""
+    return ubx_checksum(frame[2:-2]) == frame[-2:]
+
+def _relposned(frame):
+    (version, station, itow, north, east, down, length, heading,
+     hp_north, hp_east, hp_down, hp_length, acc_n, acc_e, acc_d, acc_length, acc_heading,
+     flags) = NAV_RELPOSNED.unpack_from(frame, PAYLOAD_OFFSET)
+    return NavRelPosNed(version, station, itow, north + hp_north / 100, east + hp_east / 100,
+                        down + hp_down / 100, length + hp_length / 100, heading / 1e5,
+                        acc_n / 10, acc_e / 10, acc_d / 10, acc_length / 10, acc_heading / 1e5, flags)
+
+def _pvt(frame):
+    values = list(NAV_PVT.unpack_from(frame, PAYLOAD_OFFSET))
+    values[14] /= 1e7   # lon
+    values[15] /= 1e7   # lat
+    values[24] /= 1e5   # headMot
+    values[26] /= 1e5   # headAcc
+    values[27] /= 100   # pDOP
+    values[29] /= 1e5   # headVeh
+    values[30] /= 100   # magDec
+    values[31] /= 100   # magAcc
+    return NavPvt._make(values)
+
+def _hpposllh(frame):
+    (version, flags, itow, lon, lat, height, msl,
+     hp_lon, hp_lat, hp_height, hp_msl, h_acc, v_acc) = NAV_HPPOSLLH.unpack_from(frame, PAYLOAD_OFFSET)
+    return NavHpPosLlh(version, flags, itow, lon / 1e7 + hp_lon / 1e9, lat / 1e7 + hp_lat / 1e9,
+                       height + hp_height / 10, msl + hp_msl / 10, h_acc / 10, v_acc / 10)
+
+# (class, id): (payload length, decoder); other versions or lengths go to pyubx2
+FAST_DECODERS = {
+    (0x01, 0x3C): (NAV_RELPOSNED.size, _relposned),
+    (0x01, 0x07): (NAV_PVT.size, _pvt),
+    (0x01, 0x14): (NAV_HPPOSLLH.size, _hpposllh),
+}
+
+def decode_ubx(frame, validate=True):
+    """Decodes a hot message from a complete UBX frame; returns None for anything else.
+
+    The frame may be bytes or a memoryview into a larger buffer; the payload
+    is unpacked in place with struct.unpack_from, so nothing is copied. None means the caller should use pyubx2, which also
+    covers frames with a bad checksum when `validate` is on.
+    """
+    msg_class, msg_id, length = UBX_HEADER.unpack_from(frame, 2)
+    fast = FAST_DECODERS.get((msg_class, msg_id))
+    if fast is None or fast[0] != length or len(frame) != length + 8:
+        return None
+    if msg_id == 0x3C and frame[PAYLOAD_OFFSET] != 1:
+        return None
+    if validate and not checksum_ok(frame):
+        return None
+    return fast[1](frame)
@@ -0,0 +1,122 @@
+from pyubx2 import UBXReader
+from pynmeagps import NMEAReader
+from Common.ubxFastDecode import ubx_checksum, decode_ubx
+from Common.nmeaFast import parse_nmea, nmea_checksum_ok
+
+UBX_SYNC = b'\xb5\x62'
+NMEA_START = b'$'
+
+# Anything longer is treated as a false sync and skipped
+MAX_UBX_PAYLOAD = 8192
+MAX_NMEA_LENGTH = 100
+
+def build_ubx_frame(msg_class, msg_id, payload):
+    """Wraps a payload in a complete UBX frame (sync, header, checksum)."""
+    body = bytes([msg_class, msg_id]) + len(payload).to_bytes(2, 'little') + payload
+    return UBX_SYNC + body + ubx_checksum(body)
+
+class FrameSplitter:
+    """Cuts a raw byte stream from the receiver into whole UBX and NMEA frames.
+
+    Bytes are fed in whatever chunks the port delivers; complete frames are
+    returned and a partial frame at the end is kept for the next feed.
+    Bytes between frames (noise, unsupported protocols) are counted in
+    `discarded`. UBX checksums are verified so a false sync in noise cannot
+    swallow the frames behind it; NMEA frames are only delimited.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.discarded = 0
+        self.bad_checksums = 0
+
+    def feed(self, data):
+        """Adds received bytes and returns the list of complete frames."""
+        buffer = self._buffer
+        buffer += data
+        frames = []
+        position = 0
+        end = len(buffer)
+        while position < end:
+            ubx = buffer.find(UBX_SYNC, position)
+            nmea = buffer.find(NMEA_START, position)
+            if ubx < 0 and nmea < 0:
+                # Keep a trailing 0xB5 that may be the first half of a sync
+                keep = 1 if buffer[-1] == UBX_SYNC[0] else 0
+                self.discarded += end - position - keep
+                position = end - keep
+                break
+            start = ubx if nmea < 0 or (0 <= ubx < nmea) else nmea
+            self.discarded += start - position
+            position = start
+            if start == ubx:
+                if end - start < 6:
+                    break
+                length = buffer[start + 4] | (buffer[start + 5] << 8)
+                if length > MAX_UBX_PAYLOAD:
+                    self.discarded += 1
+                    position = start + 1
+                    continue
+                if end - start < length + 8:
+                    break
+                frame = bytes(buffer[start:start + length + 8])
+                if ubx_checksum(frame[2:-2]) != frame[-2:]:
+                    # False sync inside noise: resynchronise one byte further on
+                    self.bad_checksums += 1
+                    self.discarded += 1
+                    position = start + 1
+                    continue
+                frames.append(frame)
+                position = start + length + 8
+            else:
+                line_end = buffer.find(b'\n', start, start + MAX_NMEA_LENGTH)
+                if line_end < 0:
+                    if end - start < MAX_NMEA_LENGTH:
+                        break
+                    self.discarded += 1
+                    position = start + 1
+                    continue
+                frames.append(bytes(buffer[start:line_end + 1]))
+                position = line_end + 1
+        del buffer[:position]
+        return frames
+
+def find_frame_start(data, position=0):
+    """Offset of the first whole, valid UBX or NMEA frame in data at or after position, or -1.
+
+    Valid means a matching UBX checksum or NMEA *hh checksum, so a sync
+    pattern inside another frame's payload is not taken for a frame start.
+    Used to cut a raw stream into pieces that can be parsed separately.
+    """
+    end = len(data)
+    while position < end:
+        ubx = data.find(UBX_SYNC, position)
+        nmea = data.find(NMEA_START, position)
+        if ubx < 0 and nmea < 0:
+            return -1
+        start = ubx if nmea < 0 or (0 <= ubx < nmea) else nmea
+        if start == ubx:
+            if end - start >= 6:
+                length = data[start + 4] | (data[start + 5] << 8)
+                frame_end = start + length + 8
+                if (length <= MAX_UBX_PAYLOAD and frame_end <= end
+                        and ubx_checksum(data[start + 2:frame_end - 2]) == data[frame_end - 2:frame_end]):
+                    return start
+        else:
+            line_end = data.find(b'\n', start, start + MAX_NMEA_LENGTH)
+            if line_end > 0 and nmea_checksum_ok(data[start:line_end + 1].rstrip()):
+                return start
+        position = start + 1
+    return -1
+
+def parse_frame(frame, validate=True):
+    """Parses one frame: the hot UBX and NMEA messages on the fast paths, anything else with pyubx2/pynmeagps.
+
+    The fast paths are Common/ubxFastDecode.py and Common/nmeaFast.py.
+    Frames from a FrameSplitter have had their UBX checksum checked already
+    and can skip the second check with validate=False; NMEA checksums are
+    always checked.
+    """
+    if frame.startswith(UBX_SYNC):
+        return decode_ubx(frame, validate) or UBXReader.parse(frame)
+    return parse_nmea(frame) or NMEAReader.parse(frame)
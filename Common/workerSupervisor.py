@@ -0,0 +1,310 @@
+import os
+import sys
+import signal
+import logging
+import argparse
+import threading
+import itertools
+import subprocess
+from time import monotonic, sleep
+from multiprocessing import Pipe
+from multiprocessing.connection import Listener, Client
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds the worker gets to import the job modules and connect back
+START_TIMEOUT = 60
+# Seconds between checks that the worker is still alive while waiting for it
+START_POLL = 0.2
+
+class JobHandle:
+    """A record or replay job running in the warm worker.
+
+    Offers the poll()/terminate()/wait() subset of subprocess.Popen so the
+    keypad monitoring code does not care where the job runs.
+    """
+
+    def __init__(self, supervisor, job_id, kind, combination, requested_at):
+        self.supervisor = supervisor
+        self.job_id = job_id
+        self.kind = kind
+        self.combination = combination
+        self.requested_at = requested_at
+        self.pid = None
+        self.returncode = None
+        self.first_row_latency = None
+        self._done = threading.Event()
+
+    def poll(self):
+        return self.returncode
+
+    def terminate(self):
+        if self.returncode is None:
+            self.supervisor._send(('stop', self.job_id))
+
+    def wait(self, timeout=None):
+        self._done.wait(timeout)
+        return self.returncode
+
+class WorkerSupervisor:
+    """Keeps one worker process with the record and replay code already imported.
+
+    The worker is a separate interpreter started once; jobs are forked from
+    it on request over a local socket, so a keypress no longer pays for
+    interpreter start-up, imports and opening the serial port. The worker's
+    stdout and stderr are read line by line on a thread and logged as they
+    arrive, so a chatty job can never fill the pipe and stall. Every job
+    has an id that the worker puts in its replies, so a late reply about
+    an earlier job is never applied to the current one.
+    """
+
+    def __init__(self):
+        self.worker = None
+        self.job = None
+        self._conn = None
+        self._send_lock = threading.Lock()
+        self._job_ids = itertools.count(1)
+
+    def start(self):
+        """Starts the worker and waits for it to connect back; raises RuntimeError if it does not."""
+        authkey = os.urandom(16)
+        listener = Listener(family='AF_UNIX', authkey=authkey)
+        env = dict(os.environ, REMOW_WORKER_KEY=authkey.hex())
+        started = monotonic()
+        self.worker = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--worker', listener.address],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1, env=env)
+        threading.Thread(target=self._pump_output, daemon=True).start()
+        # Listener.accept() has no timeout, so accept on a thread and wait for that here
+        accepted, accept_done = [], threading.Event()
+        threading.Thread(target=_accept, args=(listener, accepted, accept_done), daemon=True).start()
+        try:
+            self._wait_for_worker(started, lambda: accept_done.wait(START_POLL))
+            if isinstance(accepted[0], Exception):
+                raise RuntimeError(f"worker could not connect: {accepted[0]}")
+            self._conn = accepted[0]
+            # The worker says hello once its imports are done
+            self._wait_for_worker(started, lambda: self._conn.poll(START_POLL))
+            message = self._conn.recv()
+        except (RuntimeError, EOFError, OSError) as e:
+            # An import error or a crash: the traceback is in the [worker] lines logged above
+            if self.worker.poll() is None:
+                self.worker.kill()
+            raise RuntimeError(f"Worker failed to start: {e}") from e
+        finally:
+            listener.close()
+        logging.info(f"Worker {self.worker.pid} ready in {monotonic() - started:.2f} s: {message[1]}")
+        threading.Thread(target=self._pump_events, daemon=True).start()
+
+    def _wait_for_worker(self, started, ready):
+        """Polls ready() until it is true, the worker exits or START_TIMEOUT runs out."""
+        while not ready():
+            code = self.worker.poll()
+            if code is not None:
+                raise RuntimeError(f"worker exited with code {code}")
+            if monotonic() - started > START_TIMEOUT:
+                raise RuntimeError(f"no answer after {START_TIMEOUT} s")
+
+    def close(self):
+        if self.worker and self.worker.poll() is None:
+            self._send(('quit',))
+            try:
+                self.worker.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.worker.kill()
+
+    def _send(self, message):
+        with self._send_lock:
+            self._conn.send(message)
+
+    def _pump_output(self):
+        """Streams the worker's (and its jobs') output into our log as it arrives."""
+        for line in self.worker.stdout:
+            logging.info(f"[worker] {line.rstrip()}")
+
+    def _pump_events(self):
+        """Receives job state changes from the worker."""
+        while True:
+            try:
+                message = self._conn.recv()
+            except (EOFError, OSError):
+                logging.error("Worker connection lost")
+                if self.job and self.job.returncode is None:
+                    self.job.returncode = -1
+                    self.job._done.set()
+                return
+            event, job_id, value = message
+            job = self.job
+            if job is None or job_id != job.job_id:
+                logging.debug(f"Ignoring {event} for earlier job {job_id}")
+                continue
+            if event == 'started':
+                job.pid = value
+            elif event == 'first_row':
+                job.first_row_latency = value - job.requested_at
+                logging.info(f"Keypress-to-first-row latency for {job.kind} {job.combination}: "
+                             f"{job.first_row_latency * 1000:.0f} ms")
+            elif event == 'exited':
+                job.returncode = value
+                job._done.set()
+                logging.info(f"{job.kind} job {job.combination} exited with code {job.returncode}")
+            elif event == 'error':
+                logging.error(f"Worker could not start {job.kind} job: {value}")
+                job.returncode = -1
+                job._done.set()
+
+    def start_job(self, kind, combination, requested_at=None, **options):
+        """Starts a 'record' or 'replay' job; requested_at is the keypress time (monotonic)."""
+        self.job = JobHandle(self, next(self._job_ids), kind, combination, requested_at or monotonic())
+        if self.worker is None or self.worker.poll() is not None:
+            logging.warning("Worker not running, starting a new one")
+            try:
+                self.start()
+            except RuntimeError as e:
+                # Hand back a job that has already failed so the caller's wait() returns
+                logging.error(f"Could not start {kind} job: {e}")
+                self.job.returncode = -1
+                self.job._done.set()
+                return self.job
+        self._send(('start', self.job.job_id, kind, combination, options))
+        return self.job
+
+def _accept(listener, accepted, done):
+    """Accepts the worker's connection (or the error) into accepted, then sets done.
+
+    If the worker never connects this thread stays blocked in accept(); it is a daemon.
+    """
+    try:
+        accepted.append(listener.accept())
+    except Exception as e:
+        # OSError, or AuthenticationError from a client without the key
+        accepted.append(e)
+    finally:
+        done.set()
+
+# --- Worker side -----------------------------------------------------------
+
+def _import_jobs():
+    """Imports the job modules (and with them pyubx2, pyserial, gpiozero) once."""
+    sys.path.insert(0, ROOT_DIR)
+    from Record import parseAndRecordData
+    from Repeat import readRecordedRun
+    return parseAndRecordData, readRecordedRun
+
+def _run_job_child(module, kind, combination, options, stream, first_row_conn):
+    """Runs one job in the forked child and returns its exit code; a replay with no run to replay fails."""
+    from Common.fastLogging import stop_logging
+    signal.signal(signal.SIGTERM, module.handle_sigterm)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    # Mirror the job's log to stdout so the supervisor sees it live
+    module.setup_logging(force=True, console_format='%(levelname)s - %(message)s')
+
+    def on_first_row():
+        first_row_conn.send(monotonic())
+
+    try:
+        if kind == 'record':
+            module.run_recording(combination, stream=stream, on_first_row=on_first_row, **options)
+            return 0
+        # As on the command line: no run found is a failed job, a replay stopped early is not
+        if module.run_replay(combination, on_first_row=on_first_row, **options) is None:
+            return module.NO_RUN_EXIT
+        return 0
+    finally:
+        # The child leaves with os._exit, which skips atexit: write out the queued records now
+        stop_logging()
+
+def _watch_job(conn, send_lock, job_id, pid, first_row_conn, done):
+    """Forwards the job's first-row time and exit status to the supervisor."""
+    def send(event, value):
+        with send_lock:
+            conn.send((event, job_id, value))
+
+    first_row_open = True
+    try:
+        while True:
+            if not first_row_open:
+                sleep(0.05)
+            elif first_row_conn.poll(0.05):
+                try:
+                    send('first_row', first_row_conn.recv())
+                except EOFError:
+                    # The job exited or closed its end; only the exit status is left
+                    first_row_open = False
+            finished, status = os.waitpid(pid, os.WNOHANG)
+            if finished:
+                done.set()
+                send('exited', os.waitstatus_to_exitcode(status))
+                return
+    finally:
+        first_row_conn.close()
+
+def worker_main(address):
+    """Entry point of the warm worker process."""
+    recorder, replayer = _import_jobs()
+    conn = Client(address, authkey=bytes.fromhex(os.environ['REMOW_WORKER_KEY']))
+    send_lock = threading.Lock()
+
+    # Keep the receiver's port open between jobs; recording falls back to opening it itself
+    try:
+        stream = recorder.open_serial()
+    except Exception as e:
+        print(f"Serial port not pre-opened: {e}", flush=True)
+        stream = None
+    conn.send(('ready', f"serial {'open' if stream else 'closed'}"))
+
+    job_id = job_pid = None
+    job_done = threading.Event()
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message[0] == 'start':
+            _, new_job_id, kind, combination, options = message
+            if job_pid and not job_done.is_set():
+                with send_lock:
+                    conn.send(('error', new_job_id, f"job {job_id} is still running"))
+                continue
+            job_id = new_job_id
+            module = recorder if kind == 'record' else replayer
+            first_row_recv, first_row_send = Pipe(duplex=False)
+            job_done = threading.Event()
+            sys.stdout.flush()
+            job_pid = os.fork()
+            if job_pid == 0:
+                code = 1
+                try:
+                    conn.close()
+                    code = _run_job_child(module, kind, combination, options, stream, first_row_send)
+                except BaseException as e:
+                    print(f"{kind} job failed: {e}", flush=True)
+                finally:
+                    sys.stdout.flush()
+                    os._exit(code)
+            first_row_send.close()
+            with send_lock:
+                conn.send(('started', job_id, job_pid))
+            threading.Thread(target=_watch_job, args=(conn, send_lock, job_id, job_pid, first_row_recv, job_done),
+                             daemon=True).start()
+        elif message[0] == 'stop' and message[1] == job_id and not job_done.is_set():
+            try:
+                os.kill(job_pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        elif message[0] == 'quit':
+            break
+
+    if job_pid and not job_done.is_set():
+        try:
+            os.kill(job_pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Warm worker for record and replay jobs (started by selectMode).")
+    parser.add_argument('--worker', required=True, help="address of the supervisor's socket")
+    args = parser.parse_args()
+    # Line-buffered so job output reaches the supervisor as it is written
+    sys.stdout.reconfigure(line_buffering=True)
+    worker_main(args.worker)
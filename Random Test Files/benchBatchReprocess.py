@@ -0,0 +1,114 @@
+import os
+import sys
+import csv
+import argparse
+import tempfile
+from time import perf_counter
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyubx2 import UBXReader
+from pynmeagps import NMEAReader
+from Common.gnssSimulator import GnssSimulator, FACTORY_MESSAGES
+from Common.rawCapture import RawCaptureWriter, iter_capture
+from Common.epochFusion import EpochFuser
+from Common.ubxFraming import FrameSplitter, UBX_SYNC
+from Common.batchReprocess import reprocess, summary_table
+
+START = 1760000000
+RATE = 10
+# Where the live recorder's monotonic clock stood against unix time while capturing
+MONOTONIC_OFFSET = START - 5000
+
+def write_capture(path, epochs, stream_path=None):
+    """A recorder capture (and optionally the same bytes as a plain stream) of simulated epochs with the factory NMEA set."""
+    sim = GnssSimulator(RATE, messages=('NAV-RELPOSNED',) + FACTORY_MESSAGES)
+    writer = RawCaptureWriter(path)
+    stream = open(stream_path, 'wb') if stream_path else None
+    splitter = FrameSplitter()
+    try:
+        for epoch in range(epochs):
+            elapsed = epoch / RATE
+            for _, data in sim.epoch_messages(START + elapsed, elapsed):
+                # GSA and GSV come as blocks of sentences; the recorder captures them one by one
+                for frame in splitter.feed(data):
+                    writer.write(frame, START + elapsed + 0.05 - MONOTONIC_OFFSET, START + elapsed + 0.05)
+                if stream:
+                    stream.write(data)
+    finally:
+        writer.close()
+        if stream:
+            stream.close()
+        sim.close()
+
+def pyubx2_loop(path):
+    """The old way: one process, every frame parsed by pyubx2/pynmeagps and fused; returns the rows."""
+    fuser = EpochFuser.for_mode('fused', log_fields=False)
+    rows = []
+    for recv_time, _, frame, _ in iter_capture(path):
+        parsed = UBXReader.parse(frame) if frame.startswith(UBX_SYNC) else NMEAReader.parse(frame)
+        row = fuser.update(parsed, recv_time)
+        if row:
+            rows.append(row)
+    return rows
+
+def write_live_run(path, rows):
+    """The run the recorder would have written live from a capture, with every tenth epoch lost as under load."""
+    fields = EpochFuser.for_mode('fused').fields
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(fields)
+        for number, row in enumerate(rows):
+            if number % 10 != 9:
+                writer.writerow(row)
+
+def read_rows(path):
+    with open(path) as csvfile:
+        return [line.rstrip('\n').split(',') for line in csvfile][1:]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Batch reprocessing against a single-threaded pyubx2 loop.")
+    parser.add_argument('--epochs', type=int, default=12000, help="10 Hz epochs per capture (default: 12000)")
+    parser.add_argument('--files', type=int, default=2, help="captures in the batch (default: 2)")
+    parser.add_argument('--split-mb', type=float, default=4, help="piece size for the batch (default: 4)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as in_dir:
+        print(f"Simulating {args.files} captures of {args.epochs} epochs...")
+        paths = []
+        for number in range(args.files):
+            path = os.path.join(in_dir, f'{number:02d}_20251009-12000{number}_GPSRaw.ubx')
+            write_capture(path, args.epochs, os.path.join(in_dir, f'stream{number:02d}.ubx') if number == 0 else None)
+            paths.append(path)
+        total = sum(os.path.getsize(path) for path in paths) / 1e6
+
+        started = perf_counter()
+        reference = [pyubx2_loop(path) for path in paths]
+        elapsed = perf_counter() - started
+        print(f"pyubx2 loop, one process: {total:.1f} MB in {elapsed:.2f} s, {total / elapsed:.2f} MB/s")
+
+        # The recorded run of the first capture goes in too: it must be left to its capture
+        live_run = paths[0].replace('_GPSRaw.ubx', '_GPSData.csv')
+        write_live_run(live_run, reference[0])
+        inputs = paths + [os.path.join(in_dir, 'stream00.ubx'), live_run]
+        for workers in sorted({1, os.cpu_count()}):
+            out_dir = os.path.join(in_dir, f'out{workers}')
+            started = perf_counter()
+            summaries = reprocess(inputs, out_dir, workers=workers, split_bytes=int(args.split_mb * 1024 * 1024))
+            elapsed = perf_counter() - started
+            print(f"\nbatch, {workers} worker(s):")
+            print('\n'.join(summary_table(summaries, elapsed)))
+            # Same fused values as the pyubx2 loop, whatever the pieces (timestamp and recv_time aside);
+            # the plain stream holds the bytes of the first capture
+            outputs = [os.path.basename(path).replace('_GPSRaw.ubx', '_GPSData.csv') for path in paths]
+            expected = list(zip(outputs + ['stream00_GPSData.csv'], reference + reference[:1]))
+            same = all([row[1:-1] for row in read_rows(os.path.join(out_dir, name))]
+                       == [[str(value) for value in row[1:-1]] for row in rows] for name, rows in expected)
+            print(f"rows {'match' if same else 'DIFFER FROM'} the pyubx2 loop")
+            skipped = [entry['output'] for entry in summaries if entry['file'] == os.path.basename(live_run)]
+            recv_times = [float(row[-1]) for row in read_rows(os.path.join(out_dir, outputs[0]))]
+            on_clock = len(recv_times) == len(reference[0]) and all(
+                abs(recv_time - row[-1]) < 1e-5 for recv_time, row in zip(recv_times, reference[0]))
+            empty = all(row[-1] == '' for row in read_rows(os.path.join(out_dir, 'stream00_GPSData.csv')))
+            print(f"recorded run {skipped[0]}; recv_time {'on' if on_clock else 'NOT on'} the recorder's monotonic "
+                  f"clock for every epoch, {'empty' if empty else 'NOT EMPTY'} for the raw stream")
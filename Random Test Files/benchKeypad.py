@@ -0,0 +1,46 @@
+import os
+import sys
+import statistics
+from time import sleep, monotonic
+from gpiozero import Device
+from gpiozero.pins.mock import MockFactory
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.keypad import MatrixKeypad, COLUMN_PINS, KEYMAP
+
+def bench_keypad(presses=200, debounce_time=0.05):
+    """Measures press-to-event latency of MatrixKeypad on gpiozero's mock pins.
+
+    Mock pins are not wired as a matrix, so a pressed column reads high on
+    whichever row is scanned first; the presses therefore land on row 1.
+    """
+    Device.pin_factory = MockFactory()
+    keypad = MatrixKeypad(debounce_time=debounce_time, bounce_time=None)
+    latencies = []
+    try:
+        for press in range(presses):
+            column = press % len(COLUMN_PINS)
+            pin = Device.pin_factory.pin(COLUMN_PINS[column])
+            started = monotonic()
+            pin.drive_high()
+            event = keypad.get_event(timeout=1)
+            received = monotonic()
+            pin.drive_low()
+            if event is None or event[0] != KEYMAP[0][column]:
+                print(f"Press {press}: expected {KEYMAP[0][column]}, got {event}")
+                continue
+            latencies.append((received - started) * 1000)
+            # Wait out the per-key debounce before the same key comes round again
+            sleep(debounce_time / len(COLUMN_PINS) + 0.001)
+    finally:
+        keypad.close()
+
+    latencies.sort()
+    print(f"{len(latencies)}/{presses} presses delivered, {keypad.dropped} dropped")
+    print(f"press-to-event latency: mean {statistics.mean(latencies):.3f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)]:.3f} ms, max {latencies[-1]:.3f} ms")
+    print("old polling loop: up to 100 ms per press (sleep(0.1) between scans)")
+
+if __name__ == '__main__':
+    bench_keypad()
@@ -0,0 +1,85 @@
+import os
+import sys
+import glob
+import logging
+import argparse
+import tempfile
+import subprocess
+from time import perf_counter
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.fastLogging import setup_logging, stop_logging, Sampler
+
+# A GNRMC and a NAV-RELPOSNED field line per epoch, as the recorder logs them
+FIX = (52.0123456789, 5.0123456789, 3.6)
+REL = (1.23, -0.45, 0.02, 123.456)
+
+def old_style(epochs, log_file):
+    """Before: basicConfig file handler, an f-string per message, written in the calling thread."""
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
+                        filename=log_file, filemode='w')
+    latitude, longitude, speed = FIX
+    rel_north, rel_east, rel_down, heading = REL
+    for _ in range(epochs):
+        logging.info(f"latitude {latitude}, longitude {longitude}, speed {speed} km/h")
+        logging.info(f"latest_rel_north {rel_north}, latest_rel_east {rel_east}, latest_rel_down {rel_down} latest_heading {heading}")
+
+def queued(epochs, log_file, per_second=0):
+    """Background writer and lazy arguments; per_second also samples in the filter."""
+    setup_logging(log_file, per_second=per_second)
+    for _ in range(epochs):
+        logging.info("latitude %s, longitude %s, speed %s km/h", *FIX)
+        logging.info("latest_rel_north %s, latest_rel_east %s, latest_rel_down %s latest_heading %s", *REL)
+
+def sampled(epochs, log_file):
+    """What epochFusion does now: ask a Sampler before building anything."""
+    setup_logging(log_file)
+    field_log = Sampler()
+    for _ in range(epochs):
+        if field_log.allow('GNRMC'):
+            logging.info("latitude %s, longitude %s, speed %s km/h", *FIX)
+        if field_log.allow('NAV-RELPOSNED'):
+            logging.info("latest_rel_north %s, latest_rel_east %s, latest_rel_down %s latest_heading %s", *REL)
+
+VARIANTS = {
+    'old': ("basicConfig + f-strings (before)", old_style),
+    'queue': ("queue + lazy args, every message", queued),
+    'filter': ("queue + sampling filter", lambda epochs, log_file: queued(epochs, log_file, per_second=2)),
+    'sampler': ("queue + Sampler before the call (now)", sampled),
+}
+
+def run_variant(name, epochs, log_file):
+    """Times one variant in this process; prints caller and total (drained) microseconds per message."""
+    started = perf_counter()
+    VARIANTS[name][1](epochs, log_file)
+    caller = perf_counter() - started
+    stop_logging()
+    logging.shutdown()
+    total = perf_counter() - started
+    # Rotated files included
+    size = sum(os.path.getsize(path) for path in glob.glob(f'{log_file}*'))
+    print(f"{caller / epochs / 2 * 1e6:.3f} {total / epochs / 2 * 1e6:.3f} {size}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Per-message cost of the recorder's field logging, before and now.")
+    parser.add_argument('--epochs', type=int, default=50000, help="epochs of two messages each (default: 50000)")
+    parser.add_argument('--variant', choices=tuple(VARIANTS), help=argparse.SUPPRESS)
+    parser.add_argument('--log-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.epochs, args.log_file)
+        sys.exit(0)
+
+    # Each variant in a fresh interpreter, as logging configuration is process-wide
+    with tempfile.TemporaryDirectory() as temp_dir:
+        baseline = None
+        for name, (label, _) in VARIANTS.items():
+            log_file = os.path.join(temp_dir, f'{name}.log')
+            output = subprocess.run([sys.executable, __file__, '--variant', name, '--epochs', str(args.epochs),
+                                     '--log-file', log_file], capture_output=True, text=True, check=True).stdout
+            caller, total, size = output.split()
+            baseline = baseline or float(caller)
+            print(f"{label:>40}: {float(caller):7.3f} us/message in the caller ({baseline / float(caller):6.1f}x), "
+                  f"{float(total):7.3f} us with the writer drained, {int(size) / 1024:8.1f} KiB of log")
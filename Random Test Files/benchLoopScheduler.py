@@ -0,0 +1,52 @@
+import os
+import sys
+import argparse
+import multiprocessing
+from time import sleep, perf_counter
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.loopScheduler import LoopScheduler, CATCH_UP, SKIP
+
+def burn(stop):
+    """Keeps one core busy until stop is set."""
+    while not stop.is_set():
+        sum(range(100000))
+
+def naive_loop(rate, seconds, work):
+    """The old pacing: sleep whatever is left of the period after the body; returns achieved Hz."""
+    period = 1 / rate
+    started = perf_counter()
+    ticks = 0
+    while perf_counter() - started < seconds:
+        tick_start = perf_counter()
+        sleep(work)
+        ticks += 1
+        sleep(max(0, period - (perf_counter() - tick_start)))
+    return ticks / (perf_counter() - started)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Shows whether a fixed-rate loop holds its rate under CPU load.")
+    parser.add_argument('--rate', type=float, default=20, help="loop rate in Hz (default: 20)")
+    parser.add_argument('--seconds', type=float, default=10, help="run time per loop (default: 10)")
+    parser.add_argument('--load', type=int, default=os.cpu_count(), help="busy processes running alongside (default: one per core)")
+    parser.add_argument('--work', type=float, default=0.01, help="seconds of work in each tick (default: 0.01)")
+    parser.add_argument('--policy', choices=(SKIP, CATCH_UP), default=SKIP, help="what to do with missed deadlines")
+    args = parser.parse_args()
+
+    stop = multiprocessing.Event()
+    burners = [multiprocessing.Process(target=burn, args=(stop,), daemon=True) for _ in range(args.load)]
+    for burner in burners:
+        burner.start()
+    try:
+        print(f"{args.load} busy processes, {args.work * 1000:g} ms of work per tick")
+        print(f"sleep-the-remainder loop: {naive_loop(args.rate, args.seconds, args.work):.2f} Hz of {args.rate:g} Hz")
+        loop = LoopScheduler(args.rate, policy=args.policy, name='LoopScheduler')
+        while loop.start is None or loop.last_tick - loop.start < args.seconds:
+            loop.wait()
+            sleep(args.work)
+        print('\n'.join(loop.report()))
+    finally:
+        stop.set()
+        for burner in burners:
+            burner.join()
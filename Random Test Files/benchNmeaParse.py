@@ -0,0 +1,94 @@
+import os
+import sys
+import glob
+import math
+import argparse
+from time import time, perf_counter
+from importlib.util import find_spec
+from pynmeagps import NMEAReader
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.nmeaFast import parse_nmea
+from Common.gnssSimulator import GnssSimulator
+from Common.rawCapture import iter_capture
+from Common.recording import RECORD_DATA_DIR
+
+# Fields compared with pynmeagps
+FIELDS = ('time', 'date', 'lat', 'lon', 'spd', 'quality', 'numSV', 'HDOP', 'alt')
+
+def synthetic_sentences(count=2000):
+    """GNRMC and GNGGA sentences from the simulated receiver, moving along its track."""
+    simulator = GnssSimulator(10, messages=('GNRMC', 'GNGGA'))
+    try:
+        started = time()
+        return [raw for epoch in range(count // 2)
+                for _, raw in simulator.epoch_messages(started + epoch / 10, epoch / 10)]
+    finally:
+        simulator.close()
+
+def capture_sentences(paths):
+    """Every GGA and RMC sentence from raw captures (see Common/rawCapture.py)."""
+    return [raw for path in paths for _, _, raw, _ in iter_capture(path) if raw[3:6] in (b'GGA', b'RMC')]
+
+def check_equal(sentences):
+    """Compares the fast parser's fields with pynmeagps; returns the number of mismatches."""
+    mismatches = 0
+    for sentence in sentences:
+        fast = parse_nmea(sentence)
+        slow = NMEAReader.parse(sentence)
+        for field in FIELDS:
+            if field not in fast._fields:
+                continue
+            mine, theirs = getattr(fast, field), getattr(slow, field)
+            same = mine == theirs if field in ('time', 'date') or '' in (mine, theirs) else \
+                math.isclose(mine, theirs, abs_tol=1e-9)
+            if not same:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"  {fast.identity}.{field}: fast {mine!r} pynmeagps {theirs!r}")
+    return mismatches
+
+def timed(function, items, repeat):
+    """Best of `repeat` passes over the items, in microseconds per item."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = perf_counter()
+        for item in items:
+            function(item)
+        best = min(best, perf_counter() - started)
+    return best / len(items) * 1e6
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Microbenchmark of the bytes NMEA parser against pynmeagps and pynmea2.")
+    parser.add_argument('captures', nargs='*', help="raw captures (*_GPSRaw.ubx); default: all in Record/Data, "
+                                                    "or simulated sentences if they hold no GGA/RMC")
+    parser.add_argument('--repeat', type=int, default=5, help="passes per measurement, best is kept (default: 5)")
+    args = parser.parse_args()
+
+    paths = args.captures or sorted(glob.glob(os.path.join(RECORD_DATA_DIR, '*_GPSRaw.ubx')))
+    sentences = capture_sentences(paths) if paths else []
+    source = f"{len(paths)} captures" if sentences else "the simulator"
+    if not sentences:
+        sentences = synthetic_sentences()
+    print(f"{len(sentences)} GGA/RMC sentences from {source}")
+    print(f"fields differing from pynmeagps: {check_equal(sentences)}")
+
+    # What each caller did per sentence before the bytes parser
+    contenders = [('nmeaFast', parse_nmea), ('pynmeagps (pyubx2 NMEA path)', NMEAReader.parse)]
+    if find_spec('pynmea2'):
+        import pynmea2
+        contenders.append(('decode + pynmea2 (old frequencyTest)',
+                           lambda line: pynmea2.parse(line.decode('ascii', errors='replace').strip())))
+    else:
+        print("pynmea2 not installed, skipping it")
+
+    for identity in ('RMC', 'GGA'):
+        group = [sentence for sentence in sentences if sentence[3:6] == identity.encode()]
+        if not group:
+            continue
+        fast = None
+        for name, function in contenders:
+            cost = timed(function, group, args.repeat)
+            fast = fast or cost
+            print(f"{identity}: {name:>38} {cost:7.2f} us/sentence ({cost / fast:5.1f}x)")
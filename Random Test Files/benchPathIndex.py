@@ -0,0 +1,56 @@
+import os
+import sys
+import tempfile
+import argparse
+from time import perf_counter
+import numpy as np
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.trajectory import Trajectory
+from Common.pathIndex import PathIndex, simplify
+from benchTrajectory import synthetic_track
+
+def timed(function, items):
+    """Microseconds per call over the items."""
+    started = perf_counter()
+    for item in items:
+        function(*item)
+    return (perf_counter() - started) / len(items) * 1e6
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Times path index queries against a scan of every segment.")
+    parser.add_argument('--fixes', type=int, default=300000, help="fixes in the synthetic run (default: 300000)")
+    parser.add_argument('--queries', type=int, default=5000, help="query points near the path (default: 5000)")
+    parser.add_argument('--tolerance', type=float, default=0.05, help="simplification tolerance in m (default: 0.05)")
+    args = parser.parse_args()
+
+    lat, lon, time, _ = synthetic_track(args.fixes)
+    # Some wobble so simplification has something to keep, as a real run would
+    lat = lat + np.sin(time / 3) * 3e-6
+    started = perf_counter()
+    trajectory = Trajectory(lat, lon, time)
+    good = ~trajectory.outlier
+    keep = simplify(trajectory.east[good], trajectory.north[good], args.tolerance)
+    index = PathIndex(trajectory.east[good][keep], trajectory.north[good][keep], trajectory.origin,
+                      tolerance=args.tolerance)
+    print(f"build: {args.fixes} fixes -> {len(index)} segments, {index.columns}x{index.rows} cells "
+          f"in {(perf_counter() - started) * 1000:.0f} ms")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        path = os.path.join(temp_dir, 'bench.pathidx.npz')
+        index.save(path)
+        started = perf_counter()
+        index = PathIndex.load(path)
+        print(f"load from cache: {(perf_counter() - started) * 1000:.1f} ms, {os.path.getsize(path) / 1024:.0f} KiB")
+
+    rng = np.random.default_rng(2)
+    fixes = rng.choice(np.flatnonzero(good), args.queries)
+    points = list(zip((trajectory.east[fixes] + rng.normal(0, 0.3, args.queries)).tolist(),
+                      (trajectory.north[fixes] + rng.normal(0, 0.3, args.queries)).tolist()))
+    wrong = sum(abs(index.nearest(*point).distance - index._nearest_anywhere(*point).distance) > 1e-9
+                for point in points)
+    print(f"nearest distance differing from a full scan: {wrong} of {len(points)}")
+    print(f"nearest():        {timed(index.nearest, points):8.1f} us/query")
+    print(f"locate():         {timed(index.locate, list(zip(lat[fixes], lon[fixes]))):8.1f} us/query")
+    print(f"full scan:        {timed(index._nearest_anywhere, points[:500]):8.1f} us/query")
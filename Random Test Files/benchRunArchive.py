@@ -0,0 +1,95 @@
+import os
+import sys
+import csv
+import math
+import random
+import argparse
+import tempfile
+import filecmp
+from time import perf_counter, strftime, gmtime
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.runArchive import archive_csv, ArchivedRun, CODECS
+from Common.runCatalog import RunCatalog
+from Common.runCompactor import compact_old_runs
+from Common.epochFusion import FUSED_FIELDS, gps_itow
+from Repeat.readRecordedRun import RecordedRun, open_run
+
+START = 1760000000
+
+def write_run(path, seconds, rate=20):
+    """A fused CSV run of lawn-mower lanes with receiver-like noise, as the recorder writes it."""
+    rng = random.Random(1)
+    with open(path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(FUSED_FIELDS)
+        for row in range(int(seconds * rate)):
+            t = row / rate
+            along, lane = t % 40, t // 40
+            east = (40 - along if lane % 2 else along) + rng.gauss(0, 0.01)
+            north = lane * 0.5 + rng.gauss(0, 0.01)
+            heading = 270.0 if lane % 2 else 90.0
+            writer.writerow([strftime("%Y-%m-%d %H:%M:%S", gmtime(START + t)),
+                             round(52.0 + north / 111320, 10), round(5.0 + east / (111320 * math.cos(math.radians(52))), 10),
+                             round(3.6 + rng.gauss(0, 0.05), 6), round(1.0 + rng.gauss(0, 0.01), 2),
+                             round(0.5 + rng.gauss(0, 0.01), 2), round(-0.03 + rng.gauss(0, 0.01), 2),
+                             round(heading + rng.gauss(0, 0.5), 5), gps_itow(START + t),
+                             round(1000 + t + rng.random() * 0.002, 6)])
+
+def window_cost(run, start, seconds):
+    """Seconds to open a run and read `seconds` of it from `start` seconds in."""
+    started = perf_counter()
+    run = run()
+    first = run.row_for_time(start)
+    last = run.row_for_time(start + seconds)
+    count = sum(1 for _ in run.rows(first, last))
+    run.close()
+    return perf_counter() - started, count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Size and seek cost of chunked run archives against plain CSV runs.")
+    parser.add_argument('--minutes', type=float, default=120, help="length of the synthetic 20 Hz run (default: 120)")
+    parser.add_argument('--window', type=float, default=60, help="seconds read from the middle of the run (default: 60)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        csv_path = os.path.join(data_dir, '42_20251009-120000_GPSData.csv')
+        write_run(csv_path, args.minutes * 60)
+        csv_size = os.path.getsize(csv_path)
+        middle = args.minutes * 30
+        csv_cost, csv_rows = window_cost(lambda: RecordedRun(csv_path), middle, args.window)
+        print(f"CSV: {csv_size / 1e6:.1f} MB; {args.window:g} s from the middle in {csv_cost * 1000:.0f} ms "
+              f"({csv_rows} rows, opening indexes the whole file)")
+
+        reference = list(RecordedRun(csv_path).rows())
+        for codec in CODECS:
+            out_path = os.path.join(data_dir, f'{codec}.csvz')
+            started = perf_counter()
+            archive_csv(csv_path, out_path, codec=codec)
+            elapsed = perf_counter() - started
+            size = os.path.getsize(out_path)
+            cost, rows = window_cost(lambda: ArchivedRun(out_path), middle, args.window)
+            run = ArchivedRun(out_path)
+            same = list(run.rows()) == reference and rows == csv_rows
+            extracted = run.extract(os.path.join(data_dir, 'extracted.csv'))
+            run.close()
+            same = same and filecmp.cmp(extracted, csv_path, shallow=False)
+            print(f"{codec:>5}: {size / 1e6:.2f} MB ({csv_size / size:.1f}x smaller), archived in {elapsed:.1f} s; "
+                  f"{args.window:g} s from the middle in {cost * 1000:.0f} ms; "
+                  f"rows and extract {'identical' if same else 'DIFFERENT'}")
+
+        # The compactor: catalog entry moved to the archive, replay reads it
+        catalog = RunCatalog(data_dir)
+        catalog.add_csv(csv_path)
+        catalog.close()
+        os.utime(csv_path, (START, START))
+        archives = compact_old_runs(data_dir, older_than_days=7)
+        catalog = RunCatalog(data_dir)
+        latest = catalog.latest_run('42')
+        catalog.close()
+        run = open_run(latest)
+        replayed = sum(1 for _ in run.rows())
+        run.close()
+        print(f"compactor: {len(archives)} archived, CSV {'gone' if not os.path.exists(csv_path) else 'STILL THERE'}, "
+              f"catalog points at {os.path.basename(latest)}, replay read {replayed} of {len(reference)} rows")
@@ -0,0 +1,164 @@
+import os
+import sys
+import glob
+import signal
+import shutil
+import argparse
+import tempfile
+import multiprocessing
+from array import array
+from time import sleep, monotonic
+
+# Make the shared modules in Common/ importable when run as a script
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from Common.gnssSimulator import GnssSimulator
+from Record.parseAndRecordData import log_serial_data
+from Repeat.readRecordedRun import RecordedRun, replay
+
+# Seconds the consumer gets to open the port before the simulator starts, and to catch up after
+SETTLE_TIME = 1.0
+DRAIN_TIME = 1.5
+
+def _record_target(port, baud, data_dir, on_message):
+    # show_writing(True) is called once for every parsed message
+    log_serial_data('99', lambda writing: writing and on_message(), port=port, baud=baud, data_dir=data_dir)
+
+def _gngga_target(port, baud, data_dir, on_message):
+    import frequencyTest
+    frequencyTest.log_gngga(port, baud, data_dir, on_message)
+
+# target name: (function, messages it is timed against, messages the simulator sends)
+TARGETS = {
+    'record': (_record_target, None, ('NAV-RELPOSNED', 'GNRMC')),
+    'gngga': (_gngga_target, 'GNGGA', ('GNGGA',)),
+}
+
+def _consumer(target, port, baud, data_dir, conn):
+    """Runs a target in a child process and reports its message times and CPU use."""
+    def handle_sigterm(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    # The targets print every message; that cost is part of what is measured, the output is not
+    sys.stdout = open(os.devnull, 'w')
+    times = array('d')
+    started = monotonic()
+    cpu_started = os.times()
+    try:
+        TARGETS[target][0](port, baud, data_dir, lambda: times.append(monotonic()))
+    except KeyboardInterrupt:
+        pass
+    cpu = os.times()
+    cpu_seconds = (cpu.user - cpu_started.user) + (cpu.system - cpu_started.system)
+    conn.send((times.tobytes(), cpu_seconds, monotonic() - started))
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else float('nan')
+
+def bench_rate(target, rate, baud, duration, data_dir):
+    """Drives one target at one rate; returns a result dict."""
+    _, timed, messages = TARGETS[target]
+    ctx = multiprocessing.get_context('fork')
+    simulator = GnssSimulator(rate, baud, messages)
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    consumer = ctx.Process(target=_consumer, args=(target, simulator.port, baud, data_dir, child_conn))
+    consumer.start()
+    try:
+        sleep(SETTLE_TIME)
+        simulator.run(duration)
+        sleep(DRAIN_TIME)
+        consumer.terminate()
+        if not parent_conn.poll(10):
+            raise RuntimeError(f"{target} consumer did not report back")
+        times_bytes, cpu_seconds, wall = parent_conn.recv()
+    finally:
+        consumer.join(5)
+        simulator.close()
+
+    received = array('d')
+    received.frombytes(times_bytes)
+    if timed:
+        sent = list(simulator.sent[timed])
+    else:
+        sent = sorted(t for times in simulator.sent.values() for t in times)
+    # Messages are delivered in order, so the n-th one received is the n-th one sent
+    latencies = [(done - written) * 1000 for written, done in zip(sent, received)]
+    result = {
+        'target': target,
+        'rate': rate,
+        'sent': len(sent),
+        'received': len(received),
+        'dropped': simulator.dropped,
+        'late_epochs': simulator.late_epochs,
+        'p50': percentile(latencies, 0.5),
+        'p95': percentile(latencies, 0.95),
+        'max': max(latencies, default=float('nan')),
+        'cpu': cpu_seconds / wall * 100,
+    }
+    # Sustainable: nothing lost, nothing left behind and the receiver keeps pace with the epochs
+    result['ok'] = (result['dropped'] == 0 and result['late_epochs'] == 0 and result['received'] == result['sent']
+                    and result['p95'] < 1000 / rate)
+    return result
+
+def bench_replay(csv_path):
+    """Replays a recorded run flat out and at real time; returns (rows/s, lateness p50/p95/max in ms)."""
+    run = RecordedRun(csv_path)
+    try:
+        started = monotonic()
+        rows = replay(run, lambda *fix: None, speed=0)
+        flat_out = rows / (monotonic() - started)
+
+        lateness = []
+        schedule = {}
+        def on_fix(row_number, row_time, values):
+            if not schedule:
+                schedule['start'], schedule['first'] = monotonic(), row_time
+            lateness.append((monotonic() - schedule['start'] - (row_time - schedule['first'])) * 1000)
+        replay(run, on_fix, speed=1.0)
+    finally:
+        run.close()
+    return flat_out, percentile(lateness, 0.5), percentile(lateness, 0.95), max(lateness, default=float('nan'))
+
+def print_result(result):
+    print(f"{result['target']:>7} {result['rate']:>6g} Hz  {result['received']:>6}/{result['sent']:<6} "
+          f"dropped {result['dropped']:>4}  late {result['late_epochs']:>3}  "
+          f"latency p50 {result['p50']:7.2f} p95 {result['p95']:7.2f} max {result['max']:8.2f} ms  "
+          f"CPU {result['cpu']:5.1f}%  {'ok' if result['ok'] else 'FAIL'}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serial throughput benchmark against the simulated ZED-F9P.")
+    parser.add_argument('--targets', default='record,gngga,replay', help="comma-separated: record, gngga, replay")
+    parser.add_argument('--rates', default='1,5,10,20', help="navigation rates in Hz to try (default: 1,5,10,20)")
+    parser.add_argument('--baud', type=int, default=230400, help="simulated baud rate (default: 230400)")
+    parser.add_argument('--duration', type=float, default=10, help="seconds per rate (default: 10)")
+    args = parser.parse_args()
+
+    targets = args.targets.split(',')
+    rates = [float(rate) for rate in args.rates.split(',')]
+    data_dir = tempfile.mkdtemp(prefix='benchSerial_')
+    try:
+        for target in targets:
+            if target == 'replay':
+                continue
+            sustainable = None
+            keeping_up = True
+            for rate in sorted(rates):
+                result = bench_rate(target, rate, args.baud, args.duration, data_dir)
+                print_result(result)
+                keeping_up = keeping_up and result['ok']
+                if keeping_up:
+                    sustainable = rate
+            print(f"{target}: highest sustainable rate {sustainable if sustainable else 'none'} Hz at {args.baud} baud")
+
+        if 'replay' in targets:
+            runs = sorted(glob.glob(os.path.join(data_dir, '*_GPSData.csv')), key=os.path.getsize)
+            if runs:
+                flat_out, p50, p95, worst = bench_replay(runs[-1])
+                print(f" replay  {flat_out:,.0f} rows/s flat out; real time lateness "
+                      f"p50 {p50:.2f} p95 {p95:.2f} max {worst:.2f} ms")
+            else:
+                print("  replay skipped: needs a recorded run (include the record target)")
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
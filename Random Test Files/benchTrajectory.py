@@ -0,0 +1,72 @@
+import os
+import sys
+import math
+import argparse
+from time import perf_counter
+import numpy as np
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.trajectory import Trajectory
+
+# Somewhere in a field, mowing back and forth at 1 m/s, 20 fixes a second
+ORIGIN = (51.5, -0.12)
+METRES_PER_DEGREE = 111320.0
+
+def synthetic_track(count, rate=20, spikes=100):
+    """Lawn-mower lanes as lat/lon arrays with `spikes` 30 m position jumps mixed in."""
+    time = np.arange(count) / rate
+    along = time % 40
+    lane = time // 40
+    east = np.where(lane % 2, 40 - along, along)
+    north = lane * 0.5
+    rng = np.random.default_rng(1)
+    bad = rng.choice(np.arange(1, count - 1), spikes, replace=False)
+    east[bad] += 30
+    lat = ORIGIN[0] + north / METRES_PER_DEGREE
+    lon = ORIGIN[1] + east / (METRES_PER_DEGREE * math.cos(math.radians(ORIGIN[0])))
+    return lat, lon, time, np.sort(bad)
+
+def reference_enu(lat, lon):
+    """The same WGS84 to ENU conversion one fix at a time with the math module, to check the NumPy version."""
+    a, f = 6378137.0, 1 / 298.257223563
+    e2 = f * (2 - f)
+
+    def ecef(phi, lam):
+        phi, lam = math.radians(phi), math.radians(lam)
+        n = a / math.sqrt(1 - e2 * math.sin(phi) ** 2)
+        return n * math.cos(phi) * math.cos(lam), n * math.cos(phi) * math.sin(lam), n * (1 - e2) * math.sin(phi)
+
+    x0, y0, z0 = ecef(lat[0], lon[0])
+    phi0, lam0 = math.radians(lat[0]), math.radians(lon[0])
+    result = []
+    for phi, lam in zip(lat, lon):
+        x, y, z = ecef(phi, lam)
+        dx, dy, dz = x - x0, y - y0, z - z0
+        result.append((-math.sin(lam0) * dx + math.cos(lam0) * dy,
+                       -math.sin(phi0) * math.cos(lam0) * dx - math.sin(phi0) * math.sin(lam0) * dy + math.cos(phi0) * dz,
+                       math.cos(phi0) * math.cos(lam0) * dx + math.cos(phi0) * math.sin(lam0) * dy + math.sin(phi0) * dz))
+    return result
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Times the vectorized trajectory processing on a synthetic run.")
+    parser.add_argument('--fixes', type=int, default=300000, help="fixes in the synthetic run (default: 300000)")
+    parser.add_argument('--repeat', type=int, default=5, help="passes, best is kept (default: 5)")
+    args = parser.parse_args()
+
+    lat, lon, time, spikes = synthetic_track(args.fixes)
+    best = float('inf')
+    for _ in range(args.repeat):
+        started = perf_counter()
+        trajectory = Trajectory(lat, lon, time)
+        best = min(best, perf_counter() - started)
+    print(f"{args.fixes} fixes in {best * 1000:.1f} ms ({best / args.fixes * 1e9:.0f} ns/fix)")
+
+    found = np.flatnonzero(trajectory.outlier)
+    print(f"outliers: {len(found)} flagged, {len(spikes)} planted, {len(np.intersect1d(found, spikes))} caught")
+    sample = slice(0, 2000)
+    reference = np.array(reference_enu(lat[sample], lon[sample]))
+    error = np.abs(reference - np.column_stack((trajectory.east, trajectory.north, trajectory.up))[sample]).max()
+    print(f"max ENU difference against per-fix loop: {error:.2e} m")
+    for name, value in trajectory.summary().items():
+        print(f"{name:>14}: {value}")
@@ -0,0 +1,118 @@
+import os
+import sys
+import math
+import glob
+import random
+import argparse
+from time import perf_counter
+from pyubx2 import UBXReader
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.ubxFastDecode import decode_ubx, ubx_checksum, FAST_DECODERS, NAV_RELPOSNED, NAV_PVT, NAV_HPPOSLLH
+from Common.ubxFraming import build_ubx_frame, UBX_SYNC
+from Common.rawCapture import iter_capture
+from Common.recording import RECORD_DATA_DIR
+
+def _loop_checksum(data):
+    # The per-byte loop the scripts used before Common/ubxFastDecode.py
+    ck_a = 0
+    ck_b = 0
+    for byte in data:
+        ck_a = (ck_a + byte) & 0xFF
+        ck_b = (ck_b + ck_a) & 0xFF
+    return bytes([ck_a, ck_b])
+
+def synthetic_frames(count=3000):
+    """Random but well-formed NAV-RELPOSNED, NAV-PVT and NAV-HPPOSLLH frames."""
+    rng = random.Random(1)
+    def signed(bits):
+        return rng.randint(-(1 << (bits - 1)), (1 << (bits - 1)) - 1)
+    def unsigned(bits):
+        return rng.randint(0, (1 << bits) - 1)
+    frames = []
+    for n in range(count):
+        kind = n % 3
+        if kind == 0:
+            payload = NAV_RELPOSNED.pack(1, unsigned(16), unsigned(32), *[signed(32) for _ in range(5)],
+                                         *[signed(8) for _ in range(4)], *[unsigned(32) for _ in range(5)],
+                                         unsigned(10))
+            frames.append(build_ubx_frame(0x01, 0x3C, payload))
+        elif kind == 1:
+            payload = NAV_PVT.pack(unsigned(32), 2026, 10, 18, 12, 30, 15, unsigned(4), unsigned(32), signed(32),
+                                   3, unsigned(8), unsigned(8), 20, signed(28), signed(28), signed(32), signed(32),
+                                   unsigned(32), unsigned(32), *[signed(32) for _ in range(5)],
+                                   unsigned(32), unsigned(32), unsigned(16), unsigned(1), signed(32), signed(16),
+                                   unsigned(16))
+            frames.append(build_ubx_frame(0x01, 0x07, payload))
+        else:
+            payload = NAV_HPPOSLLH.pack(0, unsigned(1), unsigned(32), signed(28), signed(28), signed(32), signed(32),
+                                        *[rng.randint(-99, 99) for _ in range(4)], unsigned(32), unsigned(32))
+            frames.append(build_ubx_frame(0x01, 0x14, payload))
+    return frames
+
+def capture_frames(paths):
+    """Every UBX frame from raw captures (see Common/rawCapture.py)."""
+    return [raw for path in paths for _, _, raw, _ in iter_capture(path) if raw.startswith(UBX_SYNC)]
+
+def check_equal(frames):
+    """Compares every fast-decoded field with pyubx2; returns the number of mismatches."""
+    mismatches = 0
+    for frame in frames:
+        fast = decode_ubx(frame)
+        if fast is None:
+            continue
+        slow = UBXReader.parse(frame)
+        for field in fast._fields + ('carrSoln',):
+            if not hasattr(slow, field):
+                continue
+            if not math.isclose(getattr(fast, field), getattr(slow, field), rel_tol=1e-12, abs_tol=1e-9):
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"  {fast.identity}.{field}: fast {getattr(fast, field)} pyubx2 {getattr(slow, field)}")
+    return mismatches
+
+def timed(function, items, repeat):
+    """Best of `repeat` passes over the items, in microseconds per item."""
+    best = float('inf')
+    for _ in range(repeat):
+        started = perf_counter()
+        for item in items:
+            function(item)
+        best = min(best, perf_counter() - started)
+    return best / len(items) * 1e6
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Microbenchmark of the struct decoder against pyubx2.")
+    parser.add_argument('captures', nargs='*', help="raw captures (*_GPSRaw.ubx); default: all in Record/Data, "
+                                                    "or synthetic frames if there are none")
+    parser.add_argument('--repeat', type=int, default=5, help="passes per measurement, best is kept (default: 5)")
+    args = parser.parse_args()
+
+    paths = args.captures or sorted(glob.glob(os.path.join(RECORD_DATA_DIR, '*_GPSRaw.ubx')))
+    frames = capture_frames(paths) if paths else []
+    source = f"{len(paths)} captures" if frames else "synthetic frames"
+    if not frames:
+        frames = synthetic_frames()
+    print(f"{len(frames)} UBX frames from {source}")
+
+    mismatches = check_equal(frames)
+    print(f"fields differing from pyubx2: {mismatches}")
+
+    by_type = {}
+    for frame in frames:
+        by_type.setdefault((frame[2], frame[3]), []).append(frame)
+    for key, group in sorted(by_type.items()):
+        name = UBXReader.parse(group[0]).identity
+        slow = timed(UBXReader.parse, group, args.repeat)
+        if key in FAST_DECODERS:
+            fast = timed(decode_ubx, group, args.repeat)
+            print(f"{name:>14}: {len(group):>6} frames  pyubx2 {slow:7.2f} us  struct {fast:6.2f} us  "
+                  f"({slow / fast:5.1f}x)")
+        else:
+            print(f"{name:>14}: {len(group):>6} frames  pyubx2 {slow:7.2f} us  (no fast path)")
+
+    bodies = [frame[2:-2] for frame in frames]
+    loop = timed(_loop_checksum, bodies, args.repeat)
+    fast = timed(ubx_checksum, bodies, args.repeat)
+    print(f"      checksum: per-byte loop {loop:6.2f} us  sum/accumulate {fast:6.2f} us  ({loop / fast:5.1f}x)")
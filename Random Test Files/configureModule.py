@@ -1,48 +1,51 @@
-import serial 
-from pyubx2 import UBXReader, UBXMessage
+import os
+import sys
+import argparse
+import serial
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.receiverConfig import (ReceiverConfigurator, ReceiverConfigError, PROFILES, load_profile,
+                                   LAYER_RAM, LAYER_BBR, LAYER_FLASH)
 
 port = '/dev/ttyAMA0'
 baudrate = 38400
-new_baudrate = 115200
-
-## https://github.com/semuconsulting/pyubx2/issues/169
-
-msg = [
-	# ('CFG_UART1OUTPROT_UBX', 1),
-	# ('CFG_UART1OUTPROT_NMEA', 0),
-	# ('CFG_UART2OUTPROT_NMEA', 1),
-	# ('CFG_MSGOUT_UBX_NAV_POSECEF_UART1', 1),
-	# ('CFG_MSGOUT_UBX_NAV_POSLLH_UART1', 1),
-	# ('CFG_MSGOUT_UBX_RXM_SFRBX_UART1', 1),
-	# ('CFG_MSGOUT_UBX_RXM_RAWX_UART1', 1),
-	('CFG_RATE_MEAS', 1000),
-	# ('CFG_MSGOUT_NMEA_ID_GGA_UART2', 1),
-	# ('CFG_MSGOUT_NMEA_ID_GSV_UART2', 1),
-	# ('CFG_MSGOUT_NMEA_ID_GSA_UART2', 1),
-	# ('CFG_MSGOUT_NMEA_ID_GST_UART2', 1),
-	# ('CFG_MSGOUT_NMEA_ID_GNS_UART2', 1),
-	# ('CFG_MSGOUT_NMEA_ID_ZDA_UART2', 1)
-]
-
-ser = serial.Serial(port, baudrate, timeout = 1)
-
-msg_baud = UBXMessage.config_set(1, 0, [('CFG_UART1_BAUDRATE', new_baudrate)])
-
-ser.write(msg_baud.serialize())
-
-ser.close()
-
-ser = serial.Serial(port, new_baudrate, timeout = 1)
-
-msg_cfg = UBXMessage.config_set(1, 0, msg)
-
-print(msg_cfg)
-
-ser.write(msg_cfg.serialize())
-
-reader = UBXReader(ser)
 
-while True:
-	raw_data, parsed_data = reader.read()
-	print(raw_data)
-	print(parsed_data)
\ No newline at end of file
+def print_budget(label, budget):
+    bytes_per_second, share = budget
+    share_text = f" ({share:.0%} of the link)" if share is not None else ""
+    print(f"{label}: {bytes_per_second:,.0f} bytes/s{share_text}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply a receiver profile with ACK checks and rollback.")
+    parser.add_argument('profile', nargs='?', default='recorder',
+                        help=f"built-in profile ({', '.join(PROFILES)}) or a JSON profile file (default: recorder)")
+    parser.add_argument('--port', default=port, help=f"serial port (default: {port})")
+    parser.add_argument('--baud', type=int, default=baudrate, help=f"current baud rate (default: {baudrate})")
+    parser.add_argument('--persist', action='store_true', help="also write to BBR and flash so it survives power cycles")
+    parser.add_argument('--dry-run', action='store_true', help="only show what would change")
+    args = parser.parse_args()
+
+    profile = load_profile(args.profile)
+    layers = LAYER_RAM | LAYER_BBR | LAYER_FLASH if args.persist else LAYER_RAM
+    with serial.Serial(args.port, args.baud, timeout=1) as ser:
+        configurator = ReceiverConfigurator(ser, layers=layers)
+        try:
+            report = configurator.apply(profile, dry_run=args.dry_run)
+        except ReceiverConfigError as e:
+            print(f"Configuration failed: {e}")
+            if e.report:
+                print("Previous values restored." if e.report['rolled_back'] else "Nothing was rolled back.")
+            return 1
+
+    print(f"Profile: {report['profile']}")
+    for key, value in report['changes']:
+        print(f"  {key}: {report['before'].get(key)} -> {value}")
+    if not report['changes']:
+        print("  receiver already matches the profile")
+    print_budget("Output before", report['budget_before'])
+    print_budget("Output after", report.get('budget_after', report['budget_planned']))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,48 +1,43 @@
+import os
+import sys
 import serial
 import time
 
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.receiverConfig import ReceiverConfigurator, ReceiverConfigError
+
+# Measurement every 500 ms (2 Hz), one navigation solution per measurement
+RATE_PROFILE = {
+    'description': "2 Hz measurement rate",
+    'meas_rate_ms': 500,
+    'nav_rate': 1,
+}
+
 def send_cfg_rate_command(port='/dev/ttyAMA0', baudrate=9600):
-    sync_chars = b'\xB5\x62'
-    msg_class = b'\x06'
-    msg_id = b'\x08'
-    payload_length = b'\x06\x00'
-    payload = b'\xF4\x01' + b'\x01\x00' + b'\x00\x00'
-    
-    chk_data = msg_class + msg_id + payload_length + payload
-    ck_a = 0
-    ck_b = 0
-    for byte in chk_data:
-        ck_a = (ck_a + byte) & 0xFF
-        ck_b = (ck_b + ck_a) & 0xFF
-    checksum = bytes([ck_a, ck_b])
-    
-    ubx_command = sync_chars + chk_data + checksum
-    print("Sending UBX command (hex):")
-    print(ubx_command.hex(' '))
-    
     try:
         ser = serial.Serial(port=port, baudrate=baudrate, timeout=1)
+    except serial.SerialException as e:
+        print(f"Error opening serial port: {e}")
+        return False
+    try:
         time.sleep(2)  # Allow the connection to settle
-        
+
         # Clear any previous data in the input buffer
         ser.reset_input_buffer()
-        
-        ser.write(ubx_command)
-        print("Command sent!")
-        
-        time.sleep(0.5)
-        response = ser.read_all()
-        if response:
-            print("Response (hex):")
-            print(response.hex(' '))
-        else:
-            print("No response received.")
-        
-    except serial.SerialException as e:
-        print(f"Error opening serial port: {e}")
+
+        # Waits for the ACK, reads the rate back and restores the old one if anything fails
+        report = ReceiverConfigurator(ser).apply(RATE_PROFILE)
+        for key, value in report['changes']:
+            print(f"{key}: {report['before'].get(key)} -> {value}")
+        if not report['changes']:
+            print("Receiver already at 2 Hz.")
+        return True
+    except ReceiverConfigError as e:
+        print(f"Rate not set: {e}")
+        return False
     finally:
-        if 'ser' in locals() and ser.is_open:
-            ser.close()
+        ser.close()
 
 if __name__ == "__main__":
-    send_cfg_rate_command(port='/dev/ttyAMA0', baudrate=9600)
\ No newline at end of file
+    send_cfg_rate_command(port='/dev/ttyAMA0', baudrate=9600)
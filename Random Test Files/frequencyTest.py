@@ -1,14 +1,24 @@
 import serial
 import csv
 import os
+import sys
 from time import strftime
-import pynmea2
-import psutil  # Import psutil for CPU usage monitoring
 
-def log_gngga():
-    """Logs parsed GNGGA messages and CPU usage to a CSV file with timestamps."""
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.nmeaFast import parse_nmea
+from Common.healthSampler import HealthSampler
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'Data')
+
+def log_gngga(port='/dev/ttyAMA0', baudrate=230400, data_dir=DATA_DIR, on_message=None):
+    """Logs parsed GNGGA messages and CPU usage to a CSV file with timestamps.
+
+    on_message is called after each GNGGA row is written (used by the
+    throughput benchmark to time the messages). CPU usage comes from a
+    background HealthSampler, so the read loop never waits for it.
+    """
     # Create the "Data" directory if it doesn't exist
-    data_dir = os.path.join(os.path.dirname(__file__), 'Data')
     os.makedirs(data_dir, exist_ok=True)
 
     # Create a new CSV file with the current date/time in the filename
@@ -23,31 +33,37 @@ def log_gngga():
         ])
 
         # Open the serial port
-        with serial.Serial('/dev/ttyAMA0', baudrate=230400, timeout=1) as port:
+        health = HealthSampler(port=port).start()
+        with serial.Serial(port, baudrate=baudrate, timeout=1) as serial_port:
             print(f"Logging GNGGA messages and CPU usage to {filename}. Press Ctrl+C to stop.")
             try:
                 while True:
-                    # Read a line from the serial port
-                    data = port.readline().decode('ascii', errors='replace').strip()
-                    if data.startswith('$GNGGA'):  # Only process GNGGA messages
+                    # Read a line from the serial port; it stays bytes until it is written
+                    line = serial_port.readline()
+                    if line.startswith(b'$GNGGA'):  # Only process GNGGA messages
                         timestamp = strftime("%Y-%m-%d %H:%M:%S")
-                        try:
-                            # Parse the GNGGA message
-                            msg = pynmea2.parse(data)
-                            # Get current CPU usage
-                            cpu_usage = psutil.cpu_percent(interval=.1)  # Get CPU usage over 1 second
-                            # Write data to CSV
-                            writer.writerow([
-                                timestamp, data, msg.latitude, msg.longitude, 
-                                msg.altitude, msg.num_sats, msg.horizontal_dil, 
-                                msg.gps_qual, cpu_usage
-                            ])
-                            csvfile.flush()
-                            print(f"{timestamp}, {data}, {msg.latitude}, {msg.longitude}, {msg.altitude}, {msg.num_sats}, {msg.horizontal_dil}, {msg.gps_qual}, {cpu_usage}%")
-                        except pynmea2.ParseError as e:
-                            print(f"Parse error: {e}")
+                        # Parse the GNGGA message
+                        msg = parse_nmea(line)
+                        data = line.decode('ascii', errors='replace').strip()
+                        if msg is None:
+                            print(f"Parse error: {data}")
+                            continue
+                        # Latest CPU usage sample, taken off the loop once a second
+                        cpu_usage = health.latest.cpu_percent
+                        # Write data to CSV
+                        writer.writerow([
+                            timestamp, data, msg.lat, msg.lon,
+                            msg.alt, msg.numSV, msg.HDOP,
+                            msg.quality, cpu_usage
+                        ])
+                        csvfile.flush()
+                        print(f"{timestamp}, {data}, {msg.lat}, {msg.lon}, {msg.alt}, {msg.numSV}, {msg.HDOP}, {msg.quality}, {cpu_usage}%")
+                        if on_message:
+                            on_message()
             except KeyboardInterrupt:
                 print("\nLogging stopped by user.")
+            finally:
+                health.close()
 
 if __name__ == '__main__':
     log_gngga()
\ No newline at end of file
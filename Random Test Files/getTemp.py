@@ -1,9 +1,15 @@
 import os
+import sys
 import time
 
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.healthSampler import read_soc_temp
+
 def get_cpu_temp():
-    temp = os.popen("vcgencmd measure_temp").readline()
-    return temp.replace("temp=", "").strip()
+    # Read from /sys/class/thermal rather than starting a vcgencmd process each time
+    temp = read_soc_temp()
+    return "unavailable" if temp is None else f"{temp:.1f}'C"
 
 if __name__ == "__main__":
     try:
@@ -12,4 +18,4 @@ if __name__ == "__main__":
             print(f"CPU Temperature: {cpu_temp}")
             time.sleep(5)  # Delay for 5 seconds
     except KeyboardInterrupt:
-        print("Monitoring stopped.")
\ No newline at end of file
+        print("Monitoring stopped.")
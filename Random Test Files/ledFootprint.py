@@ -0,0 +1,62 @@
+import os
+import sys
+import threading
+from time import sleep
+from multiprocessing import Process, Value
+from gpiozero import Device, LED
+from gpiozero.pins.mock import MockFactory
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.ledScheduler import LedScheduler
+
+def memory_kb(pid):
+    """Returns (rss, pss) in kB for a process; PSS splits shared pages fairly between processes."""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as smaps:
+        for line in smaps:
+            fields = line.split()
+            if fields[0] in ('Rss:', 'Pss:'):
+                values[fields[0]] = int(fields[1])
+    return values['Rss:'], values['Pss:']
+
+def poll_led(is_writing, pin):
+    """The recorder's old LED process: polls a shared Value every 100 ms."""
+    led = LED(pin)
+    while True:
+        if is_writing.value:
+            led.on()
+        else:
+            led.off()
+        sleep(0.1)
+
+def measure():
+    Device.pin_factory = MockFactory()
+    base_rss, base_pss = memory_kb(os.getpid())
+    print(f"recorder process alone:      RSS {base_rss} kB, PSS {base_pss} kB")
+
+    # Before: a whole extra process for one LED
+    is_writing = Value('i', 1)
+    led_process = Process(target=poll_led, args=(is_writing, 17), daemon=True)
+    led_process.start()
+    sleep(1)
+    child_rss, child_pss = memory_kb(led_process.pid)
+    parent_rss, parent_pss = memory_kb(os.getpid())
+    print(f"with LED process:            +{child_rss} kB RSS, total PSS {parent_pss + child_pss} kB "
+          f"(+{parent_pss + child_pss - base_pss} kB)")
+    led_process.terminate()
+    led_process.join()
+
+    # After: one timer thread in the recorder process
+    leds = LedScheduler()
+    led = LED(17)
+    leds.set(led, True)
+    leds.blink(LED(22), 0.1, 0.1)
+    sleep(1)
+    after_rss, after_pss = memory_kb(os.getpid())
+    print(f"with LedScheduler thread:    total PSS {after_pss} kB (+{after_pss - base_pss} kB), "
+          f"{threading.active_count()} threads")
+    leds.close()
+
+if __name__ == '__main__':
+    measure()
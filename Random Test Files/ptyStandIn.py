@@ -0,0 +1,60 @@
+import os
+import sys
+import pty
+import tty
+import argparse
+from time import sleep, monotonic
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.rawCapture import iter_capture
+
+def replay_capture(path, master_fd, speed=1.0, loop=False):
+    """Writes the frames of a raw capture to the pty with their original spacing.
+
+    speed scales the timing (2.0 = twice as fast, 0 = as fast as possible).
+    Returns the number of bytes written.
+    """
+    written = 0
+    while True:
+        started = monotonic()
+        first_time = None
+        for recv_time, wall_time, raw_data, _ in iter_capture(path):
+            # Version 1 captures only have the wall clock
+            frame_time = wall_time if recv_time is None else recv_time
+            if first_time is None:
+                first_time = frame_time
+            if speed:
+                # Absolute deadlines so the replay does not drift
+                delay = started + (frame_time - first_time) / speed - monotonic()
+                if delay > 0:
+                    sleep(delay)
+            os.write(master_fd, raw_data)
+            written += len(raw_data)
+        if not loop:
+            return written
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Stand in for the ZED-F9P: replays a raw capture (*_GPSRaw.ubx) on a pseudo-terminal.")
+    parser.add_argument('capture', help="raw capture recorded with parseAndRecordData.py --raw")
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed factor, 0 for no pacing (default: 1)")
+    parser.add_argument('--loop', action='store_true', help="start over at the end of the capture")
+    args = parser.parse_args()
+
+    master_fd, slave_fd = pty.openpty()
+    # Raw mode so UBX bytes are not translated by the line discipline
+    tty.setraw(slave_fd)
+    print(f"Receiver stand-in on {os.ttyname(slave_fd)}, e.g.:", flush=True)
+    print(f"  python3 Record/parseAndRecordData.py 12 --pipeline asyncio --port {os.ttyname(slave_fd)}", flush=True)
+    input("Press Enter once the recorder is running...")
+    try:
+        written = replay_capture(args.capture, master_fd, args.speed, args.loop)
+        print(f"Wrote {written} bytes")
+        # Give the recorder time to read the tail before the pty goes away
+        sleep(2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        os.close(master_fd)
+        os.close(slave_fd)
@@ -1,7 +1,7 @@
 import serial
 import json
 from ublox_gps import UbloxGps
-from time import strftime, sleep, time
+from time import strftime, sleep
 import csv
 import logging
 import sys
@@ -9,6 +9,19 @@ import os
 import gpiozero
 from gpiozero import LED
 
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.ledScheduler import LedScheduler
+from Common.loopScheduler import LoopScheduler
+from Common.receiverConfig import ReceiverConfigurator, ReceiverConfigError
+
+# Measurement every 1000 ms (1 Hz), one navigation solution per measurement
+RATE_PROFILE = {
+    'description': "1 Hz measurement rate",
+    'meas_rate_ms': 1000,
+    'nav_rate': 1,
+}
+
 # GPIO pin number for the GREEN LED
 GREEN_LED_PIN = 17
 
@@ -104,19 +117,22 @@ def run(mow_id):
 
         # Open serial port connection
         with serial.Serial('/dev/ttyAMA0', baudrate=38400, timeout=1) as port:
-            gps = UbloxGps(port)  # Initialize GPS object
             try:
-                # Set measurement rate to 1000ms (1Hz)
-                gps.configure_solution_rate(measurement_rate=1000, navigation_rate=1, time_reference=0)
+                # Set measurement rate to 1000ms (1Hz), checked by ACK and read-back
+                ReceiverConfigurator(port).apply(RATE_PROFILE)
                 logging.info("GPS module configured for 1Hz output rate")
-            except Exception as e:
+            except ReceiverConfigError as e:
                 logging.error(f"Error configuring GPS rate: {e}")
+            gps = UbloxGps(port)  # Initialize GPS object
             green_led = initialize_green_led()
             
             if green_led:
+                # The flash runs on the LED scheduler's thread, and the loop keeps to absolute 1 s deadlines
+                leds = LedScheduler()
+                loop = LoopScheduler(1, name='recordDataToCsv')
                 try:
                     while True:
-                        start_time = time()  # Record the start time of the loop
+                        loop.wait()
                         telemetry = extract_gps_data(gps)  # Extract GPS data
                         if telemetry:
                             # Write data to CSV
@@ -125,25 +141,15 @@ def run(mow_id):
                             logging.info(f"Data written to CSV: {telemetry}")
                             
                             # Flash GREEN LED
-                            try:
-                                green_led.on()
-                                sleep(0.1)
-                                green_led.off()
-                            except Exception as e:
-                                logging.error(f"Error initializing GPIO: {e}")
-                        
-                        # Calculate the elapsed time and adjust the sleep duration
-                        elapsed_time = time() - start_time
-                        logging.info(f"Elapsed time for this iteration: {elapsed_time:.2f} seconds")
-                        sleep_duration = max(0, 1 - elapsed_time)
-                        logging.info(f"Sleeping for: {sleep_duration:.2f} seconds")
-                        sleep(sleep_duration)  # Wait for the remaining time to complete 1 second
+                            leds.solid(green_led, 0.1)
 
                 except KeyboardInterrupt:
                     logging.info("Program interrupted by user")
                 except Exception as e:
                     logging.error(f"Unexpected error: {e}")
                 finally:
+                    loop.log_report()
+                    leds.close()
                     cleanup_gpio(green_led)
             else:
                 logging.error("Failed to initialize GREEN_LED, proceeding without LED")
@@ -0,0 +1,109 @@
+import os
+import sys
+import logging
+import argparse
+import tempfile
+import threading
+import _thread
+from time import time
+
+os.environ.setdefault('GPIOZERO_PIN_FACTORY', 'mock')
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.gnssSimulator import GnssSimulator, FACTORY_MESSAGES
+from Common.healthSampler import EMPTY
+from Common.fastLogging import setup_logging, stop_logging, LOG_FORMAT
+from Common.loadShedder import STAGE_NAMES
+from Record.parseAndRecordData import log_serial_data
+
+RATE = 10
+BAUD = 460800
+
+# (seconds, SoC temperature 'C, CPU %): a Pi warming up in the sun to throttling point and cooling down again
+THERMAL_SCRIPT = [
+    (4, 55.0, 40.0),
+    (4, 72.0, 50.0),
+    (10, 81.0, 55.0),
+    (4, 72.0, 50.0),
+    (14, 60.0, 40.0),
+]
+
+class FakeHealth:
+    """Stands in for a HealthSampler: publishes scripted readings as `latest`, every `interval` seconds."""
+
+    def __init__(self, script, interval=0.25):
+        self.script = script
+        self.interval = interval
+        self.latest = EMPTY
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='fake-health', daemon=True)
+
+    def _run(self):
+        for seconds, soc_temp, cpu_percent in self.script:
+            for _ in range(int(seconds / self.interval)):
+                self.latest = EMPTY._replace(time=time(), soc_temp=soc_temp, cpu_percent=cpu_percent)
+                if self._stop.wait(self.interval):
+                    return
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+class TransitionLog(logging.Handler):
+    """Keeps the load-shedding messages, which the recorder only logs."""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.messages = []
+
+    def emit(self, record):
+        message = record.getMessage()
+        if message.startswith('Load shedding'):
+            self.messages.append(message)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs the recorder against the simulator while faking a "
+                                                 "thermal ramp, and checks the load-shedding stages.")
+    parser.add_argument('--interval', type=float, default=0.25, help="seconds between fake health samples (default: 0.25)")
+    args = parser.parse_args()
+
+    duration = sum(seconds for seconds, _, _ in THERMAL_SCRIPT)
+    with tempfile.TemporaryDirectory() as data_dir:
+        setup_logging(os.path.join(data_dir, 'shed.log'), console_format=LOG_FORMAT)
+        transitions = TransitionLog()
+        logging.getLogger().addHandler(transitions)
+
+        # Factory NMEA on top of what the recorder needs, so there is something to skip
+        sim = GnssSimulator(RATE, BAUD, messages=('NAV-RELPOSNED',) + FACTORY_MESSAGES)
+        sim.start()
+        health = FakeHealth(THERMAL_SCRIPT, args.interval).start()
+        # Stop the recorder the way Ctrl+C does once the script has played
+        stopper = threading.Timer(duration, _thread.interrupt_main)
+        stopper.start()
+        try:
+            log_serial_data('99', lambda writing: None, port=sim.port, baud=BAUD, data_dir=data_dir,
+                            rate=RATE, shed=health)
+        finally:
+            stopper.cancel()
+            health.close()
+            sim.stop()
+            final_rate = sim.rate_hz
+            sim.close()
+            stop_logging()
+        rows = sum(1 for name in os.listdir(data_dir) if name.endswith('_GPSData.csv')
+                   for _ in open(os.path.join(data_dir, name))) - 1
+
+    print()
+    print('\n'.join(transitions.messages))
+    stages = [int(message.split('-> ')[1].split()[0]) for message in transitions.messages if '->' in message]
+    deepest = max(stages, default=0)
+    print(f"{rows} rows in {duration} s; deepest stage {deepest} ({STAGE_NAMES[deepest]}), "
+          f"receiver back at {final_rate:g} Hz")
+    ok = deepest == len(STAGE_NAMES) - 1 and stages[-1] == 0 and final_rate == RATE
+    print("OK" if ok else "FAILED: expected every stage on the way down and full service at the end")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,64 @@
+import os
+import sys
+import argparse
+import serial
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.gnssSimulator import GnssSimulator, FACTORY_MESSAGES
+from Common.receiverConfig import ReceiverConfigurator, ReceiverConfigError, PROFILES
+
+BAUD = 38400
+
+# (name, keys the receiver NAKs, profile, whether apply() should succeed, whether it should roll back)
+CASES = [
+    # The first CFG-VALSET is NAKed: the receiver takes none of it, so there is nothing to roll back
+    ('output key rejected', ('CFG_MSGOUT_UBX_NAV_RELPOSNED_UART1',), 'recorder', False, False),
+    # The outputs go through, then the baud switch is refused: the outputs are put back
+    ('baud rate rejected', ('CFG_UART1_BAUDRATE',), 'recorder', False, True),
+    ('accepted', (), 'recorder-10hz', True, False),
+]
+
+def run_case(reject_keys, profile):
+    """Applies a profile to a factory-configured simulator; returns (report, error, config before, config after, host baud)."""
+    # Factory output on the port while configuring, so every ACK has to be picked out of NMEA traffic
+    sim = GnssSimulator(1, BAUD, messages=FACTORY_MESSAGES, reject_keys=reject_keys)
+    before = dict(sim.config)
+    sim.start()
+    report = error = None
+    try:
+        with serial.Serial(sim.port, BAUD, timeout=1) as stream:
+            try:
+                report = ReceiverConfigurator(stream).apply(PROFILES[profile])
+            except ReceiverConfigError as e:
+                error = e
+            host_baud = stream.baudrate
+    finally:
+        sim.close()
+    return report, error, before, dict(sim.config), host_baud
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Applies receiver profiles to the simulator with keys NAKed, "
+                                                 "and checks the rollback.")
+    parser.parse_args()
+
+    failures = 0
+    for name, reject_keys, profile, should_apply, should_roll_back in CASES:
+        report, error, before, after, host_baud = run_case(reject_keys, profile)
+        # Keys the simulator never held read back as 0
+        changed = sorted(key for key in set(before) | set(after) if before.get(key, 0) != after.get(key, 0))
+        if should_apply:
+            expected = dict(PROFILES[profile]['outputs']['UART1'], baud=PROFILES[profile]['baud']['UART1'])
+            ok = (error is None and after['CFG_UART1_BAUDRATE'] == host_baud == expected['baud']
+                  and after['CFG_RATE_MEAS'] == PROFILES[profile]['meas_rate_ms'])
+            outcome = f"applied, {len(report['changes'])} keys changed, host now at {host_baud} baud"
+        else:
+            rolled_back = bool(error and error.report and error.report['rolled_back'])
+            ok = error is not None and rolled_back == should_roll_back and not changed and host_baud == BAUD
+            outcome = (f"{error}; {'rolled back' if rolled_back else 'nothing rolled back'}, "
+                       f"{len(changed)} keys differ from before ({', '.join(changed) or 'none'}), host at {host_baud} baud")
+        print(f"{name:<20} {'OK    ' if ok else 'FAILED'} {outcome}")
+        failures += not ok
+
+    print("OK" if not failures else f"FAILED: {failures} of {len(CASES)} cases")
+    sys.exit(1 if failures else 0)
@@ -1,139 +1,190 @@
 import os
-import csv
 import sys
-import math
+import signal
+import argparse
 import logging
-from time import strftime, sleep, time
+from time import monotonic
+from contextlib import nullcontext
 from serial import Serial
-from pyubx2 import UBXReader, UBX_PROTOCOL, NMEA_PROTOCOL
+from pyubx2 import UBXReader, UBX_PROTOCOL, NMEA_PROTOCOL, PARSE_NONE
 from gpiozero import LED
-from multiprocessing import Process, Value
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.recording import RunOutput, RECORD_DATA_DIR
+from Common.epochFusion import EpochFuser, RECORDING_MODES
+from Common.ubxFraming import parse_frame
+from Common.asyncRecorder import record_async
+from Common.multiprocessRecorder import MultiprocessRecorder
+from Common.ledScheduler import LedScheduler
+from Common.baudProbe import saved_baud
+from Common.healthSampler import HealthSampler
+from Common.loadShedder import LoadShedder
+from Common.fastLogging import setup_logging as fast_logging, run_log_file
 
 # GPIO pin number for the GREEN LED
 GREEN_LED_PIN = 17
 
-# Create the "Logs" directory if it doesn't exist
-log_dir = os.path.join(os.path.dirname(__file__), 'Logs')
-os.makedirs(log_dir, exist_ok=True)
-
-# Log file path with a unique name based on the current date
-log_file = os.path.join(log_dir, f'recordDataToCsv_{strftime("%Y-%m-%d")}.log')
-
-# Initialize logging with timestamp in every log message
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename=log_file,
-    filemode='w'  # Overwrite the log file if it already exists
-)
+# Serial connection to the ZED-F9P
+SERIAL_PORT = '/dev/ttyAMA0'
+BAUD_RATE = 57600
+
+def setup_logging(force=False, console_format=None):
+    """Sends log messages to a per-run log in Record/Logs; force replaces a configuration inherited from a worker.
+
+    Records are written by a background thread (see Common/fastLogging.py);
+    console_format also mirrors them to stdout.
+    """
+    log_file = run_log_file(os.path.join(os.path.dirname(__file__), 'Logs'), 'recordDataToCsv')
+    fast_logging(log_file, console_format=console_format, force=force)
+
+def open_serial(port=SERIAL_PORT, baud=None):
+    """Opens the receiver's serial port, by default at the rate Common/baudProbe.py saved for it."""
+    return Serial(port, baud or saved_baud(port, BAUD_RATE), timeout=1)
+
+def handle_sigterm(signum, frame):
+    """Turns a terminate() from selectMode into a clean shutdown so buffered rows are committed."""
+    raise KeyboardInterrupt
+
+def log_serial_data(mow_id, show_writing, raw_capture=False, stream=None, on_first_row=None,
+                    port=SERIAL_PORT, baud=None, data_dir=RECORD_DATA_DIR, mode='fused', rate=None, health=None,
+                    shed=None):
+    """Logs specific fields from UBX and NMEA messages into a CSV file.
+
+    With raw_capture every frame read from the receiver is also appended,
+    unparsed, to a <id>_<ts>_GPSRaw.ubx capture so the run can be re-parsed
+    offline; the per-message field logging is skipped in that case.
+    show_writing(bool) is called to drive the writing indicator. An already
+    open `stream` (kept warm by the worker supervisor) is used instead of
+    opening the serial port, and on_first_row is called once the first
+    fused row has been written. Runs go to Record/Data unless `data_dir`
+    says otherwise (benchmarks keep theirs out of the catalog). mode='pvt'
+    records NAV-PVT alone (plus RELPOSNED from a moving base) instead of
+    fusing GNRMC with NAV-RELPOSNED. With the receiver's navigation `rate`
+    (Hz) the jitter of the row cadence is logged at the end of the run,
+    and a running HealthSampler as `health` adds system health to each row.
+    A HealthSampler as `shed` steps the recording down while the Pi is hot
+    or busy (see Common/loadShedder.py).
+    """
+    output = RunOutput(mow_id, raw_capture=raw_capture, data_dir=data_dir, header=RECORDING_MODES[mode]['fields'],
+                       rate=rate, health=health)
+    fuser = EpochFuser.for_mode(mode, log_fields=not raw_capture)
 
-def flash_led(is_writing):
-    """Controls the green LED based on the writing state."""
-    green_led = LED(GREEN_LED_PIN)
     try:
-        while True:
-            if is_writing.value:  # If writing to the CSV file
-                green_led.on()
-            else:  # If not writing to the CSV file
-                green_led.off()
-            sleep(0.1)  # Check the state every 100ms
-    except KeyboardInterrupt:
-        pass
-    finally:
-        green_led.off()  # Ensure the LED is turned off on exit
-
-def log_serial_data(mow_id, is_writing):
-    """Logs specific fields from UBX and NMEA messages into a CSV file."""
-    # Create the "Data" directory if it doesn't exist
-    data_dir = os.path.join(os.path.dirname(__file__), 'Data')
-    os.makedirs(data_dir, exist_ok=True)
-
-    # Create a new CSV file with Mow ID and date/time in the filename
-    filename = os.path.join(data_dir, f"{mow_id}_{strftime('%Y%m%d-%H%M%S')}_GPSData.csv")   
-
-    with open(filename, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        # Write CSV header
-        writer.writerow(['timestamp', 'latitude', 'longitude', 'speed', 'rel_north', 'rel_east', 'rel_down', 'heading'])
-
-        # Initialize buffers for the latest values
-        latest_latitude = latest_longitude = latest_speed = None
-        latest_rel_north = latest_rel_east = latest_rel_down = latest_heading = None
-        last_timestamp = None
-
-        # Open the serial port
-        with Serial('/dev/ttyAMA0', 57600, timeout=1) as stream:
-            # Configure UBXReader to parse both UBX and NMEA messages
-            ubr = UBXReader(stream, protfilter=UBX_PROTOCOL | NMEA_PROTOCOL)
-            logging.info(f"Logging specific fields to {filename}. Press Ctrl+C to stop.")
+        # Open the serial port unless the caller already holds it open
+        with (nullcontext(stream) if stream else open_serial(port, baud)) as stream:
+            # Drop whatever queued up while the port sat idle
+            stream.reset_input_buffer()
+            # UBXReader only frames UBX and NMEA messages; parse_frame decodes the hot ones without pyubx2
+            ubr = UBXReader(stream, protfilter=UBX_PROTOCOL | NMEA_PROTOCOL, parsing=PARSE_NONE)
+            shedder = LoadShedder(shed, fuser, stream, rate, on_rate=output.set_rate) if shed else None
+            logging.info(f"Logging specific fields to {output.filename}. Press Ctrl+C to stop.")
             try:
                 while True:
                     # Read and parse data
                     raw_data, parsed_data = ubr.read()
+                    recv_time = monotonic()
+                    if raw_data:
+                        output.capture_frame(raw_data, recv_time)
+                        if shedder and shedder.update() and shedder.skip(raw_data):
+                            continue
+                        try:
+                            parsed_data = parse_frame(raw_data)
+                        except Exception as e:
+                            logging.warning(f"Skipping unparseable frame: {e}")
                     if parsed_data:
-                        timestamp = strftime("%Y-%m-%d %H:%M:%S")
-
-                        # Parse NMEA messages
-                        if parsed_data.identity.startswith("GNRMC"):  # Recommended Minimum Navigation Information
-                            latest_latitude = parsed_data.lat
-                            latest_longitude = parsed_data.lon
-                            latest_speed = float(parsed_data.spd) * 1.852 if parsed_data.spd else 0  # Convert knots to km/h
-                            last_timestamp = timestamp
-                            logging.info(f"latitude {latest_latitude}, longitude {latest_longitude}, speed {latest_speed} km/h")
-                        # Parse UBX messages
-                        if parsed_data.identity == "NAV-RELPOSNED":  # Relative Position NED
-                            latest_rel_north = parsed_data.relPosN / 100  # Convert to meters
-                            latest_rel_east = parsed_data.relPosE / 100   # Convert to meters
-                            latest_rel_down = parsed_data.relPosD / 100   # Convert to meters
-                            latest_heading = parsed_data.relPosHeading    # degrees
-                            last_timestamp = timestamp
-
-                            if latest_heading == 0.0:
-                                latest_heading = math.degrees(math.atan2(latest_rel_east, latest_rel_north))
-                                if latest_heading < 0:
-                                    latest_heading += 360  # Normalize to 0-360 degrees
-
-                            logging.info(f"latest_rel_north {latest_rel_north}, latest_rel_east {latest_rel_east}, latest_rel_down {latest_rel_down} latest_heading {latest_heading}")
-                        
+                        row = fuser.update(parsed_data, recv_time)
                         # Signal that we are writing to the CSV file
-                        is_writing.value = 1
-                        
-                        # Write to CSV only if both NMEA and UBX data are available
-                        if all([latest_latitude, latest_longitude, latest_speed, latest_rel_north, latest_rel_east, latest_rel_down, latest_heading]):
-                            writer.writerow([last_timestamp, latest_latitude, latest_longitude, latest_speed, latest_rel_north, latest_rel_east, latest_rel_down, latest_heading])
-                            csvfile.flush()
-
-                            # Reset the buffer after writing
-                            latest_latitude = latest_longitude = latest_speed = None
-                            latest_rel_north = latest_rel_east = latest_rel_down = latest_heading = None
+                        show_writing(True)
+                        if row and output.write_row(row) and on_first_row:
+                            on_first_row()
                     else:
                         # Signal that we are not writing to the CSV file
-                        is_writing.value = 0
-            except KeyboardInterrupt:
-                logging.info("Logging stopped by user.")
-            except Exception as e:
-                logging.error(f"Error: {e}")
+                        show_writing(False)
             finally:
-                # Ensure the LED turns off when exiting
-                is_writing.value = 0
-
-if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        sys.exit(1)
-    combination = sys.argv[1]
-
-    # Shared value to signal the LED process
-    is_writing = Value('i', 0)  # Create a shared Value object (0 = not writing, 1 = writing)
+                # Back to full rate while the port is still open
+                if shedder:
+                    shedder.close()
+    except KeyboardInterrupt:
+        logging.info("Logging stopped by user.")
+    except Exception as e:
+        logging.error(f"Error: {e}")
+    finally:
+        output.close()
+        fuser.flush()
+        logging.info(f"Epoch fusion: {fuser.summary()}")
+        # Ensure the LED turns off when exiting
+        show_writing(False)
+
+def run_recording(combination, raw_capture=False, stream=None, on_first_row=None, pipeline='sync',
+                  port=SERIAL_PORT, baud=None, parsers=2, mode='fused', rate=None, health=False, shed=False):
+    """Records a run with the green LED showing when rows are being written.
+
+    pipeline='asyncio' reads, parses and writes in separate asyncio stages
+    (see Common/asyncRecorder.py) and pipeline='multiprocess' in separate
+    processes joined by a shared-memory ring (Common/multiprocessRecorder.py),
+    instead of the single read-parse-write loop. health=True samples CPU,
+    memory, temperature and UART errors in the background and adds them to
+    every row (see Common/healthSampler.py). shed=True sheds load when the
+    Pi runs hot or busy (Common/loadShedder.py); the multiprocess pipeline
+    parses in other processes and does not shed.
+    """
+    # The LED is driven from the scheduler's timer thread, not a separate process
+    leds = LedScheduler()
+    green_led = LED(GREEN_LED_PIN)
 
-    # Start the LED flashing process
-    led_process = Process(target=flash_led, args=(is_writing,))
-    led_process.start()
+    def show_writing(writing):
+        leds.set(green_led, writing)
 
+    sampler = HealthSampler(port=port).start() if health or shed else None
+    # Health columns only when asked for; shedding alone just reads the sampler
+    health, shed = (sampler if health else None), (sampler if shed else None)
     try:
-        # Start the main logging process
-        log_serial_data(combination, is_writing)
+        if pipeline == 'multiprocess':
+            if shed:
+                logging.warning("Load shedding is not available with --pipeline multiprocess")
+            open_stream = (lambda: nullcontext(stream)) if stream else (lambda: open_serial(port, baud))
+            MultiprocessRecorder(combination, open_stream, show_writing, raw_capture=raw_capture,
+                                 on_first_row=on_first_row, parsers=parsers, mode=mode, rate=rate,
+                                 health=health).run()
+        elif pipeline == 'asyncio':
+            with (nullcontext(stream) if stream else open_serial(port, baud)) as stream:
+                record_async(combination, stream, show_writing, raw_capture=raw_capture, on_first_row=on_first_row,
+                             mode=mode, rate=rate, health=health, shed=shed)
+        else:
+            # Start the main logging process
+            log_serial_data(combination, show_writing, raw_capture=raw_capture, stream=stream,
+                            on_first_row=on_first_row, port=port, baud=baud, mode=mode, rate=rate, health=health,
+                            shed=shed)
     finally:
-        # Ensure the LED process is terminated on exit
-        is_writing.value = 0  # Turn off the LED
-        led_process.terminate()
-        led_process.join()
\ No newline at end of file
+        if sampler:
+            sampler.close()
+        # Ensure the LED is turned off on exit
+        leds.close()
+        green_led.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Record fused GNSS fixes to a CSV file.")
+    parser.add_argument('combination', help="2-digit Mow ID used to name the run")
+    parser.add_argument('--raw', action='store_true', help="also keep a raw UBX/NMEA capture of the run")
+    parser.add_argument('--pipeline', choices=('sync', 'asyncio', 'multiprocess'), default='sync',
+                        help="single read loop, staged asyncio pipeline or reader/parser processes (default: sync)")
+    parser.add_argument('--mode', choices=tuple(RECORDING_MODES), default='fused',
+                        help="fuse GNRMC with NAV-RELPOSNED, or record NAV-PVT alone (default: fused)")
+    parser.add_argument('--parsers', type=int, default=2, help="parser processes for --pipeline multiprocess (default: 2)")
+    parser.add_argument('--port', default=SERIAL_PORT, help=f"serial port of the receiver (default: {SERIAL_PORT})")
+    parser.add_argument('--baud', type=int,
+                        help=f"baud rate (default: the rate saved by Common/baudProbe.py, else {BAUD_RATE})")
+    parser.add_argument('--rate', type=float,
+                        help="navigation rate the receiver is set to (Hz); logs the jitter of the row cadence")
+    parser.add_argument('--health', action='store_true',
+                        help="add CPU, load, memory, SoC temperature and UART error columns to every row")
+    parser.add_argument('--shed', action='store_true',
+                        help="shed load when the Pi runs hot or busy: quieter logging, fewer messages, "
+                             "then a lower receiver rate (needs --rate)")
+    args = parser.parse_args()
+    setup_logging()
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    run_recording(args.combination, raw_capture=args.raw, pipeline=args.pipeline,
+                  port=args.port, baud=args.baud, parsers=args.parsers, mode=args.mode, rate=args.rate,
+                  health=args.health, shed=args.shed)
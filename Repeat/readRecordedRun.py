@@ -1,146 +1,253 @@
 import os
-import csv
 import sys
 import math
+import signal
+import argparse
 import logging
-from time import strftime, sleep, time
-from serial import Serial
-from pyubx2 import UBXReader, UBX_PROTOCOL, NMEA_PROTOCOL
-from gpiozero import LED
-from multiprocessing import Process, Value
-
-# GPIO pin number for the GREEN LED
-GREEN_LED_PIN = 17
-
-# Open Csv file to read from it
-# with open('recordedData.csv', 'r') as csvfile:
-# open serial connection with high baud rate
-# for every row that we read we need to process it
-#
-#
-
-# Create the "Logs" directory if it doesn't exist
-log_dir = os.path.join(os.path.dirname(__file__), 'Logs')
-os.makedirs(log_dir, exist_ok=True)
-
-# Log file path with a unique name based on the current date
-log_file = os.path.join(log_dir, f'recordDataToCsv_{strftime("%Y-%m-%d")}.log')
-
-# Initialize logging with timestamp in every log message
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    filename=log_file,
-    filemode='w'  # Overwrite the log file if it already exists
-)
-
-def flash_led(is_writing):
-    """Controls the green LED based on the writing state."""
-    green_led = LED(GREEN_LED_PIN)
+from array import array
+from time import monotonic
+import numpy as np
+
+# Make the shared modules in Common/ importable when run as a script
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Common.columnarRun import ColumnarRun, columnar_path, HEADER_FILE
+from Common.runArchive import ArchivedRun, ARCHIVE_SUFFIX
+from Common.runCatalog import RunCatalog
+from Common.runTiming import run_times, stamp_seconds
+from Common.pathIndex import PathIndex
+from Common.loopScheduler import LoopScheduler
+from Common.fastLogging import setup_logging as fast_logging, run_log_file
+
+# Recorded runs live next to the recorder
+RECORD_DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Record', 'Data')
+
+# Exit code when there is no run to replay (or to follow); a replay stopped early still exits 0
+NO_RUN_EXIT = 2
+
+def setup_logging(force=False, console_format=None):
+    """Sends log messages to a per-run log in Repeat/Logs; force replaces a configuration inherited from a worker.
+
+    Records are written by a background thread (see Common/fastLogging.py);
+    console_format also mirrors them to stdout.
+    """
+    log_file = run_log_file(os.path.join(os.path.dirname(__file__), 'Logs'), 'readRecordedRun')
+    fast_logging(log_file, console_format=console_format, force=force)
+
+class RecordedRun:
+    """Streams the rows of a recorded CSV run without loading it into memory.
+
+    Opening a run makes one pass over the file to record the byte offset and
+    the time of every row (see Common/runTiming.py). Seeking to a row or a
+    time is then a lookup followed by a file seek.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self.fields = self._file.readline().decode().strip().split(',')
+        self._time_column = self.fields.index('timestamp')
+        self._offsets = array('Q')
+        self.start_time = None
+        self._build_index()
+
+    def _build_index(self):
+        """Records row offsets and row times in one pass.
+
+        A malformed row (a line torn by a power cut, say) is left out with a
+        warning rather than making the whole run unreadable.
+        """
+        offset = self._file.tell()
+        clock_columns = [self.fields.index(name) if name in self.fields else None for name in ('itow', 'recv_time')]
+        seconds, itow, recv_time = array('d'), array('d'), array('d')
+        last_stamp = second = None
+        skipped = []
+        for line in self._file:
+            row_offset = offset
+            offset += len(line)
+            values = line.rstrip(b'\r\n').split(b',')
+            try:
+                if len(values) != len(self.fields):
+                    raise ValueError(f"{len(values)} columns instead of {len(self.fields)}")
+                stamp = values[self._time_column]
+                if stamp != last_stamp:
+                    # Only parse the timestamp when it changes (once per second at most)
+                    second = stamp_seconds(stamp.decode())
+                    last_stamp = stamp
+                clocks = [float(values[column]) if column is not None and values[column] else math.nan
+                          for column in clock_columns]
+            except ValueError as e:
+                skipped.append((row_offset, e))
+                continue
+            self._offsets.append(row_offset)
+            seconds.append(second)
+            itow.append(clocks[0])
+            recv_time.append(clocks[1])
+        if skipped:
+            row_offset, error = skipped[0]
+            logging.warning(f"{os.path.basename(self.path)}: skipped {len(skipped)} malformed rows "
+                            f"(first at byte {row_offset}: {error})")
+        self._times, self.time_source = run_times(seconds, np.array(itow), np.array(recv_time))
+        self.start_time = seconds[0] if seconds else None
+
+    def __len__(self):
+        return len(self._offsets)
+
+    def close(self):
+        self._file.close()
+
+    def row_for_time(self, seconds_from_start):
+        """Returns the first row at or after the given offset into the run."""
+        return int(np.searchsorted(self._times, seconds_from_start))
+
+    def row_time(self, row_number):
+        """Returns the row time in seconds from the start of the run."""
+        return float(self._times[row_number])
+
+    def rows(self, start_row=0, end_row=None):
+        """Yields (row_number, time_from_start, values) with values parsed to floats.
+
+        The timestamp column is replaced by the row time in seconds from the start.
+        """
+        end_row = len(self._offsets) if end_row is None else min(end_row, len(self._offsets))
+        if start_row >= end_row:
+            return
+        time_column = self._time_column
+        times = self._times[start_row:end_row].tolist()
+        position = None
+        for row_number in range(start_row, end_row):
+            offset = self._offsets[row_number]
+            if offset != position:
+                # First row, or a malformed row left out of the index lies in between
+                self._file.seek(offset)
+            line = self._file.readline()
+            position = offset + len(line)
+            row_time = times[row_number - start_row]
+            values = [row_time if column == time_column else (float(value) if value else None)
+                      for column, value in enumerate(line.rstrip(b'\r\n').split(b','))]
+            yield row_number, row_time, values
+
+def replay(run, on_fix, speed=1.0, start_row=0, end_row=None, scheduler=None):
+    """Emits fixes from a run at the original cadence times `speed`.
+
+    speed=0 replays as fast as the rows can be read, for offline sweeps.
+    Pass a LoopScheduler to keep its jitter histograms. Returns the number
+    of fixes emitted.
+    """
+    emitted = 0
+    scheduler = scheduler or LoopScheduler(name='Replay')
+    first_time = None
+    for row_number, row_time, values in run.rows(start_row, end_row):
+        if first_time is None:
+            first_time = row_time
+        if speed:
+            # Absolute deadlines, so sleep overshoot does not accumulate
+            scheduler.wait_until((row_time - first_time) / speed)
+        on_fix(row_number, row_time, values)
+        emitted += 1
+    return emitted
+
+def open_run(path):
+    """Opens a run, preferring its memory-mapped columnar copy when it is up to date.
+
+    Compacted runs (see Common/runCompactor.py) are read from their archive.
+    """
+    if os.path.isdir(path):
+        return ColumnarRun(path)
+    if path.endswith(ARCHIVE_SUFFIX):
+        return ArchivedRun(path)
+    header_path = os.path.join(columnar_path(path), HEADER_FILE)
+    if os.path.exists(header_path) and os.path.getmtime(header_path) >= os.path.getmtime(path):
+        return ColumnarRun(columnar_path(path))
+    return RecordedRun(path)
+
+def find_run(mow_id, data_dir=RECORD_DATA_DIR):
+    """Returns the most recent recorded run for a Mow ID, or None."""
+    catalog = RunCatalog(data_dir)
+    try:
+        return catalog.latest_run(mow_id)
+    finally:
+        catalog.close()
+
+def handle_sigterm(signum, frame):
+    """Turns a terminate() from selectMode into a clean stop."""
+    raise KeyboardInterrupt
+
+def log_fix(row_number, row_time, values):
+    """Default fix consumer: logs every fix at debug level."""
+    logging.debug("row %d t=%.2fs %s", row_number, row_time, values)
+
+def run_replay(combination, speed=1.0, start=0, on_first_row=None, follow=None):
+    """Replays the latest run for a Mow ID (or a run path); returns the number of fixes emitted.
+
+    With `follow` (a Mow ID or run path) every fix is matched against that
+    run's path index and the cross-track error is logged. Returns None when
+    there is no run to replay, or none to follow.
+    """
+    path = combination if os.path.exists(combination) else find_run(combination)
+    if not path:
+        logging.error(f"No recorded run found for {combination}")
+        return None
+    index = None
+    if follow:
+        follow_path = follow if os.path.exists(follow) else find_run(follow)
+        if not follow_path:
+            logging.error(f"No recorded run found to follow for {follow}")
+            return None
+        try:
+            index = PathIndex.for_run(follow_path)
+        except ValueError as e:
+            logging.error(f"Cannot follow {follow_path}: {e}")
+            return None
+        logging.info(f"Following {follow_path}: {len(index)} segments over {index.length:.1f} m")
+
+    run = open_run(path)
+    logging.info(f"Replaying {path}: {len(run)} rows at x{speed}")
+    lat_column, lon_column = run.fields.index('latitude'), run.fields.index('longitude')
+    cross_tracks = []
+
+    # Counted here rather than taken from replay(), which a stop interrupts before it can return
+    emitted = 0
+
+    def on_fix(row_number, row_time, values):
+        nonlocal emitted
+        if row_number == start_row and on_first_row:
+            on_first_row()
+        emitted += 1
+        log_fix(row_number, row_time, values)
+        lat, lon = values[lat_column], values[lon_column]
+        # Empty cells are None from the CSV and NaN from the columnar copy
+        if index and lat is not None and lon is not None and not (math.isnan(lat) or math.isnan(lon)):
+            match = index.locate(lat, lon)
+            cross_tracks.append(match.cross_track)
+            logging.debug("row %d cross-track %.3f m, %.1f m along", row_number, match.cross_track, match.along_track)
+
+    start_row = run.row_for_time(start)
+    scheduler = LoopScheduler(name='Replay')
+    started = monotonic()
     try:
-        while True:
-            if is_writing.value:  # If writing to the CSV file
-                green_led.on()
-            else:  # If not writing to the CSV file
-                green_led.off()
-            sleep(0.1)  # Check the state every 100ms
+        replay(run, on_fix, speed=speed, start_row=start_row, scheduler=scheduler)
     except KeyboardInterrupt:
-        pass
+        logging.info("Replay stopped by user.")
     finally:
-        green_led.off()  # Ensure the LED is turned off on exit
-
-def log_serial_data(mow_id, is_writing):
-    """Logs specific fields from UBX and NMEA messages into a CSV file."""
-    # Create the "Data" directory if it doesn't exist
-    data_dir = os.path.join(os.path.dirname(__file__), 'Data')
-    os.makedirs(data_dir, exist_ok=True)
-
-    # Create a new CSV file with Mow ID and date/time in the filename
-    filename = os.path.join(data_dir, f"{mow_id}_{strftime('%Y%m%d-%H%M%S')}_GPSData.csv")   
-
-    with open(filename, 'w', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        # Write CSV header
-        writer.writerow(['timestamp', 'latitude', 'longitude', 'speed', 'rel_north', 'rel_east', 'rel_down', 'heading'])
-
-        # Initialize buffers for the latest values
-        latest_latitude = latest_longitude = latest_speed = None
-        latest_rel_north = latest_rel_east = latest_rel_down = latest_heading = None
-        last_timestamp = None
-
-        # Open the serial port
-        with Serial('/dev/ttyAMA0', 57600, timeout=1) as stream:
-            # Configure UBXReader to parse both UBX and NMEA messages
-            ubr = UBXReader(stream, protfilter=UBX_PROTOCOL | NMEA_PROTOCOL)
-            logging.info(f"Logging specific fields to {filename}. Press Ctrl+C to stop.")
-            try:
-                while True:
-                    # Read and parse data
-                    raw_data, parsed_data = ubr.read()
-                    if parsed_data:
-                        timestamp = strftime("%Y-%m-%d %H:%M:%S")
-
-                        # Parse NMEA messages
-                        if parsed_data.identity.startswith("GNRMC"):  # Recommended Minimum Navigation Information
-                            latest_latitude = parsed_data.lat
-                            latest_longitude = parsed_data.lon
-                            latest_speed = float(parsed_data.spd) * 1.852 if parsed_data.spd else 0  # Convert knots to km/h
-                            last_timestamp = timestamp
-                            logging.info(f"latitude {latest_latitude}, longitude {latest_longitude}, speed {latest_speed} km/h")
-                        # Parse UBX messages
-                        if parsed_data.identity == "NAV-RELPOSNED":  # Relative Position NED
-                            latest_rel_north = parsed_data.relPosN / 100  # Convert to meters
-                            latest_rel_east = parsed_data.relPosE / 100   # Convert to meters
-                            latest_rel_down = parsed_data.relPosD / 100   # Convert to meters
-                            latest_heading = parsed_data.relPosHeading    # degrees
-                            last_timestamp = timestamp
-
-                            if latest_heading == 0.0:
-                                latest_heading = math.degrees(math.atan2(latest_rel_east, latest_rel_north))
-                                if latest_heading < 0:
-                                    latest_heading += 360  # Normalize to 0-360 degrees
-
-                            logging.info(f"latest_rel_north {latest_rel_north}, latest_rel_east {latest_rel_east}, latest_rel_down {latest_rel_down} latest_heading {latest_heading}")
-                        
-                        # Signal that we are writing to the CSV file
-                        is_writing.value = 1
-                        
-                        # Write to CSV only if both NMEA and UBX data are available
-                        if all([latest_latitude, latest_longitude, latest_speed, latest_rel_north, latest_rel_east, latest_rel_down, latest_heading]):
-                            writer.writerow([last_timestamp, latest_latitude, latest_longitude, latest_speed, latest_rel_north, latest_rel_east, latest_rel_down, latest_heading])
-                            csvfile.flush()
-
-                            # Reset the buffer after writing
-                            latest_latitude = latest_longitude = latest_speed = None
-                            latest_rel_north = latest_rel_east = latest_rel_down = latest_heading = None
-                    else:
-                        # Signal that we are not writing to the CSV file
-                        is_writing.value = 0
-            except KeyboardInterrupt:
-                logging.info("Logging stopped by user.")
-            except Exception as e:
-                logging.error(f"Error: {e}")
-            finally:
-                # Ensure the LED turns off when exiting
-                is_writing.value = 0
+        run.close()
+    elapsed = monotonic() - started
+    logging.info(f"Replayed {emitted} fixes in {elapsed:.2f} s")
+    if speed:
+        scheduler.log_report()
+    if cross_tracks:
+        errors = [abs(cross_track) for cross_track in cross_tracks]
+        rms = (sum(error * error for error in errors) / len(errors)) ** 0.5
+        logging.info(f"Cross-track error over {len(errors)} fixes: RMS {rms:.3f} m, max {max(errors):.3f} m")
+    return emitted
 
 if __name__ == '__main__':
-    if len(sys.argv) != 2:
-        sys.exit(1)
-    combination = sys.argv[1]
-
-    # Shared value to signal the LED process
-    is_writing = Value('i', 0)  # Create a shared Value object (0 = not writing, 1 = writing)
-
-    # Start the LED flashing process
-    led_process = Process(target=flash_led, args=(is_writing,))
-    led_process.start()
-
-    try:
-        # Start the main logging process
-        log_serial_data(combination, is_writing)
-    finally:
-        # Ensure the LED process is terminated on exit
-        is_writing.value = 0  # Turn off the LED
-        led_process.terminate()
-        led_process.join()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Replay a recorded run at its original cadence.")
+    parser.add_argument('combination', help="2-digit Mow ID of the run, or a path to a run file")
+    parser.add_argument('--speed', type=float, default=1.0, help="speed-up factor, 0 for as fast as possible")
+    parser.add_argument('--start', type=float, default=0, help="seconds into the run to start from")
+    parser.add_argument('--follow', help="Mow ID or run path whose path to measure the cross-track error against")
+    args = parser.parse_args()
+    setup_logging()
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    if run_replay(args.combination, speed=args.speed, start=args.start, follow=args.follow) is None:
+        sys.exit(NO_RUN_EXIT)
@@ -1,25 +1,25 @@
 import os
-import subprocess
 import logging
-from time import strftime, sleep, time
-from gpiozero import LED, Button, OutputDevice
+from time import strftime, sleep
+from gpiozero import LED
 import gpiozero  # Import gpiozero to handle exceptions
+from Common.runCatalog import RunCatalog
+from Common.keypad import MatrixKeypad
+from Common.workerSupervisor import WorkerSupervisor
+from Common.ledScheduler import LedScheduler
+from Common.fastLogging import setup_logging, LOG_FORMAT
+from Common.runCompactor import RunCompactor
 
-# GPIO pin numbers for the keypad
-L1 = OutputDevice(5)
-L2 = OutputDevice(6)
-L3 = OutputDevice(13)
-L4 = OutputDevice(19)
-
-C1 = Button(12, pull_up=False, bounce_time=0.1)
-C2 = Button(16, pull_up=False, bounce_time=0.1)
-C3 = Button(20, pull_up=False, bounce_time=0.1)
-C4 = Button(21, pull_up=False, bounce_time=0.1)
+# Keypad on GPIO 5, 6, 13, 19 (rows) and 12, 16, 20, 21 (columns)
+keypad = MatrixKeypad(debounce_time=0.5)  # 500 milliseconds debounce time
 
 # GPIO pin numbers for the LEDs
 BLUE_LED = LED(22)
 RED_LED = LED(27)
 
+# All LED animations run on the scheduler's timer thread so the keypad never waits on them
+leds = LedScheduler()
+
 # Create the "Logs" directory if it doesn't exist
 log_dir = os.path.join(os.path.dirname(__file__), 'Logs')
 os.makedirs(log_dir, exist_ok=True)
@@ -27,102 +27,51 @@ os.makedirs(log_dir, exist_ok=True)
 # Log file path with a unique name based on the current timestamp
 log_file = os.path.join(log_dir, f'selectMode_{strftime("%Y%m%d-%H%M%S")}.log')
 
-# Initialize logging with timestamp in every log message
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-# Create a file handler for logging to a file
-file_handler = logging.FileHandler(log_file)
-file_handler.setLevel(logging.INFO)
-file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-
-# Create a console handler for logging to the terminal
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-
-# Add both handlers to the root logger
-logging.getLogger().addHandler(file_handler)
-logging.getLogger().addHandler(console_handler)
-
-last_states = {
-    'C1': False, 'C2': False, 'C3': False, 'C4': False
-}
-last_press_time = {
-    'C1': 0, 'C2': 0, 'C3': 0, 'C4': 0
-}
-debounce_time = 0.5  # 500 milliseconds debounce time
-
-# Function to read a line of the keypad
-def read_line(line, characters):
-    line.on()
-    current_states = {
-        'C1': C1.is_pressed,
-        'C2': C2.is_pressed,
-        'C3': C3.is_pressed,
-        'C4': C4.is_pressed
-    }
-    
-    current_time = time()
-    for i, (col, state) in enumerate(current_states.items()):
-        if state and not last_states[col] and (current_time - last_press_time[col] > debounce_time):
-            last_press_time[col] = current_time
-            line.off()
-            return characters[i]
-        last_states[col] = state
-    
-    line.off()
-    return None
+# One file and one console handler, both written from the logging thread
+setup_logging(log_file, console_format=LOG_FORMAT)
+
+# Catalog of the runs in Record/Data, kept up to date by the recorder
+catalog = RunCatalog(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Record', 'Data'))
+
+# Long-lived worker that runs record and replay jobs
+supervisor = WorkerSupervisor()
+
+# Archives runs older than a week in the background, held off while recording or replaying
+compactor = RunCompactor(catalog.data_dir)
 
 # Function to determine the desired mode of operation
 def get_mode():
-    while True:
-        mode = read_line(L1, ["1", "2", "3", "A"])
-        if mode: return mode
-        mode = read_line(L2, ["4", "5", "6", "B"])
-        if mode: return mode
-        mode = read_line(L3, ["7", "8", "9", "C"])
-        if mode: return mode
-        mode = read_line(L4, ["*", "0", "#", "D"])
-        if mode: return mode
-        sleep(0.1)
+    # Ignore keys pressed while a mode was running
+    keypad.clear()
+    return keypad.get_key()
 
 # Function to monitor for 'D' press and kill the subprocess
 def monitor_for_stop(process):
     while process.poll() is None:  # While the process is still running
-        if read_line(L4, ["*", "0", "#", "D"]) == "D":
+        if keypad.get_key(timeout=0.1) == "D":
             logging.info("Mode D pressed, terminating the recording process")
             process.terminate()
-        sleep(0.1)
 
 def get_combination():
+    """Reads a 2-digit combination; returns it with the time the last digit was pressed."""
     combination = ""
+    entered_at = None
+    # Flash BLUE LED while waiting for user input
+    leds.blink(BLUE_LED, on_time=0.1, off_time=0.1)
     while len(combination) < 2:
-        digit = read_line(L1, ["1", "2", "3", "A"]) or \
-                read_line(L2, ["4", "5", "6", "B"]) or \
-                read_line(L3, ["7", "8", "9", "C"]) or \
-                read_line(L4, ["*", "0", "#", "D"])
-        if digit and digit.isdigit():
+        digit, entered_at = keypad.get_event()
+        if digit.isdigit():
             combination += digit
             logging.info(f"Digit entered: {digit}")
-        else:
-            # Flash BLUE LED while waiting for user input
-            BLUE_LED.on()
-            sleep(0.1)
-            BLUE_LED.off()
-            sleep(0.1)
-    return combination
+    leds.off(BLUE_LED)
+    return combination, entered_at
 
 def validate_combination(combination):
-    data_dir = os.path.join(os.path.dirname(__file__), 'Data')
-    if not os.path.exists(data_dir):
-        logging.info("Data directory does not exist")
-        return False
-    for filename in os.listdir(data_dir):
-        if filename.startswith(combination):
-            return True
-    return False
+    """Check if a run with the combination as Mow ID has been recorded."""
+    return catalog.has_run(combination)
 
 def cleanup_gpio():
+    leds.close()
     try:
         BLUE_LED.off()
         RED_LED.off()
@@ -131,112 +80,82 @@ def cleanup_gpio():
     finally:
         BLUE_LED.close()
         RED_LED.close()
+        keypad.close()
 
-def trigger_recording(combination):
-    # script_path = os.path.join(os.path.dirname(__file__), 'recordDataToCsv.py')
-    script_path = os.path.join(os.path.dirname(__file__), 'Record/parseAndRecordData.py')
-    logging.info(f"Triggering recording with combination: {combination}")
-    logging.info(f"Running script: {script_path}")
-    process = subprocess.Popen(['python3', script_path, combination], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    monitor_for_stop(process)
-    stdout, stderr = process.communicate()
-    logging.info(f"Subprocess output: {stdout}")
-    logging.error(f"Subprocess error: {stderr}")
-
-# Main function
-def trigger_read_recorded_run(combination):
-    """Trigger the readRecordedRun.py subprocess."""
-    script_path = os.path.join(os.path.dirname(__file__), 'Repeat/readRecordedRun.py')
+def trigger_recording(combination, requested_at=None, mode='fused'):
+    """Start a recording job in the warm worker and wait for it to finish."""
+    logging.info(f"Triggering recording ({mode}) with combination: {combination}")
+    compactor.pause()
+    try:
+        job = supervisor.start_job('record', combination, requested_at, mode=mode)
+        monitor_for_stop(job)
+        job.wait()
+    finally:
+        compactor.resume()
+
+def trigger_read_recorded_run(combination, requested_at=None):
+    """Start a replay job in the warm worker and wait for it to finish."""
     logging.info(f"Triggering readRecordedRun with combination: {combination}")
-    logging.info(f"Running script: {script_path}")
-    process = subprocess.Popen(['python3', script_path, combination], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-    monitor_for_stop(process)  # Monitor for "D" press to stop the process
-    stdout, stderr = process.communicate()
-    logging.info(f"Subprocess output: {stdout}")
-    logging.error(f"Subprocess error: {stderr}")
+    compactor.pause()
+    try:
+        job = supervisor.start_job('replay', combination, requested_at)
+        monitor_for_stop(job)  # Monitor for "D" press to stop the process
+        job.wait()
+    finally:
+        compactor.resume()
 
 def validate_file_in_data(combination):
-    """Check if a file starting with the combination exists in Record/Data."""
-    data_dir = os.path.join(os.path.dirname(__file__), 'Record/Data')
-    if not os.path.exists(data_dir):
-        logging.info("Data directory does not exist")
-        return False
-    for filename in os.listdir(data_dir):
-        if filename.startswith(combination):
-            return True
-    return False
+    """Check if a run for the combination exists in the Record/Data catalog."""
+    return catalog.has_run(combination)
 
 def main():
     logging.info("Starting main function")
+    # Start the worker now so a keypress does not wait for python3 and imports
+    try:
+        supervisor.start()
+    except RuntimeError as e:
+        logging.error(f"{e}; trying again when a mode is selected")
+    # Pick up runs copied onto or off the card while the Pi was off
+    catalog.rebuild()
+    compactor.start()
     while True:
         logging.info("Waiting for user input...")
-        try:
-            logging.debug("Turning on BLUE LED")
-            if BLUE_LED.closed:
-                logging.error("BLUE LED is closed or uninitialized")
-            else:
-                BLUE_LED.on()  # Light up blue LED while waiting for user input
-        except gpiozero.exc.GPIODeviceClosed:
-            logging.warning("Attempted to turn on an already closed or uninitialized LED")
+        logging.debug("Turning on BLUE LED")
+        leds.solid(BLUE_LED)  # Light up blue LED while waiting for user input
         mode = get_mode()
-        try:
-            logging.debug("Flashing BLUE LED")
-            for _ in range(5):  # Flash blue LED for 1 second (5 * 200ms)
-                BLUE_LED.on()
-                sleep(0.1)
-                BLUE_LED.off()
-                sleep(0.1)
-        except gpiozero.exc.GPIODeviceClosed:
-            logging.warning("Attempted to turn on/off an already closed or uninitialized LED")
+        logging.debug("Flashing BLUE LED")
+        leds.blink(BLUE_LED, on_time=0.1, off_time=0.1, count=5)  # Flash blue LED for 1 second (5 * 200ms)
         logging.info(f"User selected mode: {mode}")
 
-        if mode == "A":
-            logging.info("Mode A (RECORD) selected")
+        if mode in ("A", "C"):
+            if mode == "A":
+                logging.info("Mode A (RECORD) selected")
+            else:
+                logging.info("Mode C (RECORD NAV-PVT) selected")
             logging.info("Enter a 2-digit combination")
-            combination = get_combination()
+            combination, entered_at = get_combination()
             logging.info(f"Combination entered: {combination}")
             if validate_combination(combination):
                 logging.info("File with the combination exists")
-                try:
-                    logging.debug("Turning on BLUE LED")
-                    RED_LED.on()
-                    sleep(5)
-                    RED_LED.off()
-                except gpiozero.exc.GPIODeviceClosed:
-                    logging.warning("Attempted to turn on/off an already closed or uninitialized LED")
+                logging.debug("Turning on RED LED")
+                leds.solid(RED_LED, duration=5)
             else:
                 logging.info("No file with the combination found")
-                try:
-                    logging.debug("Turning on BLUE LED")
-                    for _ in range(5):  # Flash blue LED for 6 seconds (5 * 1100ms)
-                        BLUE_LED.on()
-                        sleep(1)
-                        BLUE_LED.off()
-                        sleep(.1)
-                except gpiozero.exc.GPIODeviceClosed:
-                    logging.warning("Attempted to turn on/off an already closed or uninitialized LED")
-                trigger_recording(combination)
+                logging.debug("Flashing BLUE LED")
+                leds.blink(BLUE_LED, on_time=1, off_time=0.1, count=5)  # Flash blue LED for 6 seconds (5 * 1100ms)
+                trigger_recording(combination, entered_at, 'pvt' if mode == "C" else 'fused')
         elif mode == "B":
             logging.info("Mode B selected")
             logging.info("Enter a 2-digit combination")
-            combination = get_combination()
+            combination, entered_at = get_combination()
             logging.info(f"Combination entered: {combination}")
             if validate_file_in_data(combination):
                 logging.info(f"File with ID {combination} found in Record/Data")
-                trigger_read_recorded_run(combination)
+                trigger_read_recorded_run(combination, entered_at)
             else:
                 logging.info(f"No file with ID {combination} found in Record/Data")
-                try:
-                    logging.debug("Flashing RED LED")
-                    for _ in range(5):  # Flash RED LED for 1 second (5 * 200ms)
-                        RED_LED.on()
-                        sleep(0.1)
-                        RED_LED.off()
-                        sleep(0.1)
-                except gpiozero.exc.GPIODeviceClosed:
-                    logging.warning("Attempted to turn on/off an already closed or uninitialized LED")
-        elif mode == "C":
-            logging.info("Mode C selected")
+                logging.debug("Flashing RED LED")
+                leds.blink(RED_LED, on_time=0.1, off_time=0.1, count=5)  # Flash RED LED for 1 second (5 * 200ms)
         elif mode == "D":
             logging.info("Mode D selected")
         else:
@@ -250,4 +169,6 @@ if __name__ == "__main__":
         main()
     except KeyboardInterrupt:
         logging.info("\nApplication stopped!")
+        compactor.close()
+        supervisor.close()
         cleanup_gpio()
\ No newline at end of file